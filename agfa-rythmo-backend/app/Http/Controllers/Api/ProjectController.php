@@ -8,6 +8,7 @@
 use App\Models\User;
 use Illuminate\Http\Request;
 use Illuminate\Support\Facades\Storage;
+use Illuminate\Support\Facades\File;
 use Illuminate\Support\Facades\DB;
 use Illuminate\Support\Facades\Auth;
 use Illuminate\Support\Facades\Log;
@@ -198,6 +199,14 @@ public function destroy(Project $project)
                 }
             }
 
+            // Supprimer les stems Demucs partagés (vocals/instrumental)
+            File::deleteDirectory($project->stemsDirectory());
+
+            // Supprimer le registre des locuteurs propre au projet (celui d'une série reste aux autres épisodes)
+            if (!$project->hasSharedSpeakerRegistry()) {
+                File::deleteDirectory($project->speakerRegistryDirectory());
+            }
+
             // 7. Supprimer le projet lui-même
             $project->delete();
         });
@@ -97,16 +97,23 @@ public function handle(): void
             $this->updateProgress(10, 'Lancement de l\'extraction avec Whisper...');
 
             // Construire la commande Python (simple)
+            // --stems-dir : vocals + instrumental séparés en une passe, réutilisés par ExtractInstrumental
             $command = sprintf(
-                'python3 %s %s %s --model %s --language %s --max-speakers %d',
+                'python3 %s %s %s --model %s --language %s --max-speakers %d --stems-dir %s',
                 escapeshellarg($scriptPath),
                 escapeshellarg($videoPath),
                 escapeshellarg($outputJsonPath),
                 escapeshellarg($this->whisperModel),
                 escapeshellarg($this->language),
-                $this->maxSpeakers
+                $this->maxSpeakers,
+                escapeshellarg($this->project->stemsDirectory())
             );
 
+            // --speaker-registry : locuteurs connus du projet / de la série, SPEAKER_<id> stables
+            if (config('ai.speaker_registry_enabled', false)) {
+                $command .= ' --speaker-registry ' . escapeshellarg($this->project->speakerRegistryDirectory());
+            }
+
             Log::info("Exécution du script Python: {$command}");
 
             // Exécuter le script Python (peut prendre plusieurs minutes)
@@ -165,6 +172,11 @@ public function handle(): void
                      count($dialoguesData['dialogues']) . " dialogues extraits, " .
                      count($speakerCharacters) . " personnages créés.");
 
+            // Mesures par étape (temps, CPU, pic RAM, I/O) pour le dimensionnement des serveurs
+            if (!empty($dialoguesData['metadata']['performance'])) {
+                Log::info("Performance pipeline IA: " . json_encode($dialoguesData['metadata']['performance']));
+            }
+
             // Stocker la langue détectée dans project_settings
             $settings = $this->project->project_settings ?? [];
             $detectedLanguage = $dialoguesData['metadata']['language'] ?? $dialoguesData['language'] ?? 'unknown';
@@ -227,7 +239,10 @@ private function updateProgress(int $progress, string $message): void
     }
 
     /**
-     * Exécuter une commande avec simulation de progression
+     * Exécuter une commande en suivant sa progression
+     *
+     * Le script écrit des événements JSON lines sur le fd 3 (voir scripts/progress.py) ;
+     * tant qu'aucun événement n'est reçu, la progression reste simulée.
      */
     private function executeWithProgress(string $command, string $logPath): void
     {
@@ -237,6 +252,50 @@ private function executeWithProgress(string $command, string $logPath): void
         // Passer AI_DIARIZATION_METHOD au script Python
         $env['AI_DIARIZATION_METHOD'] = config('ai.diarization_method', 'mfcc');
 
+        // Worker persistant : le script devient un client léger si le socket répond
+        if ($workerSocket = config('ai.worker_socket')) {
+            $env['AI_WORKER_SOCKET'] = $workerSocket;
+            Log::info("Worker IA persistant: {$workerSocket}");
+        }
+
+        // Progression structurée sur le fd 3 (stderr reste réservé aux logs)
+        $env['AI_PROGRESS_FD'] = '3';
+
+        // Transcription entière ou par chunks de parole (VAD)
+        $env['AI_TRANSCRIPTION_MODE'] = (string) config('ai.transcription_mode', 'full');
+        $env['AI_TRANSCRIPTION_CHUNK_SECONDS'] = (string) config('ai.transcription_chunk_seconds', 30);
+        $env['AI_TRANSCRIPTION_WORKERS'] = (string) config('ai.transcription_workers', 1);
+        $env['AI_TRANSCRIPTION_THREADS_PER_WORKER'] = (string) config('ai.transcription_threads_per_worker', 2);
+
+        // Logs détaillés par segment du clustering (coûteux, désactivés par défaut)
+        $env['AI_DIARIZATION_VERBOSE'] = config('ai.diarization_verbose') ? 'true' : 'false';
+        $env['AI_MFCC_FEATURE_ENGINE'] = (string) config('ai.mfcc_feature_engine', 'segment');
+        $env['AI_MFCC_PITCH_METHOD'] = (string) config('ai.mfcc_pitch_method', 'piptrack');
+        $env['AI_MFCC_WORKERS'] = (string) config('ai.mfcc_workers', 1);
+        $env['AI_CLUSTERING_SCALABLE_THRESHOLD'] = (string) config('ai.clustering_scalable_threshold', 1500);
+        $env['AI_MFCC_CLUSTERING'] = (string) config('ai.mfcc_clustering', 'hierarchical');
+        $env['AI_SPEAKER_COUNT_METHOD'] = (string) config('ai.speaker_count_method', 'silhouette');
+        $env['AI_SPEAKER_CHANGE_ENABLED'] = config('ai.speaker_change_enabled', false) ? 'true' : 'false';
+        $env['AI_SPEAKER_CHANGE_PENALTY'] = (string) config('ai.speaker_change_penalty', 1.5);
+        $env['AI_RESEMBLYZER_EMBEDDING_MODE'] = (string) config('ai.resemblyzer_embedding_mode', 'segment');
+        $env['AI_RESEMBLYZER_BACKEND'] = (string) config('ai.resemblyzer_backend', 'torch');
+        $env['AI_RESEMBLYZER_ONNX_THREADS'] = (string) config('ai.resemblyzer_onnx_threads', 2);
+        if ($registryThreshold = config('ai.speaker_registry_threshold')) {
+            $env['AI_SPEAKER_REGISTRY_THRESHOLD'] = (string) $registryThreshold;
+        }
+
+        // Profilage par étape (un .prof par étape du pipeline)
+        if ($profileDir = config('ai.profile_dir')) {
+            $env['AI_PROFILE_DIR'] = $profileDir;
+        }
+
+        // Cache des étapes (audio, vocals, transcription) partagé entre projets
+        if (config('ai.cache.enabled')) {
+            $env['AI_CACHE_ENABLED'] = 'true';
+            $env['AI_CACHE_DIR'] = config('ai.cache.dir');
+            $env['AI_CACHE_MAX_MB'] = (string) config('ai.cache.max_mb');
+        }
+
         // Si HF_TOKEN est configuré, on doit le passer explicitement
         if ($hfToken = env('HF_TOKEN')) {
             $env['HF_TOKEN'] = trim($hfToken, "'\"");
@@ -251,6 +310,7 @@ private function executeWithProgress(string $command, string $logPath): void
                 0 => ['pipe', 'r'],  // stdin
                 1 => ['pipe', 'w'],  // stdout
                 2 => ['pipe', 'w'],  // stderr
+                3 => ['pipe', 'w'],  // progression JSON lines (AI_PROGRESS_FD)
             ],
             $pipes,
             null, // working directory
@@ -263,10 +323,11 @@ private function executeWithProgress(string $command, string $logPath): void
 
         fclose($pipes[0]); // Fermer stdin
 
-        // Mettre stderr en mode non-bloquant pour lecture
+        // Mettre stderr et le canal de progression en mode non-bloquant pour lecture
         stream_set_blocking($pipes[2], false);
+        stream_set_blocking($pipes[3], false);
 
-        // Simuler la progression pendant l'exécution (10% -> 80%)
+        // Progression simulée (10% -> 80%) tant que le script n'envoie pas d'événement
         $startTime = time();
         $progressSteps = [
             0 => 'Extraction audio en cours...',
@@ -277,11 +338,21 @@ private function executeWithProgress(string $command, string $logPath): void
         ];
 
         $stderrBuffer = '';
+        $progressBuffer = '';
+        $lastEvent = null;
+        $lastProgress = 10;
 
         while (proc_get_status($process)['running']) {
             $elapsed = time() - $startTime;
             $estimatedProgress = min(80, 10 + ($elapsed * 2)); // Progresser ~2% par seconde
 
+            // Lire les événements de progression sans bloquer
+            $chunk = stream_get_contents($pipes[3]);
+            if ($chunk !== false && $chunk !== '') {
+                $progressBuffer .= $chunk;
+                $lastEvent = $this->consumeProgressEvents($progressBuffer) ?? $lastEvent;
+            }
+
             // Lire stderr sans bloquer
             $stderr = stream_get_contents($pipes[2]);
             if ($stderr !== false && $stderr !== '') {
@@ -290,15 +361,23 @@ private function executeWithProgress(string $command, string $logPath): void
                 Log::info("Python stderr: " . trim($stderr));
             }
 
-            // Trouver le message correspondant
-            $message = 'Extraction en cours...';
-            foreach ($progressSteps as $threshold => $msg) {
-                if ($estimatedProgress >= $threshold) {
-                    $message = $msg;
+            if ($lastEvent !== null) {
+                // Progression réelle : pipeline complet (0-1) ramené sur 10% -> 80% du job
+                $progress = max($lastProgress, 10 + (int) round($lastEvent['overall'] * 70));
+                $message = $this->progressMessage($lastEvent);
+            } else {
+                // Trouver le message correspondant
+                $progress = (int) $estimatedProgress;
+                $message = 'Extraction en cours...';
+                foreach ($progressSteps as $threshold => $msg) {
+                    if ($estimatedProgress >= $threshold) {
+                        $message = $msg;
+                    }
                 }
             }
 
-            $this->updateProgress((int) $estimatedProgress, $message);
+            $lastProgress = $progress;
+            $this->updateProgress($progress, $message);
 
             // Vérifier annulation toutes les 2 secondes
             $this->checkCancellation();
@@ -315,6 +394,7 @@ private function executeWithProgress(string $command, string $logPath): void
 
         fclose($pipes[1]);
         fclose($pipes[2]);
+        fclose($pipes[3]);
 
         // Récupérer le code de sortie
         $returnCode = proc_close($process);
@@ -332,6 +412,54 @@ private function executeWithProgress(string $command, string $logPath): void
         }
     }
 
+    /**
+     * Extraire les lignes JSON complètes du buffer de progression
+     *
+     * @return array|null Dernier événement avec une progression globale, null si aucun
+     */
+    private function consumeProgressEvents(string &$buffer): ?array
+    {
+        $lastEvent = null;
+
+        while (($newline = strpos($buffer, "\n")) !== false) {
+            $line = substr($buffer, 0, $newline);
+            $buffer = substr($buffer, $newline + 1);
+
+            $event = json_decode($line, true);
+            if (is_array($event) && isset($event['overall'])) {
+                $lastEvent = $event;
+            }
+        }
+
+        return $lastEvent;
+    }
+
+    /**
+     * Message lisible pour un événement de progression
+     */
+    private function progressMessage(array $event): string
+    {
+        $labels = [
+            'audio' => 'Extraction audio',
+            'separation' => 'Séparation vocale (Demucs)',
+            'transcription' => 'Transcription Whisper',
+            'diarization' => 'Identification des locuteurs',
+            'output' => 'Finalisation',
+        ];
+
+        $message = $labels[$event['stage']] ?? 'Extraction en cours';
+        $message .= ' (' . (int) round(($event['fraction'] ?? 0) * 100) . '%)';
+
+        if (!empty($event['eta_seconds']) && ($event['event'] ?? '') === 'progress') {
+            $eta = (int) round($event['eta_seconds']);
+            $message .= $eta >= 60
+                ? sprintf(' - environ %d min %02d s restantes', intdiv($eta, 60), $eta % 60)
+                : sprintf(' - environ %d s restantes', $eta);
+        }
+
+        return $message . '...';
+    }
+
     /**
      * Créer les personnages automatiquement à partir des speakers détectés
      */
@@ -340,12 +468,15 @@ private function createCharactersFromSpeakers(array $speakers): array
         $characters = [];
 
         foreach ($speakers as $index => $speakerName) {
+            // Numéro du locuteur (SPEAKER_07 -> 7) : stable d'un épisode à l'autre avec le registre
+            $number = preg_match('/^SPEAKER_(\d+)$/', $speakerName, $matches) ? (int) $matches[1] : $index;
+
             // Utiliser la palette de couleurs cycliquement
-            $colorIndex = $index % count(self::COLOR_PALETTE);
+            $colorIndex = $number % count(self::COLOR_PALETTE);
             $colors = self::COLOR_PALETTE[$colorIndex];
 
             // Nom du personnage : "Speaker 1", "Speaker 2", etc.
-            $characterName = 'Locuteur ' . ($index + 1);
+            $characterName = 'Locuteur ' . ($number + 1);
 
             $character = Character::create([
                 'project_id' => $this->project->id,
@@ -46,16 +46,26 @@ public function handle(): void
             // Progression: 10%
             $this->project->update(['instrumental_progress' => 10]);
 
-            // 1. Extraire audio de la vidéo avec FFmpeg
-            Log::info("[ExtractInstrumental] Step 1: Extracting audio from video");
-            $audioPath = $this->extractAudioFromVideo($videoPath);
+            // Stems déjà séparés par une extraction de dialogues (même vidéo, même modèle) ?
+            $stems = $this->project->reusableStems($videoPath);
 
-            // Progression: 30%
-            $this->project->update(['instrumental_progress' => 30]);
+            if ($stems !== null && isset($stems['instrumental'])) {
+                Log::info("[ExtractInstrumental] Reusing instrumental from previous Demucs pass");
+                $instrumentalPath = $stems['instrumental'];
+            } else {
+                // 1. Extraire audio de la vidéo avec FFmpeg
+                Log::info("[ExtractInstrumental] Step 1: Extracting audio from video");
+                $audioPath = $this->extractAudioFromVideo($videoPath);
 
-            // 2. Séparer instrumental avec Demucs
-            Log::info("[ExtractInstrumental] Step 2: Separating instrumental with Demucs");
-            $instrumentalPath = $this->separateInstrumental($audioPath);
+                // Progression: 30%
+                $this->project->update(['instrumental_progress' => 30]);
+
+                // 2. Séparer vocals + instrumental avec Demucs (une passe, vocals réutilisés par ExtractDialogues)
+                Log::info("[ExtractInstrumental] Step 2: Separating stems with Demucs");
+                $instrumentalPath = $this->separateInstrumental($audioPath, $videoPath);
+
+                @unlink($audioPath);
+            }
 
             // Progression: 90%
             $this->project->update(['instrumental_progress' => 90]);
@@ -64,10 +74,6 @@ public function handle(): void
             $storagePath = "instrumental/{$this->project->id}/instrumental.wav";
             Storage::disk('public')->put($storagePath, file_get_contents($instrumentalPath));
 
-            // Nettoyage fichiers temporaires
-            @unlink($audioPath);
-            @unlink($instrumentalPath);
-
             // Progression: 100% - Terminé
             $this->project->update([
                 'instrumental_audio_path' => $storagePath,
@@ -138,12 +144,12 @@ private function extractAudioFromVideo(string $videoPath): string
     }
 
     /**
-     * Séparer instrumental avec le script Python
+     * Séparer vocals + instrumental avec le script Python (dossier de stems du projet)
      */
-    private function separateInstrumental(string $audioPath): string
+    private function separateInstrumental(string $audioPath, string $videoPath): string
     {
-        $tempInstrumental = tempnam(sys_get_temp_dir(), 'instrumental_') . '.wav';
-        $scriptPath = base_path('scripts/separate_instrumental.py');
+        $stemsDirectory = $this->project->stemsDirectory();
+        $scriptPath = base_path('scripts/separate_stems.py');
 
         if (!file_exists($scriptPath)) {
             throw new \Exception("Script not found: {$scriptPath}");
@@ -153,7 +159,10 @@ private function separateInstrumental(string $audioPath): string
             'python3',
             $scriptPath,
             $audioPath,
-            $tempInstrumental,
+            '--output-dir',
+            $stemsDirectory,
+            '--source',
+            $videoPath,
             '--model',
             'htdemucs'
         ];
@@ -226,6 +235,6 @@ private function separateInstrumental(string $audioPath): string
 
         Log::info("[ExtractInstrumental] Python output: " . $stderr);
 
-        return $tempInstrumental;
+        return $stemsDirectory . '/instrumental.wav';
     }
 }
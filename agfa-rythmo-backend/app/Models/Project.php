@@ -129,6 +129,73 @@ public function canAdmin(User $user): bool
         return $collaborator !== null;
     }
 
+    /**
+     * Dossier des stems Demucs partagés (vocals + instrumental, voir scripts/separate_stems.py)
+     */
+    public function stemsDirectory(): string
+    {
+        return storage_path('app/stems/' . $this->id);
+    }
+
+    /**
+     * Dossier du registre des locuteurs (scripts/speaker_registry.py)
+     *
+     * Partagé par tous les projets d'une même série (project_settings['speaker_registry']),
+     * sinon propre au projet.
+     */
+    public function speakerRegistryDirectory(): string
+    {
+        $key = $this->speakerRegistrySeriesKey();
+
+        return storage_path('app/speaker_registry/' . ($key !== '' ? 'series_' . $key : 'project_' . $this->id));
+    }
+
+    /**
+     * Registre des locuteurs partagé avec d'autres projets (même série) ?
+     */
+    public function hasSharedSpeakerRegistry(): bool
+    {
+        return $this->speakerRegistrySeriesKey() !== '';
+    }
+
+    private function speakerRegistrySeriesKey(): string
+    {
+        $series = $this->project_settings['speaker_registry'] ?? null;
+
+        return is_string($series) ? preg_replace('/[^A-Za-z0-9_-]+/', '_', trim($series)) : '';
+    }
+
+    /**
+     * Stems déjà séparés pour la vidéo actuelle (manifeste valide), null sinon
+     */
+    public function reusableStems(string $videoPath, string $model = 'htdemucs'): ?array
+    {
+        $manifestPath = $this->stemsDirectory() . '/stems.json';
+        if (!file_exists($manifestPath) || !file_exists($videoPath)) {
+            return null;
+        }
+
+        $manifest = json_decode(file_get_contents($manifestPath), true);
+        if (!is_array($manifest)
+            || ($manifest['model'] ?? null) !== $model
+            || ($manifest['source'] ?? null) !== realpath($videoPath)
+            || ($manifest['source_size'] ?? null) !== filesize($videoPath)
+            || ($manifest['source_mtime'] ?? null) !== filemtime($videoPath)) {
+            return null;
+        }
+
+        $stems = [];
+        foreach ($manifest['stems'] ?? [] as $name => $file) {
+            $path = $this->stemsDirectory() . '/' . $file;
+            if (!file_exists($path)) {
+                return null;
+            }
+            $stems[$name] = $path;
+        }
+
+        return $stems;
+    }
+
     /**
      * Supprimer le fichier audio instrumental
      */
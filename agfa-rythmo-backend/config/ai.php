@@ -39,6 +39,20 @@
     // small: ~2GB RAM, plus lent, meilleure précision
     'whisper_model' => env('AI_WHISPER_MODEL', 'tiny'),
 
+    // Mode de transcription :
+    // - full : la vidéo entière en un appel Whisper (comportement historique)
+    // - vad : zones de parole détectées (webrtcvad), transcrites par chunks ; RAM bornée, silences ignorés
+    'transcription_mode' => env('AI_TRANSCRIPTION_MODE', 'full'),
+
+    // Durée max de parole par chunk en mode vad (secondes, 30 = fenêtre native de Whisper)
+    'transcription_chunk_seconds' => env('AI_TRANSCRIPTION_CHUNK_SECONDS', 30),
+
+    // Mode vad : nombre de process Whisper en parallèle (1 = séquentiel)
+    // Chaque process charge son propre modèle : ~RAM modèle + 400MB par process (borné à la RAM disponible)
+    // Exemple serveur 8 cœurs / 16GB avec 'small' : 4 process x 2 threads
+    'transcription_workers' => env('AI_TRANSCRIPTION_WORKERS', 1),
+    'transcription_threads_per_worker' => env('AI_TRANSCRIPTION_THREADS_PER_WORKER', 2),
+
     // Activer la diarization (séparation des locuteurs)
     'diarization_enabled' => env('AI_DIARIZATION_ENABLED', false),
 
@@ -52,9 +66,88 @@
     // - resemblyzer : Embeddings 256D pré-entraînés (lourd, ~2GB RAM, précision 85-95%, serveur 4GB) ⭐⭐⭐⭐⭐
     'diarization_method' => env('AI_DIARIZATION_METHOD', 'mfcc'),
 
+    // Logs détaillés par segment du clustering (similarités, scores par k)
+    // Coûteux et très verbeux sur les longues vidéos : à activer uniquement pour déboguer
+    'diarization_verbose' => env('AI_DIARIZATION_VERBOSE', false),
+
+    // Moteur de features de la diarization MFCC :
+    // - segment : pile librosa complète sur chaque segment (historique)
+    // - frames : features calculées une fois par zone de parole puis agrégées par segment
+    //   (~1.7x plus rapide, recommandé pour les longs métrages à milliers de répliques)
+    'mfcc_feature_engine' => env('AI_MFCC_FEATURE_ENGINE', 'segment'),
+
+    // Estimateur de pitch (F0) de la diarization MFCC :
+    // - piptrack : historique, résultats identiques aux versions précédentes
+    // - yin : vraie fondamentale sur un hop de 20ms, ~1.4x plus rapide (tessitures recalculées)
+    'mfcc_pitch_method' => env('AI_MFCC_PITCH_METHOD', 'piptrack'),
+
+    // Process d'extraction des features MFCC (moteur 'segment'), ~350MB RAM chacun
+    // 1 = séquentiel ; réduit automatiquement selon les cœurs et la RAM disponible
+    'mfcc_workers' => env('AI_MFCC_WORKERS', 1),
+
+    // Au-delà de ce nombre de segments, le clustering des locuteurs (MFCC et Resemblyzer)
+    // passe en mode scalable : micro-clusters + silhouettes échantillonnées (RAM et temps bornés)
+    // 0 = toujours le clustering exact (mémoire O(n²))
+    'clustering_scalable_threshold' => env('AI_CLUSTERING_SCALABLE_THRESHOLD', 1500),
+
+    // Clustering des locuteurs de la diarization MFCC :
+    // - hierarchical : dendrogramme, nombre de locuteurs choisi par silhouette ou eigengap (défaut)
+    // - online : assignation séquentielle avec contrainte de tessiture, O(locuteurs) par segment
+    'mfcc_clustering' => env('AI_MFCC_CLUSTERING', 'hierarchical'),
+
+    // Choix du nombre de locuteurs : silhouette (un clustering par k testé) ou eigengap
+    // (une décomposition spectrale, puis clustering spectral) — MFCC et Resemblyzer
+    'speaker_count_method' => env('AI_SPEAKER_COUNT_METHOD', 'silhouette'),
+
+    // Coupe des segments Whisper aux changements de locuteur (ΔBIC sur les MFCC) avant la diarization
+    'speaker_change_enabled' => env('AI_SPEAKER_CHANGE_ENABLED', false),
+
+    // Pénalité λ du ΔBIC : plus grand = moins de coupes
+    'speaker_change_penalty' => env('AI_SPEAKER_CHANGE_PENALTY', 1.5),
+
+    // Embeddings Resemblyzer :
+    // - segment : une passe de l'encodeur par segment (historique)
+    // - track : fenêtres glissantes sur toute la piste par lots, moyennées par segment
+    //   (beaucoup moins de passes de l'encodeur sur les longs métrages, valeurs différentes)
+    'resemblyzer_embedding_mode' => env('AI_RESEMBLYZER_EMBEDDING_MODE', 'segment'),
+
+    // Encodeur Resemblyzer :
+    // - torch : VoiceEncoder PyTorch float32 (historique)
+    // - onnx : export ONNX quantifié int8 servi par ONNX Runtime (plus rapide et plus léger sur CPU)
+    //   vérifier la parité avec : python scripts/voice_encoder_onnx.py parity audio.wav transcription.json
+    'resemblyzer_backend' => env('AI_RESEMBLYZER_BACKEND', 'torch'),
+
+    // Threads intra-op d'ONNX Runtime pour l'encodeur (backend onnx)
+    'resemblyzer_onnx_threads' => env('AI_RESEMBLYZER_ONNX_THREADS', 2),
+
+    // Registre des locuteurs par projet / série (SPEAKER_<id> stables d'un épisode à l'autre)
+    'speaker_registry_enabled' => env('AI_SPEAKER_REGISTRY_ENABLED', false),
+
+    // Cosinus minimal segment -> locuteur connu (vide = 0.75 Resemblyzer, 0.85 MFCC)
+    'speaker_registry_threshold' => env('AI_SPEAKER_REGISTRY_THRESHOLD'),
+
     // Nombre maximum de locuteurs à détecter (2-20)
     'max_speakers' => env('AI_MAX_SPEAKERS', 10),
 
+    // Worker Python persistant (scripts/dialogue_worker.py)
+    // Garde Whisper/Demucs/Resemblyzer en mémoire entre les jobs (évite import + chargement modèles)
+    // Laisser vide pour le mode one-shot (un process Python complet par job)
+    'worker_socket' => env('AI_WORKER_SOCKET', ''),
+
+    // Cache des étapes du pipeline (scripts/pipeline_cache.py)
+    // Clé = hash du fichier vidéo + paramètres de l'étape : ré-importer la même vidéo
+    // ou relancer avec un autre nombre de locuteurs ne refait ni FFmpeg, ni Demucs, ni Whisper
+    'cache' => [
+        'enabled' => env('AI_CACHE_ENABLED', false),
+        'dir' => env('AI_CACHE_DIR', storage_path('app/ai_cache')),
+        'max_mb' => env('AI_CACHE_MAX_MB', 5120), // Éviction LRU au-delà
+    ],
+
+    // Profilage cProfile par étape (scripts/stage_metrics.py) : un fichier .prof par étape
+    // dans ce dossier (vide = désactivé). Les mesures temps/CPU/RAM/I/O sont toujours
+    // présentes dans metadata.performance du JSON de sortie.
+    'profile_dir' => env('AI_PROFILE_DIR', ''),
+
     // Langues supportées pour la transcription
     // Liste complète : https://github.com/openai/whisper#available-models-and-languages
     'supported_languages' => [
@@ -0,0 +1,347 @@
+#!/usr/bin/env python3
+"""
+Décodage audio par pipe FFmpeg -> numpy (sans fichier WAV temporaire)
+
+FFmpeg écrit du PCM float32 brut sur stdout, lu directement dans un buffer numpy.
+Le format de sortie suit ce dont l'étape suivante a besoin :
+    - 16kHz mono pour Whisper et la diarization (séparation vocale désactivée)
+    - 44.1kHz stéréo uniquement quand Demucs tourne
+
+Pour les longs métrages, decode_audio_to_memmap() écrit le PCM dans un fichier temporaire
+mappé en mémoire : les pages sont relues depuis le disque à la demande, la RAM ne dépend
+plus de la durée de la vidéo.
+
+load_audio_mono() est le chargeur des CLI de diarization : fichier audio lu par blocs en
+float32 (jamais de float64 complet), downmix mono bloc par bloc, et PCM brut mappé en
+mémoire pour les longues sources, réutilisable d'un lancement à l'autre avec cache_dir
+(AI_AUDIO_CACHE_DIR). Avec sample_rate, le flux est rééchantillonné une seule fois au
+décodage (soxr en flux, bloc par bloc) : les segments sont ensuite des vues sans copie ni
+rééchantillonnage (Resemblyzer attend du 16kHz).
+
+Usage:
+    from audio_io import decode_audio, write_wav, WHISPER_SAMPLE_RATE
+    audio = decode_audio('video.mp4')                       # float32 (n,) à 16kHz
+    stereo = decode_audio('video.mp4', 44100, channels=2)   # float32 (n, 2) à 44.1kHz
+    mapped = decode_audio_to_memmap('video.mp4')            # np.memmap float32 (n,) à 16kHz
+    audio, sr = load_audio_mono('episode.wav')              # float32 (n,) à la fréquence du fichier
+    audio, sr = load_audio_mono('episode.wav', sample_rate=16000)   # float32 (n,) rééchantillonné à 16kHz
+"""
+
+import hashlib
+import os
+import subprocess
+import sys
+import tempfile
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+# Fréquence attendue par Whisper (whisper.audio.SAMPLE_RATE) et les diarizers
+WHISPER_SAMPLE_RATE = 16000
+# Fréquence / canaux attendus par Demucs
+DEMUCS_SAMPLE_RATE = 44100
+DEMUCS_CHANNELS = 2
+
+# Taille des lectures sur le pipe (1MB ~ 16s de 16kHz mono float32)
+PIPE_CHUNK_BYTES = 1024 * 1024
+
+# Frames lues par bloc par load_audio_mono (~1.4s à 48kHz : quelques MB même en stéréo)
+LOAD_BLOCK_FRAMES = 65536
+# Au-delà (float32 mono), load_audio_mono mappe le PCM sur disque au lieu de le garder en RAM
+MMAP_THRESHOLD_MB = 256
+
+
+def _ffmpeg_f32_cmd(ffmpeg: str, path: str, sample_rate: int, channels: int, output: str) -> list:
+    return [
+        ffmpeg, '-nostdin',
+        '-loglevel', 'error',
+        '-i', path,
+        '-vn',  # Pas de vidéo
+        '-f', 'f32le',  # PCM float32 brut (pas d'en-tête WAV)
+        '-acodec', 'pcm_f32le',
+        '-ac', str(channels),
+        '-ar', str(sample_rate),
+        '-y',
+        output
+    ]
+
+
+def decode_audio(path: str, sample_rate: int = WHISPER_SAMPLE_RATE, channels: int = 1,
+                 ffmpeg: str = 'ffmpeg') -> np.ndarray:
+    """
+    Décoder l'audio d'un fichier (vidéo ou audio) en float32 via un pipe FFmpeg
+
+    Args:
+        path: Fichier source
+        sample_rate: Fréquence de sortie (FFmpeg rééchantillonne)
+        channels: Nombre de canaux de sortie (FFmpeg downmixe)
+        ffmpeg: Binaire FFmpeg
+
+    Returns:
+        Tableau float32 dans [-1, 1], forme (n,) en mono ou (n, channels) sinon
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Audio source not found: {path}")
+
+    cmd = _ffmpeg_f32_cmd(ffmpeg, path, sample_rate, channels, '-')  # stdout
+
+    # stderr dans un vrai fichier : pas de deadlock si FFmpeg est bavard pendant qu'on lit stdout
+    with tempfile.TemporaryFile() as stderr_file:
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file)
+        buffer = bytearray()
+        try:
+            while True:
+                chunk = process.stdout.read(PIPE_CHUNK_BYTES)
+                if not chunk:
+                    break
+                buffer += chunk
+        finally:
+            process.stdout.close()
+            process.wait()
+
+        if process.returncode != 0:
+            stderr_file.seek(0)
+            error = stderr_file.read().decode('utf-8', errors='replace')
+            raise RuntimeError(f"FFmpeg error: {error}")
+
+    # Ignorer une éventuelle frame incomplète en fin de flux
+    frame_bytes = 4 * channels
+    n_frames = len(buffer) // frame_bytes
+    # frombuffer sur un bytearray : pas de copie, tableau modifiable
+    audio = np.frombuffer(buffer, dtype=np.float32, count=n_frames * channels)
+
+    if channels > 1:
+        audio = audio.reshape(n_frames, channels)
+    return audio
+
+
+def decode_audio_to_memmap(path: str, sample_rate: int = WHISPER_SAMPLE_RATE, channels: int = 1,
+                           ffmpeg: str = 'ffmpeg') -> np.ndarray:
+    """
+    Décoder l'audio dans un fichier PCM temporaire mappé en mémoire (RAM bornée)
+
+    Le fichier est supprimé dès le mapping ouvert : l'espace disque est libéré
+    automatiquement quand le tableau n'est plus référencé.
+
+    Returns:
+        np.memmap float32 en lecture seule, forme (n,) en mono ou (n, channels) sinon
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Audio source not found: {path}")
+
+    temp_file = tempfile.NamedTemporaryFile(suffix='.f32', delete=False)
+    temp_file.close()
+
+    try:
+        result = subprocess.run(_ffmpeg_f32_cmd(ffmpeg, path, sample_rate, channels, temp_file.name),
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"FFmpeg error: {result.stderr}")
+
+        n_frames = os.path.getsize(temp_file.name) // (4 * channels)
+        if n_frames == 0:
+            return np.zeros((0, channels) if channels > 1 else 0, dtype=np.float32)
+
+        shape = (n_frames, channels) if channels > 1 else (n_frames,)
+        return np.memmap(temp_file.name, dtype=np.float32, mode='r', shape=shape)
+    finally:
+        # Le mapping garde l'inode vivant : le fichier peut disparaître du répertoire
+        os.unlink(temp_file.name)
+
+
+def audio_cache_dir() -> Optional[str]:
+    """Dossier du PCM brut réutilisable (AI_AUDIO_CACHE_DIR), None si désactivé"""
+    return os.getenv('AI_AUDIO_CACHE_DIR') or None
+
+
+def _raw_cache_path(cache_dir: str, path: str, sample_rate: int) -> str:
+    """Fichier PCM du cache : empreinte chemin + taille + date de la source (source modifiée = nouveau fichier)"""
+    stat = os.stat(path)
+    fingerprint = f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    digest = hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()[:20]
+    return os.path.join(cache_dir, f"{digest}_{sample_rate}.f32")
+
+
+def _mono_blocks(path: str, block_frames: int, source_rate: Optional[int] = None,
+                 target_rate: Optional[int] = None) -> Iterator[np.ndarray]:
+    """
+    Blocs float32 mono d'un fichier (downmix bloc par bloc, jamais de tableau complet)
+
+    Si target_rate diffère de source_rate, les blocs passent dans un seul rééchantillonneur
+    soxr en flux (qualité HQ, celle de librosa.resample) : pas de réinitialisation par bloc.
+    """
+    import soundfile as sf
+
+    resampler = None
+    if target_rate and source_rate and target_rate != source_rate:
+        import soxr
+        resampler = soxr.ResampleStream(source_rate, target_rate, 1, dtype='float32', quality='HQ')
+
+    for block in sf.blocks(path, blocksize=block_frames, dtype='float32', always_2d=True):
+        # Moyenne des canaux en float32 (même downmix que audio.mean(axis=1))
+        mono = block[:, 0] if block.shape[1] == 1 else block.mean(axis=1)
+        if resampler is not None:
+            mono = resampler.resample_chunk(np.ascontiguousarray(mono))
+            if len(mono) == 0:
+                continue
+        yield mono
+
+    if resampler is not None:
+        # Vider le filtre (fin du flux)
+        tail = resampler.resample_chunk(np.zeros(0, dtype=np.float32), last=True)
+        if len(tail):
+            yield tail
+
+
+def _read_blocks_mono(path: str, out: np.ndarray, block_frames: int, source_rate: Optional[int] = None,
+                      target_rate: Optional[int] = None) -> int:
+    """Remplir out bloc par bloc ; renvoie le nombre de frames écrites"""
+    written = 0
+    for mono in _mono_blocks(path, block_frames, source_rate, target_rate):
+        n = min(len(mono), len(out) - written)
+        if n <= 0:
+            break
+        out[written:written + n] = mono[:n]
+        written += n
+    return written
+
+
+def _open_raw(path: str, n_frames: int) -> np.ndarray:
+    if n_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(path, dtype=np.float32, mode='r', shape=(n_frames,))
+
+
+def _write_raw_mono(path: str, raw_path: str, n_frames: Optional[int], ffmpeg: str,
+                    block_frames: int, source_rate: Optional[int] = None,
+                    target_rate: Optional[int] = None) -> int:
+    """PCM float32 mono brut dans raw_path (soundfile par blocs, ou FFmpeg si n_frames est None) ; renvoie les frames"""
+    if n_frames is None:
+        result = subprocess.run(_ffmpeg_f32_cmd(ffmpeg, path, target_rate or WHISPER_SAMPLE_RATE, 1, raw_path),
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"FFmpeg error: {result.stderr}")
+        return os.path.getsize(raw_path) // 4
+
+    # Écriture séquentielle (pas de mapping en écriture : les pages écrites ne comptent pas dans le RSS)
+    written = 0
+    with open(raw_path, 'wb') as f:
+        for mono in _mono_blocks(path, block_frames, source_rate, target_rate):
+            f.write(mono.tobytes())
+            written += len(mono)
+    return written
+
+
+def load_audio_mono(path: str, cache_dir: Optional[str] = None, mmap: Optional[bool] = None,
+                    ffmpeg: str = 'ffmpeg', block_frames: int = LOAD_BLOCK_FRAMES,
+                    sample_rate: Optional[int] = None) -> Tuple[np.ndarray, int]:
+    """
+    Charger un fichier audio en float32 mono sans jamais matérialiser de float64 ni de stéréo
+
+    Le fichier est lu par blocs de block_frames frames, downmixés au fil de l'eau :
+        - cache_dir : PCM brut persistant (<cache_dir>/<empreinte>_<sr>.f32) mappé en mémoire,
+          réutilisé sans décodage tant que la source ne change pas
+        - mmap (défaut: au-delà de MMAP_THRESHOLD_MB) : PCM dans un fichier temporaire mappé
+          puis supprimé (comme decode_audio_to_memmap)
+        - sinon : tableau float32 en RAM
+
+    Formats non lus par libsndfile (MP4, AAC...) : décodage FFmpeg à sample_rate
+    (défaut: WHISPER_SAMPLE_RATE).
+
+    Args:
+        path: Fichier audio source
+        cache_dir: Dossier du cache PCM (None = pas de cache persistant)
+        mmap: Forcer (True) ou interdire (False) le mapping sans cache, None = selon la taille
+        ffmpeg: Binaire FFmpeg (repli)
+        block_frames: Frames par bloc de lecture
+        sample_rate: Fréquence de sortie (rééchantillonnage unique au décodage),
+            None = fréquence du fichier
+
+    Returns:
+        (audio float32 (n,), fréquence d'échantillonnage)
+    """
+    import soundfile as sf
+
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Audio source not found: {path}")
+
+    try:
+        info = sf.info(path)
+        source_rate, n_frames = info.samplerate, info.frames
+        if sample_rate and sample_rate != source_rate:
+            # Frames après rééchantillonnage (borne haute, le tableau est recoupé)
+            n_frames = -(-n_frames * sample_rate // source_rate)
+        else:
+            sample_rate = source_rate
+    except RuntimeError:
+        # libsndfile ne sait pas lire ce conteneur : FFmpeg décode et rééchantillonne
+        sample_rate = sample_rate or WHISPER_SAMPLE_RATE
+        source_rate, n_frames = sample_rate, None
+
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+        raw_path = _raw_cache_path(cache_dir, path, sample_rate)
+        if os.path.exists(raw_path):
+            return _open_raw(raw_path, os.path.getsize(raw_path) // 4), sample_rate
+
+        # Écriture dans un fichier temporaire du même dossier puis renommage atomique
+        # (un autre process ne voit jamais de PCM partiel)
+        fd, temp_path = tempfile.mkstemp(suffix='.f32.tmp', dir=cache_dir)
+        os.close(fd)
+        try:
+            written = _write_raw_mono(path, temp_path, n_frames, ffmpeg, block_frames, source_rate, sample_rate)
+            os.replace(temp_path, raw_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        return _open_raw(raw_path, written), sample_rate
+
+    if mmap is None:
+        mmap = n_frames is None or n_frames * 4 > MMAP_THRESHOLD_MB * 1024 * 1024
+
+    if not mmap:
+        audio = np.empty(n_frames, dtype=np.float32)
+        return audio[:_read_blocks_mono(path, audio, block_frames, source_rate, sample_rate)], sample_rate
+
+    temp_file = tempfile.NamedTemporaryFile(suffix='.f32', delete=False)
+    temp_file.close()
+    try:
+        written = _write_raw_mono(path, temp_file.name, n_frames, ffmpeg, block_frames, source_rate, sample_rate)
+        return _open_raw(temp_file.name, written), sample_rate
+    finally:
+        # Le mapping garde l'inode vivant : le fichier peut disparaître du répertoire
+        os.unlink(temp_file.name)
+
+
+def write_wav(path: str, audio: np.ndarray, sample_rate: int):
+    """
+    Écrire un tableau float32 en WAV 16-bit (pour les étapes qui lisent encore un fichier)
+
+    Args:
+        path: Fichier de sortie
+        audio: Forme (n,) ou (n, channels)
+        sample_rate: Fréquence d'échantillonnage
+    """
+    import soundfile as sf
+
+    sf.write(path, audio, sample_rate, subtype='PCM_16')
+
+
+def describe(audio: np.ndarray, sample_rate: int) -> str:
+    """Résumé lisible pour les logs : durée, canaux, taille mémoire"""
+    channels = 1 if audio.ndim == 1 else audio.shape[1]
+    duration = audio.shape[0] / sample_rate
+    size_mb = audio.nbytes / (1024 * 1024)
+    return f"{duration:.1f}s, {sample_rate}Hz, {channels}ch, {size_mb:.1f}MB in memory"
+
+
+if __name__ == '__main__':
+    # Petit utilitaire de diagnostic : python audio_io.py video.mp4 [sample_rate] [channels]
+    if len(sys.argv) < 2:
+        print("Usage: python audio_io.py <fichier> [sample_rate] [channels]", file=sys.stderr)
+        sys.exit(1)
+    rate = int(sys.argv[2]) if len(sys.argv) > 2 else WHISPER_SAMPLE_RATE
+    n_channels = int(sys.argv[3]) if len(sys.argv) > 3 else 1
+    decoded = decode_audio(sys.argv[1], rate, n_channels)
+    print(describe(decoded, rate))
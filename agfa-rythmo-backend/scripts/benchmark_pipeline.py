@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Benchmark des étapes du pipeline IA sur audio synthétique (synthetic_audio.py)
+
+Chaque étape est chronométrée isolément (stage_metrics.StageMetrics) sur des épisodes
+déterministes de plusieurs durées ; le débit est exprimé en secondes d'audio par seconde
+de calcul (realtime_factor). Les étapes de clustering indiquent aussi l'accord de leurs labels
+avec la vérité terrain (truth_ari), et les variantes eigengap avec la recherche silhouette
+(silhouette_ari). Hors ligne, les modèles lourds sont remplacés par des stubs
+(marqués "model": "stub" dans le rapport) : on mesure alors le code du dépôt autour du modèle.
+
+Étapes:
+    audio_decode          decode_audio (pipe FFmpeg) d'un WAV 44.1kHz stéréo
+    vad                   detect_speech_regions + plan_chunks
+    transcription         DialogueExtractor._transcribe_streaming (Whisper réel ou stub)
+    voice_features        simple_diarization.extract_voice_features sur chaque réplique
+    voice_features_frames frame_features.extract_features_framewise (moteur 'frames')
+    mfcc_clustering       simple_diarization.apply_clustering (recherche silhouette)
+    mfcc_clustering_eigengap       idem, nombre de locuteurs par eigengap (speaker_count.py)
+    speaker_embeddings    Resemblyzer (réel ou stub) sur chaque réplique
+    embedding_clustering  resemblyzer_diarization.cluster_embeddings (recherche silhouette)
+    embedding_clustering_eigengap  idem, nombre de locuteurs par eigengap
+    translation           translate_nllb.translate_batch (NLLB réel ou stub)
+
+Usage:
+    python benchmark_pipeline.py --minutes 1,10 --output bench.json
+    python benchmark_pipeline.py --minutes 1 --stages voice_features,mfcc_clustering
+    python benchmark_pipeline.py --minutes 10,60 --stages embedding_clustering,embedding_clustering_eigengap
+    python benchmark_pipeline.py --minutes 1,10 --output new.json --compare bench.json
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from progress import current_rss_mb
+from stage_metrics import StageMetrics
+from synthetic_audio import SAMPLE_RATE, generate_episode
+
+DEFAULT_MINUTES = '1,10,60'
+STAGES = [
+    'audio_decode', 'vad', 'transcription', 'voice_features', 'voice_features_frames', 'mfcc_clustering',
+    'mfcc_clustering_eigengap', 'speaker_embeddings', 'embedding_clustering', 'embedding_clustering_eigengap',
+    'translation',
+]
+
+
+class StubWhisper:
+    """Remplaçant de whisper.model.transcribe : un segment par zone du chunk, coût ~ lecture du chunk"""
+
+    def transcribe(self, audio: np.ndarray, **options) -> Dict:
+        duration = len(audio) / SAMPLE_RATE
+        energy = float(np.sqrt(np.mean(audio * audio))) if len(audio) else 0.0
+        segments = [{
+            'id': 0, 'seek': 0, 'start': 0.0, 'end': round(duration, 3),
+            'text': f" stub {energy:.3f}",
+            'words': [{'word': 'stub', 'start': 0.0, 'end': round(duration, 3)}],
+        }]
+        return {'text': segments[0]['text'], 'segments': segments, 'language': options.get('language') or 'fr'}
+
+
+class StubVoiceEncoder:
+    """Remplaçant de VoiceEncoder : projection aléatoire fixe d'un log-spectre moyen -> 256D normalisé"""
+
+    def __init__(self, seed: int = 0, n_fft: int = 512):
+        self.n_fft = n_fft
+        self.projection = np.random.default_rng(seed).normal(size=(n_fft // 2 + 1, 256)).astype(np.float32)
+
+    def embed(self, wav: np.ndarray) -> np.ndarray:
+        usable = len(wav) // self.n_fft * self.n_fft
+        frames = np.asarray(wav[:usable], dtype=np.float32).reshape(-1, self.n_fft)
+        spectrum = np.log1p(np.abs(np.fft.rfft(frames * np.hanning(self.n_fft), axis=1)).mean(axis=0))
+        embedding = spectrum @ self.projection
+        return embedding / (np.linalg.norm(embedding) + 1e-9)
+
+
+def stub_translator(texts, src_lang=None, tgt_lang=None, max_length=512, batch_size=8):
+    """Remplaçant du pipeline transformers 'translation'"""
+    if isinstance(texts, str):
+        return [{'translation_text': texts[::-1]}]
+    return [{'translation_text': text[::-1]} for text in texts]
+
+
+# ----------------------------------------------------------------------
+# Étapes (chaque fonction renvoie des infos de contrôle, pas l'audio)
+# ----------------------------------------------------------------------
+
+def stage_audio_decode(ctx: Dict) -> Dict:
+    import soundfile as sf
+    from audio_io import decode_audio
+
+    # Source au format d'un export vidéo typique : 44.1kHz stéréo (préparée hors mesure)
+    source = os.path.join(ctx['tmpdir'], 'source.wav')
+    if not os.path.exists(source):
+        mono = os.path.join(ctx['tmpdir'], 'mono.wav')
+        sf.write(mono, ctx['audio'], SAMPLE_RATE, subtype='PCM_16')
+        subprocess.run([ctx['ffmpeg'], '-nostdin', '-loglevel', 'error', '-i', mono,
+                        '-ar', '44100', '-ac', '2', '-y', source], check=True)
+        os.unlink(mono)
+
+    def run():
+        decoded = decode_audio(source, SAMPLE_RATE, channels=1, ffmpeg=ctx['ffmpeg'])
+        return {'samples': int(len(decoded))}
+
+    return _timed(ctx, 'audio_decode', run)
+
+
+def stage_vad(ctx: Dict) -> Dict:
+    from vad_chunking import detect_speech_regions, plan_chunks
+
+    def run():
+        regions = detect_speech_regions(ctx['audio'], SAMPLE_RATE)
+        ctx['chunks'] = plan_chunks(ctx['audio'], regions, SAMPLE_RATE)
+        return {'regions': len(regions), 'chunks': len(ctx['chunks'])}
+
+    return _timed(ctx, 'vad', run)
+
+
+def stage_transcription(ctx: Dict) -> Dict:
+    import extract_dialogues
+
+    model, model_name = StubWhisper(), 'stub'
+    if ctx['real_models']:
+        try:
+            extract_dialogues._import_ml_dependencies()
+            model, model_name = extract_dialogues.whisper.load_model('tiny', device='cpu'), 'whisper-tiny'
+        except (Exception, SystemExit) as e:
+            print(f"⚠️  Whisper indisponible ({e}), stub utilisé", file=sys.stderr)
+
+    extractor = extract_dialogues.DialogueExtractor.__new__(extract_dialogues.DialogueExtractor)
+    extractor.model, extractor.model_name = model, 'tiny'
+    extractor.transcription_mode, extractor.chunk_seconds = 'vad', 30.0
+    extractor.transcription_workers, extractor.threads_per_worker = 1, 1
+
+    def run():
+        result = extractor._transcribe_streaming(ctx['audio'], {'language': None, 'verbose': False,
+                                                                 'word_timestamps': True})
+        return {'segments': len(result['segments'])}
+
+    return _timed(ctx, 'transcription', run, model=model_name)
+
+
+def stage_voice_features(ctx: Dict) -> Dict:
+    from simple_diarization import extract_voice_features
+
+    def run():
+        features, voice_info, speakers = [], [], []
+        for segment in ctx['segments']:
+            result = extract_voice_features(ctx['audio'], SAMPLE_RATE, segment['start'], segment['end'])
+            if result is not None:
+                features.append(result[0])
+                voice_info.append(result[1])
+                speakers.append(segment['speaker'])
+        ctx['features'], ctx['voice_info'], ctx['feature_speakers'] = features, voice_info, speakers
+        return {'segments': len(ctx['segments']), 'features': len(features)}
+
+    return _timed(ctx, 'voice_features', run)
+
+
+def stage_voice_features_frames(ctx: Dict) -> Dict:
+    from frame_features import extract_features_framewise
+
+    def run():
+        results = extract_features_framewise(ctx['audio'], SAMPLE_RATE, ctx['segments'])
+        return {'segments': len(ctx['segments']), 'features': sum(1 for r in results if r is not None)}
+
+    return _timed(ctx, 'voice_features_frames', run)
+
+
+def _clustering_info(ctx: Dict, labels: np.ndarray, truth: List[str], reference: Optional[str] = None) -> Dict:
+    """Locuteurs détectés + accord (indice de Rand ajusté) avec la vérité terrain / la recherche silhouette"""
+    from sklearn.metrics import adjusted_rand_score
+
+    info = {
+        'detected_speakers': int(len(np.unique(labels))),
+        'expected_speakers': ctx['n_speakers'],
+        'truth_ari': round(float(adjusted_rand_score(truth, labels)), 3),
+    }
+    if reference is not None and reference in ctx:
+        info['silhouette_ari'] = round(float(adjusted_rand_score(ctx[reference], labels)), 3)
+    return info
+
+
+def _reference_labels(ctx: Dict, key: str, cluster: Callable[[], np.ndarray]):
+    """Labels silhouette de référence des variantes eigengap (absents si la recherche échoue)"""
+    if key in ctx:
+        return
+    try:
+        ctx[key] = cluster()
+    except Exception as e:
+        print(f"⚠️  Référence silhouette indisponible ({type(e).__name__}: {e})", file=sys.stderr)
+
+
+def _mfcc_clustering(ctx: Dict, name: str, count_method: str) -> Dict:
+    from simple_diarization import apply_clustering
+
+    if 'features' not in ctx:
+        stage_voice_features(ctx)
+    # Épisodes courts : pas plus de locuteurs que de répliques analysées
+    max_speakers = min(ctx['max_speakers'], len(ctx['features']))
+    if count_method != 'silhouette':
+        _reference_labels(ctx, 'mfcc_labels',
+                          lambda: apply_clustering(ctx['features'], ctx['voice_info'], max_speakers, 'silhouette'))
+
+    def run():
+        labels = apply_clustering(ctx['features'], ctx['voice_info'], max_speakers, count_method)
+        if count_method == 'silhouette':
+            ctx['mfcc_labels'] = labels
+            return _clustering_info(ctx, labels, ctx['feature_speakers'])
+        return _clustering_info(ctx, labels, ctx['feature_speakers'], reference='mfcc_labels')
+
+    return _timed(ctx, name, run)
+
+
+def stage_mfcc_clustering(ctx: Dict) -> Dict:
+    return _mfcc_clustering(ctx, 'mfcc_clustering', 'silhouette')
+
+
+def stage_mfcc_clustering_eigengap(ctx: Dict) -> Dict:
+    return _mfcc_clustering(ctx, 'mfcc_clustering_eigengap', 'eigengap')
+
+
+def stage_speaker_embeddings(ctx: Dict) -> Dict:
+    encoder, model_name = None, 'stub'
+    if ctx['real_models']:
+        try:
+            from resemblyzer_diarization import load_encoder
+            encoder, model_name = load_encoder(), 'resemblyzer'
+        except ImportError as e:
+            print(f"⚠️  Resemblyzer indisponible ({e}), stub utilisé", file=sys.stderr)
+
+    def run():
+        if encoder is not None:
+            from resemblyzer_diarization import extract_embeddings_from_array
+            embeddings = extract_embeddings_from_array(encoder, ctx['audio'], SAMPLE_RATE, ctx['segments'])
+        else:
+            stub = StubVoiceEncoder(ctx['seed'])
+            embeddings = [stub.embed(ctx['audio'][int(s['start'] * SAMPLE_RATE):int(s['end'] * SAMPLE_RATE)])
+                          for s in ctx['segments']]
+        ctx['embeddings'] = np.array(embeddings)
+        return {'embeddings': len(embeddings)}
+
+    return _timed(ctx, 'speaker_embeddings', run, model=model_name)
+
+
+def _embedding_clustering(ctx: Dict, name: str, count_method: str) -> Dict:
+    from resemblyzer_diarization import cluster_embeddings
+
+    if 'embeddings' not in ctx:
+        stage_speaker_embeddings(ctx)
+    max_speakers = min(ctx['max_speakers'], len(ctx['embeddings']))
+    if count_method != 'silhouette':
+        _reference_labels(ctx, 'embedding_labels',
+                          lambda: cluster_embeddings(ctx['embeddings'], max_speakers, count_method='silhouette'))
+
+    truth = [segment['speaker'] for segment in ctx['segments']]
+
+    def run():
+        labels = cluster_embeddings(ctx['embeddings'], max_speakers, count_method=count_method)
+        if count_method == 'silhouette':
+            ctx['embedding_labels'] = labels
+            return _clustering_info(ctx, labels, truth)
+        return _clustering_info(ctx, labels, truth, reference='embedding_labels')
+
+    return _timed(ctx, name, run)
+
+
+def stage_embedding_clustering(ctx: Dict) -> Dict:
+    return _embedding_clustering(ctx, 'embedding_clustering', 'silhouette')
+
+
+def stage_embedding_clustering_eigengap(ctx: Dict) -> Dict:
+    return _embedding_clustering(ctx, 'embedding_clustering_eigengap', 'eigengap')
+
+
+def stage_translation(ctx: Dict) -> Dict:
+    try:
+        import translate_nllb
+    except SystemExit:
+        # translate_nllb quitte à l'import si transformers/torch manquent
+        return {'skipped': 'transformers/torch non installés (translate_nllb.py)'}
+
+    translator, model_name = stub_translator, 'stub'
+    if ctx['real_models']:
+        try:
+            translator, model_name = translate_nllb.load_model('600M'), 'nllb-600M'
+        except SystemExit:
+            print("⚠️  NLLB indisponible, stub utilisé", file=sys.stderr)
+
+    texts = [segment['text'].strip() for segment in ctx['segments']]
+
+    def run():
+        translated = translate_nllb.translate_batch(translator, texts, 'fr', 'en')
+        return {'texts': len(translated)}
+
+    return _timed(ctx, 'translation', run, model=model_name)
+
+
+STAGE_FUNCTIONS: Dict[str, Callable[[Dict], Dict]] = {
+    'audio_decode': stage_audio_decode,
+    'vad': stage_vad,
+    'transcription': stage_transcription,
+    'voice_features': stage_voice_features,
+    'voice_features_frames': stage_voice_features_frames,
+    'mfcc_clustering': stage_mfcc_clustering,
+    'mfcc_clustering_eigengap': stage_mfcc_clustering_eigengap,
+    'speaker_embeddings': stage_speaker_embeddings,
+    'embedding_clustering': stage_embedding_clustering,
+    'embedding_clustering_eigengap': stage_embedding_clustering_eigengap,
+    'translation': stage_translation,
+}
+
+
+def _timed(ctx: Dict, name: str, run: Callable[[], Dict], model: Optional[str] = None) -> Dict:
+    """Exécuter une étape ctx['repeat'] fois, garder la meilleure mesure (moins de bruit)"""
+    best = None
+    for _ in range(ctx['repeat']):
+        gc.collect()
+        rss_before = current_rss_mb() or 0.0
+        metrics = StageMetrics(profile_dir='')
+        with metrics.stage(name, audio_seconds=ctx['duration']):
+            info = run()
+        metrics.close()
+
+        stage = metrics.report()['stages'][name]
+        stage['peak_rss_delta_mb'] = round(stage['peak_rss_mb'] - rss_before, 1)
+        if best is None or stage['wall_seconds'] < best['wall_seconds']:
+            best = stage
+            best['info'] = info
+
+    best.pop('calls', None)
+    if model:
+        best['model'] = model
+    return best
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmark(minutes: List[float], stages: List[str], n_speakers: int = 3, seed: int = 0,
+                  repeat: int = 1, real_models: bool = False, ffmpeg: str = 'ffmpeg') -> Dict:
+    """
+    Exécuter les étapes demandées sur un épisode synthétique par durée
+
+    Returns:
+        {'environment': {...}, 'runs': {'<minutes>': {'stages': {...}}}}
+    """
+    report = {
+        'environment': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'git_revision': _git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': seed,
+            'speakers': n_speakers,
+            'repeat': repeat,
+        },
+        'runs': {},
+    }
+
+    for duration_minutes in minutes:
+        print(f"\n[BENCH] Episode {duration_minutes:g} min...", file=sys.stderr)
+        generation_start = time.perf_counter()
+        audio, segments = generate_episode(duration_minutes * 60, n_speakers, seed)
+        print(f"[BENCH] Generated in {time.perf_counter() - generation_start:.1f}s "
+              f"({len(segments)} segments)", file=sys.stderr)
+
+        with tempfile.TemporaryDirectory(prefix='agfa_bench_') as tmpdir:
+            ctx = {
+                'audio': audio, 'segments': segments, 'duration': len(audio) / SAMPLE_RATE,
+                'n_speakers': n_speakers, 'max_speakers': 10, 'seed': seed, 'repeat': repeat,
+                'real_models': real_models, 'ffmpeg': ffmpeg, 'tmpdir': tmpdir,
+            }
+            results = {}
+            for name in stages:
+                try:
+                    results[name] = STAGE_FUNCTIONS[name](ctx)
+                except Exception as e:
+                    results[name] = {'error': f"{type(e).__name__}: {e}"}
+                _print_stage(name, results[name])
+
+        report['runs'][f"{duration_minutes:g}"] = {'audio_seconds': len(audio) / SAMPLE_RATE,
+                                                  'segments': len(segments), 'stages': results}
+        del audio, ctx
+        gc.collect()
+
+    return report
+
+
+def _print_stage(name: str, stage: Dict):
+    if 'wall_seconds' not in stage:
+        print(f"[BENCH] {name:<29} {stage.get('skipped') or stage.get('error')}", file=sys.stderr)
+        return
+    print(f"[BENCH] {name:<29} {stage['wall_seconds']:>8.2f}s  x{stage.get('realtime_factor', 0):>8.1f} realtime  "
+          f"peak {stage['peak_rss_mb']:>7.1f}MB (+{stage['peak_rss_delta_mb']:.1f})", file=sys.stderr)
+    info = stage.get('info', {})
+    if 'truth_ari' in info:
+        agreement = f", silhouette ARI {info['silhouette_ari']:.3f}" if 'silhouette_ari' in info else ''
+        print(f"[BENCH] {'':<29} {info['detected_speakers']}/{info['expected_speakers']} locuteurs, "
+              f"ARI {info['truth_ari']:.3f}{agreement}", file=sys.stderr)
+
+
+def compare_reports(baseline: Dict, current: Dict) -> List[Dict]:
+    """Comparer deux rapports : ratio de temps (>1 = plus rapide) et écart de pic mémoire par étape"""
+    rows = []
+    for duration, run in current['runs'].items():
+        base_run = baseline.get('runs', {}).get(duration)
+        if not base_run:
+            continue
+        for name, stage in run['stages'].items():
+            base = base_run['stages'].get(name)
+            if not base or 'wall_seconds' not in base or 'wall_seconds' not in stage:
+                continue
+            rows.append({
+                'minutes': duration,
+                'stage': name,
+                'baseline_seconds': base['wall_seconds'],
+                'current_seconds': stage['wall_seconds'],
+                'speedup': round(base['wall_seconds'] / max(stage['wall_seconds'], 1e-6), 2),
+                'peak_delta_mb': round(stage['peak_rss_delta_mb'] - base.get('peak_rss_delta_mb', 0.0), 1),
+            })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark des étapes du pipeline IA sur audio synthétique")
+    parser.add_argument('--minutes', default=DEFAULT_MINUTES,
+                        help=f"Durées des épisodes en minutes, séparées par des virgules (défaut: {DEFAULT_MINUTES})")
+    parser.add_argument('--stages', default=','.join(STAGES),
+                        help="Étapes à mesurer (défaut: toutes)")
+    parser.add_argument('--speakers', type=int, default=3, help="Locuteurs synthétiques (défaut: 3)")
+    parser.add_argument('--seed', type=int, default=0, help="Graine de l'audio synthétique (défaut: 0)")
+    parser.add_argument('--repeat', type=int, default=1, help="Répétitions par étape, meilleur temps gardé")
+    parser.add_argument('--real-models', action='store_true',
+                        help="Utiliser Whisper/Resemblyzer/NLLB s'ils sont installés (sinon stubs)")
+    parser.add_argument('--ffmpeg', default='ffmpeg', help="Binaire FFmpeg (étape audio_decode)")
+    parser.add_argument('--output', help="Fichier JSON du rapport")
+    parser.add_argument('--compare', help="Rapport de référence à comparer (JSON d'un run précédent)")
+    args = parser.parse_args()
+
+    stages = [name.strip() for name in args.stages.split(',') if name.strip()]
+    unknown = [name for name in stages if name not in STAGE_FUNCTIONS]
+    if unknown:
+        parser.error(f"Étapes inconnues: {unknown} (disponibles: {STAGES})")
+
+    minutes = [float(value) for value in args.minutes.split(',')]
+    report = run_benchmark(minutes, stages, args.speakers, args.seed, args.repeat, args.real_models, args.ffmpeg)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        report['comparison'] = {
+            'baseline_revision': baseline.get('environment', {}).get('git_revision'),
+            'rows': compare_reports(baseline, report),
+        }
+        print("\n[BENCH] minutes stage                         baseline   current  speedup  peak Δ(MB)", file=sys.stderr)
+        for row in report['comparison']['rows']:
+            print(f"[BENCH] {row['minutes']:>7} {row['stage']:<29} {row['baseline_seconds']:>8.2f}s "
+                  f"{row['current_seconds']:>8.2f}s {row['speedup']:>7.2f}x {row['peak_delta_mb']:>+10.1f}",
+                  file=sys.stderr)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ Rapport: {args.output}", file=sys.stderr)
+    else:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
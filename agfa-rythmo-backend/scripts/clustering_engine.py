@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Clustering hiérarchique "une fois par métrique" pour la sélection du nombre de locuteurs
+
+apply_clustering (MFCC) et cluster_embeddings (Resemblyzer) testent chaque k candidat.
+Avec AgglomerativeClustering, chaque k recalculait la matrice de distances O(n²) et toute
+la hiérarchie, puis silhouette_score recalculait encore les distances. Ici, par métrique :
+    - distances condensées (pdist) calculées une fois
+    - dendrogramme (scipy linkage, celui qu'utilise sklearn) construit une fois
+    - chaque k = simple coupe de l'arbre, numérotée comme sklearn (labels identiques)
+    - silhouettes sur la matrice de distances précalculée
+
+Au-delà de AI_CLUSTERING_SCALABLE_THRESHOLD segments (long métrage : milliers de répliques),
+build_tree() passe en mode "scalable" (MicroClusterTree), à mémoire et temps prévisibles :
+    - pré-clustering MiniBatchKMeans en micro-clusters (O(n·d))
+    - dendrogramme pondéré par la taille des micro-clusters, sur leurs seuls centroïdes (O(m²))
+    - silhouettes estimées sur un sous-échantillon fixe (O(s²), le même pour tous les k)
+Mêmes k candidats et mêmes règles de sélection côté appelants : seul le coût change.
+
+Usage:
+    from clustering_engine import build_tree
+    tree = build_tree(features, metric='cosine', method='average')
+    for k in range(2, 9):
+        labels = tree.cut(k)
+        score = tree.silhouette(labels)
+"""
+
+import heapq
+import os
+import sys
+from typing import Optional
+
+import numpy as np
+from scipy.cluster import hierarchy
+from scipy.spatial.distance import cdist, pdist, squareform
+
+# Nombre de segments à partir duquel build_tree() passe en mode scalable
+DEFAULT_SCALABLE_THRESHOLD = 1500
+# Micro-clusters du mode scalable (bornes) : largement au-dessus du nombre de locuteurs testés
+MIN_MICRO_CLUSTERS = 64
+MAX_MICRO_CLUSTERS = 256
+# Taille du sous-échantillon des silhouettes (matrice ~2000² float64 = 32MB, + 2 par micro-cluster au plus)
+SILHOUETTE_SAMPLE_SIZE = 2000
+
+
+def scalable_threshold() -> int:
+    """Seuil du mode scalable (AI_CLUSTERING_SCALABLE_THRESHOLD, 0 = jamais)"""
+    try:
+        return int(os.getenv('AI_CLUSTERING_SCALABLE_THRESHOLD', DEFAULT_SCALABLE_THRESHOLD))
+    except ValueError:
+        return DEFAULT_SCALABLE_THRESHOLD
+
+
+def build_tree(X: np.ndarray, metric: str = 'cosine', method: str = 'average'):
+    """
+    Arbre exact (LinkageTree) ou approché (MicroClusterTree) selon le nombre de vecteurs
+
+    Les deux exposent cut(k) et silhouette(labels).
+    """
+    threshold = scalable_threshold()
+    if 0 < threshold <= len(X):
+        return MicroClusterTree(X, metric=metric, method=method)
+    return LinkageTree(X, metric=metric, method=method)
+
+
+def _cut_tree(children: np.ndarray, n_leaves: int, n_clusters: int) -> np.ndarray:
+    """
+    Labels des feuilles pour n_clusters clusters
+
+    Même parcours que sklearn (_hc_cut) : on éclate toujours le nœud le plus haut
+    de l'arbre, et les clusters sont numérotés dans l'ordre du tas final, d'où des labels
+    identiques à AgglomerativeClustering(n_clusters).fit_predict().
+    """
+    if n_clusters > n_leaves:
+        raise ValueError(f"Cannot extract {n_clusters} clusters from {n_leaves} samples")
+
+    # Tas des nœuds (indices négatifs : le premier élément est le nœud le plus haut)
+    nodes = [-(int(max(children[-1])) + 1)]
+    for _ in range(n_clusters - 1):
+        left, right = children[-nodes[0] - n_leaves]
+        heapq.heappush(nodes, -int(left))
+        heapq.heappushpop(nodes, -int(right))
+
+    labels = np.zeros(n_leaves, dtype=np.intp)
+    for label, node in enumerate(nodes):
+        # Feuilles sous le nœud
+        stack = [-node]
+        while stack:
+            current = stack.pop()
+            if current < n_leaves:
+                labels[current] = label
+            else:
+                stack.extend(children[current - n_leaves])
+    return labels
+
+
+class LinkageTree:
+    """Dendrogramme complet d'un jeu de vecteurs, coupé à la demande"""
+
+    def __init__(self, X: np.ndarray, metric: str = 'cosine', method: str = 'average'):
+        """
+        Args:
+            X: (n, d) vecteurs à regrouper (n >= 2)
+            metric: Distance scipy ('cosine', 'euclidean')
+            method: Linkage ('average', 'complete', 'single', ou 'ward' avec metric='euclidean')
+        """
+        X = np.asarray(X, dtype=np.float64)
+        if method == 'ward' and metric != 'euclidean':
+            raise ValueError("Ward linkage requires metric='euclidean'")
+
+        self.metric = metric
+        self.method = method
+        self.n_leaves = len(X)
+        # Distances condensées : même calcul que hierarchy.linkage(X, metric=...) appelé par sklearn
+        self.distances = pdist(X, metric=metric)
+        self.children = hierarchy.linkage(self.distances, method=method)[:, :2].astype(np.intp)
+        self._square: Optional[np.ndarray] = None
+
+    @property
+    def square(self) -> np.ndarray:
+        """Matrice de distances (n, n), construite au premier besoin puis partagée par tous les k"""
+        if self._square is None:
+            self._square = squareform(self.distances)
+        return self._square
+
+    def cut(self, n_clusters: int) -> np.ndarray:
+        """Labels pour n_clusters clusters (identiques à AgglomerativeClustering)"""
+        return _cut_tree(self.children, self.n_leaves, n_clusters)
+
+    def silhouette(self, labels: np.ndarray) -> float:
+        """Silhouette de labels sur les distances précalculées (pas de recalcul O(n² d))"""
+        from sklearn.metrics import silhouette_score
+
+        return float(silhouette_score(self.square, labels, metric='precomputed'))
+
+
+def _weighted_linkage(distances: np.ndarray, sizes: np.ndarray, method: str) -> np.ndarray:
+    """
+    Agglomération de clusters pondérés (Lance-Williams), format children de scipy / sklearn
+
+    Args:
+        distances: (m, m) distances initiales entre clusters
+        sizes: (m,) nombre d'échantillons de chaque cluster
+        method: 'average' (UPGMA pondéré) ou 'ward'
+
+    Returns:
+        (m - 1, 2) : à l'étape i, les nœuds children[i] fusionnent en nœud m + i
+    """
+    m = len(sizes)
+    D = np.array(distances, dtype=np.float64)
+    np.fill_diagonal(D, np.inf)
+    sizes = np.asarray(sizes, dtype=np.float64).copy()
+    node_ids = np.arange(m)
+    children = np.empty((m - 1, 2), dtype=np.intp)
+
+    for step in range(m - 1):
+        i, j = divmod(int(np.argmin(D)), m)
+        if i > j:
+            i, j = j, i
+        children[step] = sorted((node_ids[i], node_ids[j]))
+
+        n_i, n_j = sizes[i], sizes[j]
+        if method == 'ward':
+            d_ij = D[i, j]
+            with np.errstate(invalid='ignore'):
+                merged = np.sqrt(((n_i + sizes) * D[i] ** 2 + (n_j + sizes) * D[j] ** 2 - sizes * d_ij ** 2)
+                                 / (n_i + n_j + sizes))
+        else:
+            merged = (n_i * D[i] + n_j * D[j]) / (n_i + n_j)
+
+        # Le cluster fusionné prend la place de i, j est désactivé
+        D[i, :] = merged
+        D[:, i] = merged
+        D[j, :] = np.inf
+        D[:, j] = np.inf
+        D[i, i] = np.inf
+        sizes[i] = n_i + n_j
+        node_ids[i] = m + step
+
+    return children
+
+
+class MicroClusterTree:
+    """
+    Dendrogramme approché pour milliers de vecteurs (mode scalable)
+
+    MiniBatchKMeans regroupe les vecteurs en micro-clusters, le dendrogramme est construit sur
+    leurs centroïdes (pondérés par leur taille), et chaque vecteur hérite du cluster de son
+    micro-cluster. Mémoire : O(n·d + m² + s²), indépendante de n².
+    """
+
+    def __init__(self, X: np.ndarray, metric: str = 'cosine', method: str = 'average',
+                 n_micro: Optional[int] = None, sample_size: int = SILHOUETTE_SAMPLE_SIZE,
+                 random_state: int = 0):
+        """
+        Args:
+            X: (n, d) vecteurs à regrouper
+            metric: 'cosine' ou 'euclidean'
+            method: 'average' (cosine) ou 'ward' (euclidean)
+            n_micro: Nombre de micro-clusters (défaut: n / 10 borné à [MIN, MAX]_MICRO_CLUSTERS)
+            sample_size: Vecteurs du sous-échantillon des silhouettes
+            random_state: Graine (k-means et sous-échantillon : résultats reproductibles)
+        """
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.preprocessing import normalize
+
+        X = np.asarray(X, dtype=np.float64)
+        if method == 'ward' and metric != 'euclidean':
+            raise ValueError("Ward linkage requires metric='euclidean'")
+
+        self.metric = metric
+        self.method = method
+        self.n_samples = len(X)
+        n_micro = n_micro or min(MAX_MICRO_CLUSTERS, max(MIN_MICRO_CLUSTERS, self.n_samples // 10))
+        n_micro = min(n_micro, self.n_samples)
+
+        # Cosine : k-means sphérique (vecteurs unitaires), la distance cosine ignore la norme
+        points = normalize(X) if metric == 'cosine' else X
+        kmeans = MiniBatchKMeans(n_clusters=n_micro, random_state=random_state, n_init=1,
+                                 batch_size=1024)
+        assign = kmeans.fit_predict(points)
+
+        # Micro-clusters vides (rares avec MiniBatchKMeans) : retirés, indices recompactés
+        used, self.assign = np.unique(assign, return_inverse=True)
+        centroids = kmeans.cluster_centers_[used]
+        sizes = np.bincount(self.assign).astype(np.float64)
+        self.n_micro = len(used)
+
+        distances = cdist(centroids, centroids, metric=metric)
+        if method == 'ward':
+            # Distance de Ward entre clusters : sqrt(2·ni·nj / (ni + nj)) · ||ci - cj||
+            # (= distance euclidienne pour deux singletons, comme scipy)
+            distances = distances * np.sqrt(2 * np.outer(sizes, sizes) / np.add.outer(sizes, sizes))
+        self.children = _weighted_linkage(distances, sizes, method)
+
+        # Sous-échantillon fixe des silhouettes : le même pour tous les k (scores comparables)
+        self.sample = self._stratified_sample(sizes, sample_size, np.random.default_rng(random_state))
+        self.sample_distances = squareform(pdist(points[self.sample] if metric == 'cosine' else X[self.sample],
+                                                 metric=metric))
+
+        print(f"⚡ Clustering scalable : {self.n_samples} vecteurs → {self.n_micro} micro-clusters, "
+              f"silhouettes sur {len(self.sample)} échantillons", file=sys.stderr)
+
+    def _stratified_sample(self, sizes: np.ndarray, sample_size: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Indices du sous-échantillon, stratifié par micro-cluster
+
+        Chaque micro-cluster y figure (au moins 2 membres) : un cluster de la coupe, union de
+        micro-clusters, n'est jamais absent de l'estimation (sinon k et k+1 auraient le même score).
+        """
+        if self.n_samples <= sample_size:
+            return np.arange(self.n_samples)
+
+        order = np.argsort(self.assign, kind='stable')
+        bounds = np.concatenate([[0], np.cumsum(sizes).astype(np.intp)])
+        picked = []
+        for micro in range(self.n_micro):
+            members = order[bounds[micro]:bounds[micro + 1]]
+            quota = min(len(members), max(2, int(round(sample_size * len(members) / self.n_samples))))
+            picked.append(rng.choice(members, quota, replace=False))
+        return np.sort(np.concatenate(picked))
+
+    def cut(self, n_clusters: int) -> np.ndarray:
+        """Labels des vecteurs pour n_clusters clusters (coupe de l'arbre des micro-clusters)"""
+        if n_clusters > self.n_micro:
+            raise ValueError(f"Cannot extract {n_clusters} clusters from {self.n_micro} micro-clusters")
+        return _cut_tree(self.children, self.n_micro, n_clusters)[self.assign]
+
+    def silhouette(self, labels: np.ndarray) -> float:
+        """Silhouette estimée sur le sous-échantillon (-1 si moins de 2 clusters y figurent)"""
+        from sklearn.metrics import silhouette_score
+
+        sample_labels = np.asarray(labels)[self.sample]
+        n_labels = len(np.unique(sample_labels))
+        if n_labels < 2 or n_labels >= len(sample_labels):
+            return -1.0
+        return float(silhouette_score(self.sample_distances, sample_labels, metric='precomputed'))
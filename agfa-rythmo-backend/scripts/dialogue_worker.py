@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Worker persistant pour l'extraction de dialogues
+Garde Whisper, Demucs et le VoiceEncoder Resemblyzer en mémoire entre les jobs
+
+Chaque job ExtractDialogues lance toujours extract_dialogues.py, mais si ce worker
+écoute sur AI_WORKER_SOCKET, le script se contente d'envoyer la requête (client léger)
+au lieu de ré-importer torch/whisper et de recharger les modèles.
+
+Usage:
+    python dialogue_worker.py serve --socket /tmp/agfarythmo_ai.sock [--ram-budget-mb 2048]
+                                    [--preload whisper:tiny,demucs:htdemucs]
+    python dialogue_worker.py ping --socket /tmp/agfarythmo_ai.sock
+    python dialogue_worker.py stats --socket /tmp/agfarythmo_ai.sock
+    python dialogue_worker.py shutdown --socket /tmp/agfarythmo_ai.sock
+
+Protocole (JSON lines sur socket Unix):
+    -> {"method": "process_video", "params": {"video_path": ..., "output_json": ..., "model": ...,
+                                               "language": ..., "max_speakers": ..., "env": {...}}}
+    <- {"type": "log", "stream": "stderr", "line": "..."}     (0..n fois)
+    <- {"type": "progress", "event": {...}}                   (0..n fois, voir progress.py)
+    <- {"type": "result", "ok": true, "result": {...}}        (ou "ok": false + "error")
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+from typing import Dict, Optional
+
+# Variables d'environnement transmises du client au worker (config du job)
+FORWARDED_ENV_PREFIXES = ('AI_', 'HF_')
+# Propres au process client (socket, fd de progression) : jamais transmises
+CLIENT_ONLY_ENV = ('AI_WORKER_SOCKET', 'AI_PROGRESS_FD')
+
+
+class _SocketLogStream:
+    """Flux texte qui renvoie chaque ligne au client (et la garde dans le log du worker)"""
+
+    def __init__(self, conn: socket.socket, stream_name: str, tee):
+        self.conn = conn
+        self.stream_name = stream_name
+        self.tee = tee
+        self.buffer = ''
+        self.disconnected = False
+
+    def write(self, text: str) -> int:
+        self.tee.write(text)
+        self.buffer += text
+        while '\n' in self.buffer:
+            line, self.buffer = self.buffer.split('\n', 1)
+            self.send({'type': 'log', 'stream': self.stream_name, 'line': line})
+        return len(text)
+
+    def flush(self):
+        self.tee.flush()
+
+    def close_buffer(self):
+        if self.buffer:
+            self.send({'type': 'log', 'stream': self.stream_name, 'line': self.buffer})
+            self.buffer = ''
+
+    def isatty(self) -> bool:
+        return False
+
+    def send(self, message: Dict):
+        if self.disconnected:
+            return
+        try:
+            _send_message(self.conn, message)
+        except OSError:
+            # Client parti (job annulé) : le job continue, on garde juste le log local
+            self.disconnected = True
+
+
+def _send_message(conn: socket.socket, message: Dict):
+    conn.sendall((json.dumps(message, ensure_ascii=False) + '\n').encode('utf-8'))
+
+
+def _read_messages(conn: socket.socket):
+    """Itérer sur les messages JSON lines reçus"""
+    buffer = b''
+    while True:
+        chunk = conn.recv(65536)
+        if not chunk:
+            break
+        buffer += chunk
+        while b'\n' in buffer:
+            line, buffer = buffer.split(b'\n', 1)
+            if line.strip():
+                yield json.loads(line.decode('utf-8'))
+    if buffer.strip():
+        yield json.loads(buffer.decode('utf-8'))
+
+
+class DialogueWorker:
+    """Serveur socket Unix qui exécute les requêtes process_video avec un ModelPool"""
+
+    def __init__(self, socket_path: str, ram_budget_mb: float):
+        from model_pool import ModelPool
+
+        self.socket_path = socket_path
+        self.pool = ModelPool(ram_budget_mb=ram_budget_mb)
+        self.started_at = time.time()
+        self.jobs_done = 0
+        self.running = True
+        self.server: Optional[socket.socket] = None
+
+    def preload(self, spec: str):
+        """Précharger des modèles ('whisper:tiny,demucs:htdemucs,resemblyzer')"""
+        for item in filter(None, (part.strip() for part in spec.split(','))):
+            kind, _, name = item.partition(':')
+            self.pool.get(kind, name or 'default')
+
+    def serve(self):
+        """Boucle principale : une requête à la fois (les modèles ne sont pas thread-safe)"""
+        if os.path.exists(self.socket_path):
+            if _connect(self.socket_path) is not None:
+                raise RuntimeError(f"Un worker écoute déjà sur {self.socket_path}")
+            os.unlink(self.socket_path)
+
+        self.server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o660)
+        self.server.listen(8)
+
+        print(f"[WORKER] Listening on {self.socket_path} (RAM budget: {self.pool.ram_budget_mb:.0f}MB)",
+              file=sys.stderr)
+
+        try:
+            while self.running:
+                try:
+                    conn, _ = self.server.accept()
+                except OSError:
+                    break
+                with conn:
+                    self._handle_connection(conn)
+        finally:
+            self.request_stop()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            self.pool.clear()
+
+    def request_stop(self):
+        """Arrêter d'accepter des requêtes (le job en cours se termine normalement)"""
+        self.running = False
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    def _handle_connection(self, conn: socket.socket):
+        try:
+            request = next(_read_messages(conn))
+        except (StopIteration, ValueError) as e:
+            _safe_send(conn, {'type': 'result', 'ok': False, 'error': f"Requête invalide: {e}"})
+            return
+
+        method = request.get('method')
+        params = request.get('params', {})
+
+        if method == 'ping':
+            _safe_send(conn, {'type': 'result', 'ok': True, 'result': 'pong'})
+        elif method == 'stats':
+            _safe_send(conn, {'type': 'result', 'ok': True, 'result': {
+                'uptime_seconds': round(time.time() - self.started_at, 1),
+                'jobs_done': self.jobs_done,
+                'pool': self.pool.stats(),
+            }})
+        elif method == 'shutdown':
+            _safe_send(conn, {'type': 'result', 'ok': True, 'result': 'bye'})
+            self.running = False
+        elif method == 'process_video':
+            self._process_video(conn, params)
+        else:
+            _safe_send(conn, {'type': 'result', 'ok': False, 'error': f"Méthode inconnue: {method}"})
+
+    def _process_video(self, conn: socket.socket, params: Dict):
+        """Exécuter le pipeline complet en renvoyant les logs au client"""
+        from extract_dialogues import DialogueExtractor
+        from progress import ProgressReporter, set_reporter
+
+        saved_env = dict(os.environ)
+        saved_stdout, saved_stderr = sys.stdout, sys.stderr
+        out_stream = _SocketLogStream(conn, 'stdout', saved_stderr)
+        err_stream = _SocketLogStream(conn, 'stderr', saved_stderr)
+        start = time.time()
+
+        try:
+            os.environ.update(params.get('env', {}))
+            sys.stdout, sys.stderr = out_stream, err_stream
+            # Progression renvoyée au client, qui la réécrit sur son propre AI_PROGRESS_FD
+            set_reporter(ProgressReporter(sink=lambda event: err_stream.send({'type': 'progress', 'event': event})))
+
+            extractor = DialogueExtractor(
+                model_name=params.get('model', 'tiny'),
+                language=params.get('language', 'auto'),
+                max_speakers=int(params.get('max_speakers', 10)),
+                model_pool=self.pool,
+                stems_dir=params.get('stems_dir'),
+                speaker_registry=params.get('speaker_registry')
+            )
+            result = extractor.process_video(params['video_path'], params['output_json'],
+                                             metrics_json=params.get('metrics_json'))
+
+            response = {'type': 'result', 'ok': True, 'result': {
+                'output_json': params['output_json'],
+                'total_dialogues': result['metadata']['total_dialogues'],
+                'detected_speakers': result['metadata']['detected_speakers'],
+                'elapsed_seconds': round(time.time() - start, 2),
+            }}
+        except (Exception, SystemExit) as e:
+            # SystemExit : dépendance manquante côté worker, ne doit pas tuer le daemon
+            traceback.print_exc()
+            error = str(e) if isinstance(e, Exception) else "Dépendance manquante côté worker (voir logs)"
+            response = {'type': 'result', 'ok': False, 'error': error}
+        finally:
+            out_stream.close_buffer()
+            err_stream.close_buffer()
+            set_reporter(None)
+            sys.stdout, sys.stderr = saved_stdout, saved_stderr
+            os.environ.clear()
+            os.environ.update(saved_env)
+            self.jobs_done += 1
+
+        print(f"[WORKER] Job done in {time.time() - start:.1f}s (ok={response['ok']})", file=sys.stderr)
+        if not err_stream.disconnected:
+            _safe_send(conn, response)
+
+
+def _safe_send(conn: socket.socket, message: Dict):
+    try:
+        _send_message(conn, message)
+    except OSError:
+        pass
+
+
+def _connect(socket_path: str) -> Optional[socket.socket]:
+    """Se connecter au worker, None s'il n'écoute pas"""
+    if not socket_path or not os.path.exists(socket_path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        return sock
+    except OSError:
+        sock.close()
+        return None
+
+
+def call_worker(socket_path: str, method: str, params: Optional[Dict] = None) -> Optional[Dict]:
+    """
+    Envoyer une requête au worker et relayer ses logs sur stdout/stderr
+
+    Returns:
+        Message 'result' du worker, ou None si le worker est injoignable
+    """
+    sock = _connect(socket_path)
+    if sock is None:
+        return None
+
+    with sock:
+        _send_message(sock, {'method': method, 'params': params or {}})
+        sock.shutdown(socket.SHUT_WR)
+
+        for message in _read_messages(sock):
+            if message.get('type') == 'log':
+                stream = sys.stdout if message.get('stream') == 'stdout' else sys.stderr
+                print(message.get('line', ''), file=stream, flush=True)
+            elif message.get('type') == 'progress':
+                from progress import get_reporter
+                get_reporter().emit(message.get('event', {}))
+            elif message.get('type') == 'result':
+                return message
+
+    return {'type': 'result', 'ok': False, 'error': 'Connexion au worker interrompue'}
+
+
+def request_process_video(socket_path: str, params: Dict) -> Optional[int]:
+    """
+    Client léger utilisé par extract_dialogues.py
+
+    Returns:
+        Code de sortie du job (0/1), ou None si le worker est injoignable (fallback one-shot)
+    """
+    params = dict(params)
+    params['env'] = {
+        key: value for key, value in os.environ.items()
+        if key.startswith(FORWARDED_ENV_PREFIXES) and key not in CLIENT_ONLY_ENV
+    }
+
+    response = call_worker(socket_path, 'process_video', params)
+    if response is None:
+        return None
+
+    if response.get('ok'):
+        print("\n✅ Extraction terminée avec succès!")
+        return 0
+
+    print(f"\n❌ Erreur: {response.get('error')}", file=sys.stderr)
+    return 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker persistant d'extraction de dialogues")
+    parser.add_argument('command', choices=['serve', 'ping', 'stats', 'shutdown'])
+    parser.add_argument('--socket', default=os.getenv('AI_WORKER_SOCKET', '/tmp/agfarythmo_ai.sock'),
+                        help="Chemin du socket Unix (défaut: $AI_WORKER_SOCKET)")
+    parser.add_argument('--ram-budget-mb', type=float,
+                        default=float(os.getenv('AI_WORKER_RAM_BUDGET_MB', '2048')),
+                        help="Budget RAM pour les modèles résidents (défaut: 2048)")
+    parser.add_argument('--preload', default='',
+                        help="Modèles à précharger, ex: whisper:tiny,demucs:htdemucs,resemblyzer")
+
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        worker = DialogueWorker(args.socket, args.ram_budget_mb)
+        signal.signal(signal.SIGTERM, lambda *_: worker.request_stop())
+        if args.preload:
+            worker.preload(args.preload)
+        worker.serve()
+        sys.exit(0)
+
+    response = call_worker(args.socket, args.command)
+    if response is None:
+        print(f"❌ Worker injoignable sur {args.socket}", file=sys.stderr)
+        sys.exit(1)
+
+    print(json.dumps(response.get('result', response), ensure_ascii=False, indent=2))
+    sys.exit(0 if response.get('ok') else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,6 +5,11 @@ Optimisé pour serveurs avec 2GB RAM
 
 Usage:
     python extract_dialogues.py <video_path> <output_json> [--model tiny] [--language auto] [--max-speakers 10]
+                                [--worker-socket /tmp/agfarythmo_ai.sock]
+
+Si un worker persistant (dialogue_worker.py) écoute sur --worker-socket (ou AI_WORKER_SOCKET),
+ce script se comporte comme un client léger : la requête est envoyée au worker qui garde
+les modèles en mémoire. Sinon, le pipeline est exécuté localement (mode one-shot).
 
 Output JSON format:
     {
@@ -36,18 +41,37 @@ import sys
 import tempfile
 import subprocess
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
 import gc
 
-# Vérifier les dépendances
-try:
-    import whisper
-    import torch
-except ImportError:
-    print("❌ Erreur: whisper ou torch non installé", file=sys.stderr)
-    print("Installation: pip install openai-whisper torch", file=sys.stderr)
-    sys.exit(1)
+import numpy as np
+
+from audio_io import WHISPER_SAMPLE_RATE, decode_audio, decode_audio_to_memmap, describe
+from pipeline_cache import PipelineCache, cache_enabled
+from progress import get_reporter, inherited_fds, track_tqdm
+from stage_metrics import StageMetrics, get_metrics, set_metrics
+
+# Dépendances lourdes importées à la demande (le client du worker n'en a pas besoin)
+whisper = None
+torch = None
+
+
+def _import_ml_dependencies():
+    """Importer whisper + torch (quitte avec une erreur si non installés)"""
+    global whisper, torch
+    if whisper is not None:
+        return
+
+    try:
+        import whisper as _whisper
+        import torch as _torch
+    except ImportError:
+        print("❌ Erreur: whisper ou torch non installé", file=sys.stderr)
+        print("Installation: pip install openai-whisper torch", file=sys.stderr)
+        sys.exit(1)
 
+    whisper = _whisper
+    torch = _torch
 
 
 class DialogueExtractor:
@@ -67,7 +91,11 @@ class DialogueExtractor:
         'auto', 'en', 'fr', 'es', 'de', 'it', 'pt', 'nl', 'ru', 'zh', 'ja', 'ko'
     ]
 
-    def __init__(self, model_name: str = 'tiny', language: str = 'auto', max_speakers: int = 10):
+    # Modèle Demucs utilisé pour la séparation (4 sources, partagé avec ExtractInstrumental)
+    DEMUCS_MODEL = 'htdemucs'
+
+    def __init__(self, model_name: str = 'tiny', language: str = 'auto', max_speakers: int = 10,
+                 model_pool=None, stems_dir: Optional[str] = None, speaker_registry: Optional[str] = None):
         """
         Initialize dialogue extractor
 
@@ -75,7 +103,12 @@ class DialogueExtractor:
             model_name: Whisper model (tiny/base/small)
             language: Language code or 'auto' for detection
             max_speakers: Maximum number of speakers to detect
+            model_pool: ModelPool du worker persistant (modèles résidents), None en mode one-shot
+            stems_dir: Dossier de stems partagé du projet (vocals/instrumental réutilisables)
+            speaker_registry: Dossier du registre des locuteurs du projet / de la série
         """
+        _import_ml_dependencies()
+
         if model_name not in self.MODELS:
             raise ValueError(f"Model invalide. Choisir parmi: {list(self.MODELS.keys())}")
 
@@ -86,22 +119,46 @@ class DialogueExtractor:
         self.language = None if language == 'auto' else language
         self.max_speakers = max_speakers
         self.model = None
+        self.model_pool = model_pool
+        self.stems_dir = stems_dir
+        self.speaker_registry = speaker_registry
+        # Fichiers persistants (stems partagés) à ne pas supprimer au nettoyage
+        self._kept_paths = set()
+
+        # Transcription : 'full' (fichier entier) ou 'vad' (chunks de parole, RAM bornée)
+        self.transcription_mode = os.getenv('AI_TRANSCRIPTION_MODE', 'full').lower()
+        self.chunk_seconds = float(os.getenv('AI_TRANSCRIPTION_CHUNK_SECONDS', '30'))
+        # Mode vad : chunks transcrits en parallèle par N process (1 = séquentiel, CPU uniquement)
+        self.transcription_workers = int(os.getenv('AI_TRANSCRIPTION_WORKERS', '1'))
+        self.threads_per_worker = int(os.getenv('AI_TRANSCRIPTION_THREADS_PER_WORKER', '2'))
+
+        # Cache content-addressed (audio / vocals / transcription), voir pipeline_cache.py
+        self.cache = PipelineCache() if cache_enabled() else None
+        self._source_hash = None
         self.diarization_pipeline = None
 
         print(f"🔧 Configuration: model={model_name}, language={language}, max_speakers={max_speakers}")
 
     def _load_whisper_model(self):
         """Charger le modèle Whisper (lazy loading)"""
-        if self.model is None:
+        if self.model is None and self.model_pool is not None:
+            # Worker persistant : modèle déjà résident (ou chargé une seule fois)
+            with get_metrics().stage('model_load'):
+                self.model = self.model_pool.get('whisper', self.model_name)
+        elif self.model is None:
             print(f"📥 Chargement du modèle Whisper '{self.model_name}'...")
             # Force CPU pour économiser RAM (GPU optionnel si disponible)
             device = "cuda" if torch.cuda.is_available() else "cpu"
-            self.model = whisper.load_model(self.model_name, device=device)
+            with get_metrics().stage('model_load'):
+                self.model = whisper.load_model(self.model_name, device=device)
             print(f"✅ Modèle chargé sur {device}")
 
     def _unload_whisper_model(self):
         """Décharger le modèle Whisper pour libérer RAM"""
-        if self.model is not None:
+        if self.model is not None and self.model_pool is not None:
+            # Le pool garde le modèle pour les jobs suivants (éviction LRU si budget RAM dépassé)
+            self.model = None
+        elif self.model is not None:
             del self.model
             self.model = None
             gc.collect()
@@ -109,9 +166,79 @@ class DialogueExtractor:
                 torch.cuda.empty_cache()
             print("🗑️  Modèle Whisper déchargé (RAM libérée)")
 
+    def _cache_key(self, stage: str, **params) -> Optional[str]:
+        """Clé de cache d'une étape pour la vidéo en cours (None si cache désactivé)"""
+        if self.cache is None or self._source_hash is None:
+            return None
+        return self.cache.make_key(stage, self._source_hash, **params)
+
+    @property
+    def _streaming(self) -> bool:
+        return self.transcription_mode == 'vad'
+
+    @property
+    def _parallel_transcription(self) -> bool:
+        return self.transcription_workers > 1 and not torch.cuda.is_available()
+
+    def _hash_source(self, video_path: str):
+        """Hash de la vidéo (clé de cache de toutes les étapes)"""
+        if self.cache is not None and os.path.exists(video_path):
+            self._source_hash = self.cache.hash_file(video_path)
+
+    def _is_kept(self, path: Optional[str]) -> bool:
+        """Fichier à conserver au nettoyage (stems partagés ou entrée du cache)"""
+        return path in self._kept_paths or (self.cache is not None and self.cache.owns(path))
+
+    @staticmethod
+    def _vocal_separation_enabled() -> bool:
+        return os.getenv('AI_VOCAL_SEPARATION_ENABLED', 'false').lower() == 'true'
+
+    def decode_audio(self, source_path: str, cacheable: bool = False, step: str = '1/6') -> np.ndarray:
+        """
+        Décoder l'audio en 16kHz mono float32 par pipe FFmpeg (format Whisper / diarization)
+
+        Pas de WAV temporaire : c'est le seul format dont Whisper et les diarizers ont besoin
+        quand Demucs ne tourne pas (~11x moins d'octets qu'un WAV 44.1kHz stéréo).
+        En mode 'vad', l'audio est mappé depuis le disque (np.memmap) au lieu d'être chargé en RAM.
+
+        Args:
+            source_path: Vidéo, ou WAV (vocals Demucs)
+            cacheable: source_path est la vidéo du job (clé de cache = hash de la vidéo)
+            step: Étape affichée dans les logs
+
+        Returns:
+            Audio float32 mono à 16kHz
+        """
+        print(f"[STEP {step}] Decoding audio (FFmpeg pipe, {WHISPER_SAMPLE_RATE}Hz mono): {source_path}",
+              file=sys.stderr)
+
+        cache_params = {'sample_rate': WHISPER_SAMPLE_RATE, 'channels': 1, 'format': 'f32'}
+        cache_key = self._cache_key('audio', **cache_params) if cacheable else None
+        if cache_key is not None:
+            cached_path = self.cache.get_file('audio', cache_key)
+            if cached_path is not None:
+                audio = np.load(cached_path, mmap_mode='r' if self._streaming else None)
+                print(f"[STEP {step}] SUCCESS - Audio from cache: {describe(audio, WHISPER_SAMPLE_RATE)}",
+                      file=sys.stderr)
+                return audio
+
+        if self._streaming:
+            audio = decode_audio_to_memmap(source_path, WHISPER_SAMPLE_RATE, channels=1)
+        else:
+            audio = decode_audio(source_path, WHISPER_SAMPLE_RATE, channels=1)
+
+        if cache_key is not None:
+            temp_npy = tempfile.NamedTemporaryFile(suffix='.npy', delete=False)
+            temp_npy.close()
+            np.save(temp_npy.name, audio)
+            self.cache.put_file('audio', cache_key, temp_npy.name, params=cache_params)
+
+        print(f"[STEP {step}] SUCCESS - Audio decoded: {describe(audio, WHISPER_SAMPLE_RATE)}", file=sys.stderr)
+        return audio
+
     def extract_audio(self, video_path: str) -> str:
         """
-        Extraire l'audio de la vidéo avec FFmpeg
+        Extraire l'audio de la vidéo en WAV pour Demucs (uniquement si séparation active)
 
         Args:
             video_path: Chemin vers la vidéo
@@ -124,6 +251,14 @@ class DialogueExtractor:
         if not os.path.exists(video_path):
             raise FileNotFoundError(f"Video file not found: {video_path}")
 
+        cache_params = {'sample_rate': 44100, 'channels': 2, 'codec': 'pcm_s16le'}
+        cache_key = self._cache_key('audio', **cache_params)
+        if cache_key is not None:
+            cached_path = self.cache.get_file('audio', cache_key)
+            if cached_path is not None:
+                print(f"[STEP 1/6] SUCCESS - Audio from cache: {cached_path}", file=sys.stderr)
+                return cached_path
+
         # Créer fichier audio temporaire (44.1kHz stereo pour Demucs)
         temp_audio = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
         audio_path = temp_audio.name
@@ -142,26 +277,30 @@ class DialogueExtractor:
 
         try:
             subprocess.run(cmd, check=True, capture_output=True, text=True)
+            if cache_key is not None:
+                audio_path = self.cache.put_file('audio', cache_key, audio_path, params=cache_params)
             file_size = os.path.getsize(audio_path) / (1024 * 1024)
             print(f"[STEP 1/6] SUCCESS - Audio extracted: {audio_path} ({file_size:.1f}MB)", file=sys.stderr)
             return audio_path
         except subprocess.CalledProcessError as e:
             raise RuntimeError(f"FFmpeg error: {e.stderr}")
 
-    def separate_vocals(self, audio_path: str) -> str:
+    def separate_vocals(self, audio_path: str, source_path: Optional[str] = None) -> str:
         """
         Séparer les voix (vocals) avec Demucs pour améliorer transcription/diarisation
 
+        Avec stems_dir, la séparation est faite en une passe (vocals + instrumental) dans le
+        dossier partagé du projet : ExtractInstrumental réutilise l'instrumental, et une
+        extraction suivante réutilise les vocals si la vidéo n'a pas changé.
+
         Args:
             audio_path: Chemin vers l'audio complet
+            source_path: Vidéo d'origine (signature des stems partagés)
 
         Returns:
             Chemin vers les voix extraites (WAV 16kHz mono pour Whisper/Resemblyzer)
         """
-        # Vérifier si vocal separation activée
-        vocal_separation_enabled = os.getenv('AI_VOCAL_SEPARATION_ENABLED', 'false').lower() == 'true'
-
-        if not vocal_separation_enabled:
+        if not self._vocal_separation_enabled():
             print(f"[STEP 2/6] Vocal separation DISABLED (AI_VOCAL_SEPARATION_ENABLED=false)", file=sys.stderr)
             print(f"[STEP 2/6] Using full audio for transcription/diarization", file=sys.stderr)
             return audio_path
@@ -169,26 +308,56 @@ class DialogueExtractor:
         print(f"[STEP 2/6] Vocal separation with Demucs starting...", file=sys.stderr)
         print(f"[STEP 2/6] Input audio: {audio_path}", file=sys.stderr)
 
-        # Créer fichier temporaire pour vocals
-        temp_vocals = tempfile.NamedTemporaryFile(suffix='_vocals.wav', delete=False)
-        vocals_path = temp_vocals.name
-        temp_vocals.close()
+        shared_stems = self.stems_dir is not None and source_path is not None
+
+        if shared_stems:
+            from separate_stems import find_reusable_stems
+
+            stems = find_reusable_stems(self.stems_dir, source_path, self.DEMUCS_MODEL)
+            if stems is not None:
+                self._kept_paths.add(stems['vocals'])
+                print(f"[STEP 2/6] SUCCESS - Reusing separated vocals: {stems['vocals']}", file=sys.stderr)
+                return stems['vocals']
+
+            vocals_path = os.path.join(self.stems_dir, 'vocals.wav')
+        else:
+            vocals_path = None
+
+        # Voix déjà séparées pour cette vidéo (autre projet / run précédent) ?
+        vocals_key = self._cache_key('vocals', demucs_model=self.DEMUCS_MODEL)
+        if vocals_key is not None:
+            cached_path = self.cache.get_file('vocals', vocals_key)
+            if cached_path is not None:
+                print(f"[STEP 2/6] SUCCESS - Vocals from cache: {cached_path}", file=sys.stderr)
+                return cached_path
+
+        if vocals_path is None:
+            # Créer fichier temporaire pour vocals
+            temp_vocals = tempfile.NamedTemporaryFile(suffix='_vocals.wav', delete=False)
+            vocals_path = temp_vocals.name
+            temp_vocals.close()
+
+        if self.model_pool is not None:
+            vocals_path = self._separate_vocals_in_process(audio_path, vocals_path, source_path if shared_stems else None)
+            if vocals_path == audio_path:
+                return audio_path
+            return self._store_vocals(vocals_key, vocals_path, keep_original=shared_stems)
 
-        # Appeler le script de séparation vocale
-        script_path = Path(__file__).parent / 'separate_vocals.py'
+        # Appeler le script de séparation (une seule passe Demucs)
+        script_path = Path(__file__).parent / 'separate_stems.py'
 
         if not script_path.exists():
             print(f"[STEP 2/6] ERROR - Script not found: {script_path}", file=sys.stderr)
             print(f"[STEP 2/6] FALLBACK - Using full audio instead of vocals", file=sys.stderr)
             return audio_path
 
-        cmd = [
-            sys.executable,
-            str(script_path),
-            audio_path,
-            vocals_path,
-            '--model', 'htdemucs'  # Modèle 4-sources optimisé pour extraction vocals uniquement
-        ]
+        cmd = [sys.executable, str(script_path), audio_path]
+        if shared_stems:
+            # vocals.wav + instrumental.wav + stems.json dans le dossier du projet
+            cmd += ['--output-dir', self.stems_dir, '--source', source_path]
+        else:
+            cmd += ['--vocals', vocals_path]
+        cmd += ['--model', self.DEMUCS_MODEL]  # Modèle 4-sources
 
         print(f"[STEP 2/6] Running command: {' '.join(cmd)}", file=sys.stderr)
 
@@ -199,10 +368,11 @@ class DialogueExtractor:
                 stdout=subprocess.PIPE,
                 stderr=subprocess.PIPE,
                 text=True,
-                bufsize=1  # Line buffered
+                bufsize=1,  # Line buffered
+                pass_fds=inherited_fds()  # Progression Demucs sur le même fd
             )
 
-            # Stream stderr en temps réel (tous les logs de separate_vocals.py)
+            # Stream stderr en temps réel (tous les logs de separate_stems.py)
             if process.stderr:
                 for line in process.stderr:
                     print(f"[STEP 2/6] {line.rstrip()}", file=sys.stderr)
@@ -215,9 +385,12 @@ class DialogueExtractor:
                 print(f"[STEP 2/6] FALLBACK - Using full audio", file=sys.stderr)
                 return audio_path
 
+            if shared_stems:
+                self._kept_paths.add(vocals_path)
+
             file_size = os.path.getsize(vocals_path) / (1024 * 1024)
             print(f"[STEP 2/6] SUCCESS - Vocals extracted: {vocals_path} ({file_size:.1f}MB)", file=sys.stderr)
-            return vocals_path
+            return self._store_vocals(vocals_key, vocals_path, keep_original=shared_stems)
         except subprocess.TimeoutExpired:
             print(f"[STEP 2/6] ERROR - Timeout after 600s", file=sys.stderr)
             print(f"[STEP 2/6] FALLBACK - Using full audio", file=sys.stderr)
@@ -227,19 +400,79 @@ class DialogueExtractor:
             print(f"[STEP 2/6] FALLBACK - Using full audio", file=sys.stderr)
             return audio_path
 
-    def transcribe_audio(self, audio_path: str) -> Dict:
+    def _store_vocals(self, cache_key: Optional[str], vocals_path: str, keep_original: bool) -> str:
+        """Mettre les voix séparées en cache (copie si le fichier appartient aux stems partagés)"""
+        if cache_key is None:
+            return vocals_path
+        return self.cache.put_file('vocals', cache_key, vocals_path, move=not keep_original,
+                                   params={'demucs_model': self.DEMUCS_MODEL})
+
+    def _separate_vocals_in_process(self, audio_path: str, vocals_path: str,
+                                    source_path: Optional[str] = None) -> str:
+        """
+        Séparation vocale dans le process du worker, avec le modèle Demucs du pool
+
+        Args:
+            audio_path: Chemin vers l'audio complet
+            vocals_path: Sortie voix (ignoré si source_path : vocals.wav du dossier de stems)
+            source_path: Vidéo d'origine si les stems sont écrits dans stems_dir
+
+        Returns:
+            Chemin vers les voix extraites (ou audio complet en cas d'échec)
+        """
+        from separate_stems import separate_stems, separate_to_directory
+
+        model = self.model_pool.get('demucs', self.DEMUCS_MODEL)
+        print(f"[STEP 2/6] Using resident Demucs model (worker mode)", file=sys.stderr)
+
+        if source_path is not None:
+            stems = separate_to_directory(audio_path, self.stems_dir, source_path, self.DEMUCS_MODEL, model=model)
+            success = stems is not None
+            if success:
+                self._kept_paths.add(stems['vocals'])
+        else:
+            success = separate_stems(audio_path, vocals_path=vocals_path, model_name=self.DEMUCS_MODEL, model=model)
+
+        if not success:
+            print(f"[STEP 2/6] FALLBACK - Using full audio", file=sys.stderr)
+            if source_path is None and os.path.exists(vocals_path):
+                os.unlink(vocals_path)
+            return audio_path
+
+        file_size = os.path.getsize(vocals_path) / (1024 * 1024)
+        print(f"[STEP 2/6] SUCCESS - Vocals extracted: {vocals_path} ({file_size:.1f}MB)", file=sys.stderr)
+        return vocals_path
+
+    def transcribe_audio(self, audio: np.ndarray, input_stage: str = 'audio') -> Dict:
         """
         Transcrire l'audio avec Whisper
 
         Args:
-            audio_path: Chemin vers le fichier audio
+            audio: Audio float32 mono 16kHz (decode_audio), passé tel quel à Whisper
+            input_stage: Origine de l'audio ('audio' ou 'vocals'), fait partie de la clé de cache
 
         Returns:
             Dictionnaire avec segments transcrits
         """
         print(f"[STEP 3/6] Transcription with Whisper starting...", file=sys.stderr)
         print(f"[STEP 3/6] Model: {self.model_name}, Language: {self.language}", file=sys.stderr)
-        print(f"[STEP 3/6] Input audio: {audio_path}", file=sys.stderr)
+        print(f"[STEP 3/6] Input audio: {input_stage} ({describe(audio, WHISPER_SAMPLE_RATE)})", file=sys.stderr)
+
+        cache_params = {
+            'whisper_model': self.model_name,
+            'language': self.language or 'auto',
+            'word_timestamps': True,
+            'input': f"vocals:{self.DEMUCS_MODEL}" if input_stage == 'vocals' else 'audio',
+        }
+        if self._streaming:
+            cache_params.update(mode='vad', chunk_seconds=self.chunk_seconds,
+                                chained_prompt=not self._parallel_transcription)
+        cache_key = self._cache_key('transcription', **cache_params)
+        if cache_key is not None:
+            cached = self.cache.get_json('transcription', cache_key)
+            if cached is not None:
+                print(f"[STEP 3/6] SUCCESS - Transcription from cache: {len(cached['segments'])} segments", file=sys.stderr)
+                return cached
 
         self._load_whisper_model()
 
@@ -251,22 +484,142 @@ class DialogueExtractor:
             'word_timestamps': True,  # Timestamps précis par mot
         }
 
-        # Transcription
-        result = self.model.transcribe(audio_path, **options)
+        if self._streaming:
+            result = self._transcribe_streaming(audio, options)
+        else:
+            # Transcription (Whisper accepte directement un tableau float32 16kHz : pas de 2e décodage FFmpeg)
+            # La barre tqdm de Whisper est relayée en événements de progression (AI_PROGRESS_FD)
+            with track_tqdm('whisper.transcribe', 'transcription'):
+                result = self.model.transcribe(audio, **options)
 
         print(f"[STEP 3/6] SUCCESS - Transcription completed: {len(result['segments'])} segments", file=sys.stderr)
         print(f"[STEP 3/6] Detected language: {result.get('language', 'unknown')}", file=sys.stderr)
 
+        if cache_key is not None:
+            self.cache.put_json('transcription', cache_key, result, params=cache_params)
+
         return result
 
-    def apply_diarization(self, audio_path: str, transcription: Dict) -> List[Dict]:
+    def _transcribe_streaming(self, audio: np.ndarray, options: Dict) -> Dict:
+        """
+        Transcrire chunk par chunk les zones de parole détectées par le VAD
+
+        Mémoire bornée par la taille d'un chunk (AI_TRANSCRIPTION_CHUNK_SECONDS), quelle que soit
+        la durée de la vidéo ; les silences ne passent jamais par le décodeur.
+        Avec AI_TRANSCRIPTION_WORKERS > 1, les chunks sont indépendants (pas de initial_prompt
+        chaîné) et transcrits par un pool de process (parallel_transcription.py).
+
+        Args:
+            audio: Audio float32 mono 16kHz (np.memmap accepté)
+            options: Options Whisper (language, word_timestamps...)
+
+        Returns:
+            Même structure que model.transcribe() : text, segments (temps absolus), language
+        """
+        from vad_chunking import detect_speech_regions, plan_chunks, remap_segments
+
+        sr = WHISPER_SAMPLE_RATE
+        regions = detect_speech_regions(audio, sr, method=os.getenv('AI_VAD_METHOD', 'auto'))
+        chunks = plan_chunks(audio, regions, sr, max_chunk_seconds=self.chunk_seconds)
+        total_speech = sum(chunk.length for chunk in chunks)
+
+        print(f"[STEP 3/6] Streaming mode: {len(chunks)} chunks (<= {self.chunk_seconds:.0f}s of speech each)",
+              file=sys.stderr)
+
+        reporter = get_reporter()
+        options = dict(options)
+        segments: List[Dict] = []
+        language = options.get('language')
+        done_samples = 0
+
+        def collect(index: int, chunk_result: Dict):
+            """Fusionner le résultat d'un chunk (appelé dans l'ordre des chunks)"""
+            nonlocal language, done_samples
+            chunk = chunks[index]
+            language = language or chunk_result.get('language')
+            segments.extend(remap_segments(chunk_result['segments'], chunk, sr, first_id=len(segments)))
+
+            done_samples += chunk.length
+            reporter.update('transcription', done_samples / sr, total_speech / sr, unit='seconds')
+            print(f"[STEP 3/6] Chunk {index + 1}/{len(chunks)}: {chunk.source_start / sr:.1f}s -> "
+                  f"{chunk.source_end / sr:.1f}s, {len(chunk_result['segments'])} segments", file=sys.stderr)
+
+        if not self._parallel_transcription:
+            for index, chunk in enumerate(chunks):
+                # Langue détectée sur le premier chunk, imposée ensuite (cohérence entre chunks)
+                options['language'] = language
+                # Contexte : fin du texte du chunk précédent (comme condition_on_previous_text)
+                if segments:
+                    options['initial_prompt'] = ' '.join(seg['text'].strip() for seg in segments[-3:])[-200:]
+                collect(index, self.model.transcribe(chunk.audio(audio), **options))
+        else:
+            from parallel_transcription import plan_workers, transcribe_chunks
+
+            first = 0
+            if language is None and chunks:
+                # Langue détectée par le modèle du process principal sur le 1er chunk, imposée au pool
+                collect(0, self.model.transcribe(chunks[0].audio(audio), **options))
+                first = 1
+            options['language'] = language
+
+            remaining = chunks[first:]
+            workers = plan_workers(self.transcription_workers, self.model_name, len(remaining),
+                                   self.threads_per_worker)
+            if workers <= 1:
+                # Pas la place pour un 2e modèle : modèle du process principal, chunks toujours indépendants
+                for index, chunk in enumerate(remaining):
+                    collect(first + index, self.model.transcribe(chunk.audio(audio), **options))
+            else:
+                print(f"[STEP 3/6] Parallel mode: {workers} processes x {self.threads_per_worker} threads",
+                      file=sys.stderr)
+                for index, chunk_result in transcribe_chunks(audio, remaining, self.model_name, options,
+                                                             workers, self.threads_per_worker):
+                    collect(first + index, chunk_result)
+
+        return {
+            'text': ''.join(seg['text'] for seg in segments),
+            'segments': segments,
+            'language': language or 'unknown',
+        }
+
+    def _speaker_features_sidecar(self, method: str, segments: List[Dict],
+                                  input_stage: str) -> Tuple[Optional[str], Optional[str], bool]:
+        """
+        Sidecar des features locuteurs dans le cache du pipeline (relance avec un autre
+        max_speakers : seul le clustering est refait)
+
+        Returns:
+            (chemin du sidecar, clé, True si déjà en cache) ; (None, None, False) sans cache
+        """
+        if method == 'resemblyzer':
+            from resemblyzer_diarization import embedding_params as params_for_method
+        else:
+            from simple_diarization import feature_params as params_for_method
+        from feature_sidecar import segments_signature
+
+        cache_params = dict(params_for_method(),
+                            input=f"vocals:{self.DEMUCS_MODEL}" if input_stage == 'vocals' else 'audio',
+                            segments=segments_signature(segments))
+        cache_key = self._cache_key('speaker_features', **cache_params)
+        if cache_key is None:
+            return None, None, False
+
+        cached_path = self.cache.get_file('speaker_features', cache_key)
+        if cached_path is not None:
+            return cached_path, cache_key, True
+        # Écrit par diarize() puis déplacé dans le cache
+        return os.path.join(tempfile.gettempdir(), f"speaker_features_{os.getpid()}_{cache_key[:16]}.npz"), \
+            cache_key, False
+
+    def apply_diarization(self, audio: np.ndarray, transcription: Dict, input_stage: str = 'audio') -> List[Dict]:
         """
         Appliquer la diarization (séparation locuteurs) avec clustering MFCC ultra-light
         Optimisé pour serveurs 2GB RAM - pas de deep learning
 
         Args:
-            audio_path: Chemin vers l'audio
+            audio: Audio float32 mono 16kHz (vocals si séparation active)
             transcription: Résultat Whisper
+            input_stage: Origine de l'audio ('audio' ou 'vocals'), fait partie de la clé de cache
 
         Returns:
             Liste de dialogues avec speakers assignés
@@ -289,63 +642,52 @@ class DialogueExtractor:
             print("", file=sys.stderr)
             return self._assign_single_speaker(transcription)
 
-        # Utiliser le script de diarization
-        try:
-            # Sauvegarder temporairement la transcription
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False, encoding='utf-8') as tf:
-                json.dump(transcription, tf, ensure_ascii=False)
-                transcription_temp = tf.name
-
-            # Fichier output temporaire
-            output_temp = tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False).name
+        segments = transcription.get('segments', [])
+        diarization_method = os.environ.get('AI_DIARIZATION_METHOD', 'mfcc').lower()
 
-            # Choisir le script de diarization selon la méthode configurée
-            diarization_method = os.environ.get('AI_DIARIZATION_METHOD', 'mfcc').lower()
+        print(f"[STEP 4/6] Speaker identification starting...", file=sys.stderr)
 
-            print(f"[STEP 4/6] Speaker identification starting...", file=sys.stderr)
-
-            if diarization_method == 'resemblyzer':
-                script_name = 'resemblyzer_diarization.py'
-                print(f"[STEP 4/6] Method: Resemblyzer (256D embeddings)", file=sys.stderr)
-            else:
-                script_name = 'simple_diarization.py'
-                print(f"[STEP 4/6] Method: MFCC clustering (112D)", file=sys.stderr)
-
-            script_path = Path(__file__).parent / script_name
+        sidecar_path, sidecar_key, sidecar_cached = None, None, False
+        # Diarization dans ce process : pas de 2e interpréteur ni de copie de l'audio sur disque
+        try:
+            # Segments Whisper coupés aux changements de locuteur (avant features, sidecar et clustering)
+            from speaker_change import speaker_change_enabled, split_at_speaker_changes
 
-            if not script_path.exists():
-                print(f"[STEP 4/6] ERROR - Script not found: {script_path}", file=sys.stderr)
-                raise FileNotFoundError(f"Diarization script not found: {script_path}")
+            if speaker_change_enabled():
+                with get_metrics().stage('speaker_change', audio_seconds=len(audio) / WHISPER_SAMPLE_RATE):
+                    segments = split_at_speaker_changes(audio, WHISPER_SAMPLE_RATE, segments)
 
-            # Appeler le script de diarization
-            cmd = [
-                sys.executable,
-                str(script_path),
-                audio_path,
-                transcription_temp,
-                output_temp,
-                '--max-speakers', str(self.max_speakers)
-            ]
+            sidecar_path, sidecar_key, sidecar_cached = self._speaker_features_sidecar(
+                diarization_method, segments, input_stage)
 
-            # Ajouter --skip-spleeter pour Resemblyzer (utilise Demucs à la place)
             if diarization_method == 'resemblyzer':
-                cmd.append('--skip-spleeter')
-
-            print(f"[STEP 4/6] Running command: {' '.join(cmd)}", file=sys.stderr)
-
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-
-            # Afficher stderr (progression)
-            if result.stderr:
-                print(result.stderr, file=sys.stderr, end='')
-
-            # Charger résultat
-            with open(output_temp, 'r', encoding='utf-8') as f:
-                diarization_result = json.load(f)
+                from resemblyzer_diarization import diarize, encoder_backend
+
+                if self.model_pool is not None:
+                    print(f"[STEP 4/6] Method: Resemblyzer (256D embeddings, resident encoder)", file=sys.stderr)
+                    encoder = self.model_pool.get('resemblyzer', 'onnx' if encoder_backend() == 'onnx' else 'default')
+                else:
+                    print(f"[STEP 4/6] Method: Resemblyzer (256D embeddings)", file=sys.stderr)
+                    encoder = None  # Chargé par diarize() puis libéré à la sortie
+
+                diarization_result = diarize(segments, audio, WHISPER_SAMPLE_RATE, self.max_speakers,
+                                             encoder=encoder, sidecar_path=sidecar_path, sidecar_key=sidecar_key,
+                                             registry_dir=self.speaker_registry)
+            else:
+                from simple_diarization import diarize
 
-            # Nettoyer fichiers temporaires
-            os.unlink(transcription_temp)
-            os.unlink(output_temp)
+                print(f"[STEP 4/6] Method: MFCC clustering (112D)", file=sys.stderr)
+                diarization_result = diarize(
+                    segments, audio, WHISPER_SAMPLE_RATE, self.max_speakers,
+                    language=transcription.get('language', 'unknown'),
+                    duration=transcription.get('duration', 0),
+                    sidecar_path=sidecar_path, sidecar_key=sidecar_key,
+                    registry_dir=self.speaker_registry
+                )
+
+            if sidecar_key is not None and not sidecar_cached and os.path.exists(sidecar_path):
+                self.cache.put_file('speaker_features', sidecar_key, sidecar_path,
+                                    params={'method': diarization_method})
 
             n_speakers = diarization_result.get('num_speakers', 'unknown')
             print(f"[STEP 4/6] SUCCESS - Speakers identified: {n_speakers}", file=sys.stderr)
@@ -353,14 +695,14 @@ class DialogueExtractor:
             # Le résultat contient 'segments' (pas 'dialogues')
             return diarization_result.get('segments', diarization_result.get('dialogues', []))
 
-        except subprocess.CalledProcessError as e:
-            print(f"[STEP 4/6] ERROR - Diarization subprocess failed: {e.stderr}", file=sys.stderr)
-            print(f"[STEP 4/6] FALLBACK - Assigning all dialogues to SPEAKER_00", file=sys.stderr)
-            return self._assign_single_speaker(transcription)
         except Exception as e:
             print(f"[STEP 4/6] ERROR - Diarization failed: {str(e)}", file=sys.stderr)
             print(f"[STEP 4/6] FALLBACK - Assigning all dialogues to SPEAKER_00", file=sys.stderr)
             return self._assign_single_speaker(transcription)
+        finally:
+            if sidecar_path is not None and not sidecar_cached and os.path.exists(sidecar_path):
+                os.unlink(sidecar_path)
+            gc.collect()
 
     def _assign_single_speaker(self, transcription: Dict) -> List[Dict]:
         """
@@ -386,37 +728,63 @@ class DialogueExtractor:
 
         return dialogues
 
-    def process_video(self, video_path: str, output_json: str) -> Dict:
+    def process_video(self, video_path: str, output_json: str, metrics_json: Optional[str] = None) -> Dict:
         """
         Pipeline complet d'extraction de dialogues
 
         Args:
             video_path: Chemin vers la vidéo
             output_json: Chemin de sortie JSON
+            metrics_json: Fichier où écrire aussi le rapport de performance (optionnel)
 
         Returns:
-            Données extraites
+            Données extraites (metadata['performance'] : mesures par étape, voir stage_metrics.py)
         """
         audio_path = None
         vocals_path = None
 
+        reporter = get_reporter()
+        metrics = StageMetrics()
+        set_metrics(metrics)
+
         try:
-            # Étape 1: Extraction audio (0-10%)
-            audio_path = self.extract_audio(video_path)
+            if self._vocal_separation_enabled():
+                # Étape 1: Extraction audio (0-10%) - WAV 44.1kHz stéréo, format Demucs
+                with reporter.stage('audio'), metrics.stage('audio_extraction'):
+                    self._hash_source(video_path)
+                    audio_path = self.extract_audio(video_path)
+
+                # Étape 2: Séparation vocale (10-20%)
+                with reporter.stage('separation'), metrics.stage('vocal_separation') as measure:
+                    vocals_path = self.separate_vocals(audio_path, source_path=video_path)
+                    audio = self.decode_audio(vocals_path, step='2/6')
+                    measure['audio_seconds'] = len(audio) / WHISPER_SAMPLE_RATE
+            else:
+                # Étapes 1-2: décodage direct en 16kHz mono, aucun fichier intermédiaire
+                with reporter.stage('audio'), metrics.stage('audio_extraction') as measure:
+                    self._hash_source(video_path)
+                    print(f"[STEP 2/6] Vocal separation DISABLED (AI_VOCAL_SEPARATION_ENABLED=false)", file=sys.stderr)
+                    audio = self.decode_audio(video_path, cacheable=True)
+                    measure['audio_seconds'] = len(audio) / WHISPER_SAMPLE_RATE
 
-            # Étape 2: Séparation vocale (10-20%)
-            vocals_path = self.separate_vocals(audio_path)
+            vocals_separated = vocals_path is not None and vocals_path != audio_path
+            audio_seconds = len(audio) / WHISPER_SAMPLE_RATE
 
             # Étape 3: Transcription Whisper (20-70%)
-            transcription = self.transcribe_audio(vocals_path)
+            with reporter.stage('transcription'), metrics.stage('transcription', audio_seconds=audio_seconds):
+                transcription = self.transcribe_audio(audio, input_stage='vocals' if vocals_separated else 'audio')
 
-            # Libérer mémoire après transcription
-            self._unload_whisper_model()
+                # Libérer mémoire après transcription
+                self._unload_whisper_model()
 
             # Étape 4: Diarization (70-90%)
-            dialogues = self.apply_diarization(vocals_path, transcription)
+            with reporter.stage('diarization'), metrics.stage('diarization', audio_seconds=audio_seconds):
+                dialogues = self.apply_diarization(audio, transcription,
+                                                   input_stage='vocals' if vocals_separated else 'audio')
+            del audio
 
             # Étape 5: Formater résultat (90-100%)
+            reporter.start_stage('output')
             speakers = list(set(d['speaker'] for d in dialogues))
             speakers.sort()
 
@@ -429,13 +797,24 @@ class DialogueExtractor:
                     'model': self.model_name,
                     'language': transcription.get('language', 'unknown'),
                     'detected_speakers': len(speakers),
-                    'vocals_separated': vocals_path != audio_path  # True si séparation réussie
+                    'vocals_separated': vocals_separated  # True si séparation réussie
                 }
             }
 
+            # Mesures jusqu'à la diarization dans le JSON ; l'écriture elle-même n'est que
+            # dans le résultat renvoyé et dans metrics_json
+            result['metadata']['performance'] = metrics.report()
+
             # Sauvegarder JSON
-            with open(output_json, 'w', encoding='utf-8') as f:
-                json.dump(result, f, ensure_ascii=False, indent=2)
+            with metrics.stage('serialization'):
+                with open(output_json, 'w', encoding='utf-8') as f:
+                    json.dump(result, f, ensure_ascii=False, indent=2)
+
+            result['metadata']['performance'] = metrics.report()
+            if metrics_json:
+                metrics.write(metrics_json)
+                print(f"[METRICS] Report saved: {metrics_json}", file=sys.stderr)
+            metrics.print_summary()
 
             print(f"[STEP 5/6] SUCCESS - Results saved: {output_json}", file=sys.stderr)
             print(f"[STEP 5/6] Statistics:", file=sys.stderr)
@@ -445,21 +824,27 @@ class DialogueExtractor:
             print(f"  - Language: {result['metadata']['language']}")
             print(f"  - Vocals separated: {'Yes' if result['metadata']['vocals_separated'] else 'No'}")
 
+            reporter.end_stage('output', total_dialogues=len(dialogues), detected_speakers=len(speakers))
+
             return result
 
         finally:
             # Nettoyage fichiers audio temporaires
-            if audio_path and os.path.exists(audio_path):
+            if audio_path and not self._is_kept(audio_path) and os.path.exists(audio_path):
                 os.unlink(audio_path)
                 print(f"[CLEANUP] Deleted temp audio: {audio_path}", file=sys.stderr)
 
-            if vocals_path and vocals_path != audio_path and os.path.exists(vocals_path):
+            if (vocals_path and vocals_path != audio_path and not self._is_kept(vocals_path)
+                    and os.path.exists(vocals_path)):
                 os.unlink(vocals_path)
                 print(f"[CLEANUP] Deleted temp vocals: {vocals_path}", file=sys.stderr)
 
             # Libérer mémoire
             self._unload_whisper_model()
+            set_metrics(None)
             gc.collect()
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Extraction automatique de dialogues avec Whisper + diarization"
@@ -472,17 +857,46 @@ def main():
                         help="Langue source (auto/en/fr/zh/ja/..., défaut: auto)")
     parser.add_argument('--max-speakers', type=int, default=10,
                         help="Nombre max de locuteurs (défaut: 10)")
+    parser.add_argument('--stems-dir', default=None,
+                        help="Dossier de stems partagé du projet (réutilisé par ExtractInstrumental)")
+    parser.add_argument('--speaker-registry', default=None,
+                        help="Registre des locuteurs du projet / de la série (SPEAKER_<id> stables)")
+    parser.add_argument('--metrics-json', default=None,
+                        help="Écrire aussi le rapport de performance par étape dans ce fichier")
+    parser.add_argument('--worker-socket', default=os.getenv('AI_WORKER_SOCKET', ''),
+                        help="Socket du worker persistant (défaut: $AI_WORKER_SOCKET, vide = one-shot)")
 
     args = parser.parse_args()
 
+    # Client léger : déléguer au worker persistant s'il est disponible
+    if args.worker_socket:
+        from dialogue_worker import request_process_video
+
+        exit_code = request_process_video(args.worker_socket, {
+            'video_path': os.path.abspath(args.video_path),
+            'output_json': os.path.abspath(args.output_json),
+            'model': args.model,
+            'language': args.language,
+            'max_speakers': args.max_speakers,
+            'stems_dir': os.path.abspath(args.stems_dir) if args.stems_dir else None,
+            'speaker_registry': os.path.abspath(args.speaker_registry) if args.speaker_registry else None,
+            'metrics_json': os.path.abspath(args.metrics_json) if args.metrics_json else None,
+        })
+        if exit_code is not None:
+            sys.exit(exit_code)
+
+        print(f"[WORKER] Worker unavailable on {args.worker_socket}, running one-shot pipeline", file=sys.stderr)
+
     try:
         extractor = DialogueExtractor(
             model_name=args.model,
             language=args.language,
-            max_speakers=args.max_speakers
+            max_speakers=args.max_speakers,
+            stems_dir=args.stems_dir,
+            speaker_registry=args.speaker_registry
         )
 
-        result = extractor.process_video(args.video_path, args.output_json)
+        result = extractor.process_video(args.video_path, args.output_json, metrics_json=args.metrics_json)
 
         print("\n✅ Extraction terminée avec succès!")
         sys.exit(0)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Sidecar binaire des features locuteurs (re-clustering sans réanalyse de l'audio)
+
+Les monteurs relancent souvent la détection des locuteurs avec un autre --max-speakers.
+Seul le clustering dépend de ce paramètre : les diarizers écrivent donc leur matrice de
+features (MFCC 112D ou embeddings Resemblyzer 256D), le mapping vers les segments et les
+voice_info dans un .npz à côté du résultat. Avec --recluster, seul ce fichier est relu.
+
+Contenu du .npz (np.savez, sans pickle) :
+    - features : (n_valides, d) tel que calculé (float64 MFCC, float32 Resemblyzer)
+    - segment_indices : (n_valides,) indice du segment Whisper de chaque ligne
+    - voice_info : JSON (liste alignée sur features, vide pour Resemblyzer)
+    - meta : JSON {version, key, segments (signature des bornes), params}
+
+La clé combine le hash de l'audio, les bornes des segments et les réglages des features :
+un sidecar d'un autre audio, d'une autre transcription ou d'un autre moteur est ignoré.
+
+Usage:
+    from feature_sidecar import sidecar_key, save_sidecar, load_sidecar
+    key = sidecar_key(file_sha256('audio.wav'), segments, method='mfcc', engine='segment')
+    save_sidecar('out.features.npz', key, segments, features, segment_indices, voice_info, params)
+    data = load_sidecar('out.features.npz', segments, key=key)   # None si absent ou périmé
+"""
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+from typing import Dict, List, Optional
+
+import numpy as np
+
+SIDECAR_VERSION = 1
+SIDECAR_SUFFIX = '.features.npz'
+
+
+def file_sha256(path: str) -> str:
+    """sha256 du contenu d'un fichier (lecture par blocs de 4MB)"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(4 * 1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def segments_signature(segments: List[Dict]) -> str:
+    """Empreinte des bornes des segments (à la milliseconde, comme les timecodes Whisper)"""
+    bounds = [[round(float(segment['start']), 3), round(float(segment['end']), 3)] for segment in segments]
+    return hashlib.sha256(json.dumps(bounds).encode('utf-8')).hexdigest()
+
+
+def sidecar_key(audio_hash: str, segments: List[Dict], **params) -> str:
+    """Clé du sidecar = hash(audio + bornes des segments + réglages des features)"""
+    payload = json.dumps({
+        'version': SIDECAR_VERSION,
+        'audio': audio_hash,
+        'segments': segments_signature(segments),
+        'params': params,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def default_sidecar_path(output_json: str) -> str:
+    """result.json -> result.features.npz"""
+    base = output_json[:-5] if output_json.endswith('.json') else output_json
+    return base + SIDECAR_SUFFIX
+
+
+def _json_default(value):
+    # Scalaires / tableaux numpy des voice_info
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError(f"Type non sérialisable: {type(value).__name__}")
+
+
+def save_sidecar(path: str, key: str, segments: List[Dict], features: np.ndarray,
+                 segment_indices: List[int], voice_info: Optional[List[Dict]] = None,
+                 params: Optional[Dict] = None):
+    """
+    Écrire le sidecar (fichier temporaire puis renommage : jamais de sidecar partiel)
+
+    Args:
+        path: Fichier .npz
+        key: Clé (sidecar_key)
+        segments: Segments Whisper analysés (pour la signature des bornes)
+        features: (n_valides, d) features / embeddings
+        segment_indices: Indice du segment de chaque ligne de features
+        voice_info: Infos voix par ligne (MFCC), None sinon
+        params: Réglages des features (informatif)
+    """
+    meta = {
+        'version': SIDECAR_VERSION,
+        'key': key,
+        'segments': segments_signature(segments),
+        'n_segments': len(segments),
+        'params': params or {},
+    }
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(suffix='.npz.part', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(
+                f,
+                features=np.asarray(features),
+                segment_indices=np.asarray(segment_indices, dtype=np.int64),
+                voice_info=np.array(json.dumps(voice_info or [], default=_json_default)),
+                meta=np.array(json.dumps(meta)),
+            )
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+    size_kb = os.path.getsize(path) / 1024
+    print(f"💾 Sidecar features: {path} ({len(segment_indices)} segments, {size_kb:.0f}KB)", file=sys.stderr)
+
+
+def load_sidecar(path: str, segments: List[Dict], key: Optional[str] = None) -> Optional[Dict]:
+    """
+    Relire un sidecar s'il correspond aux segments (et à la clé si fournie)
+
+    Args:
+        path: Fichier .npz
+        segments: Segments Whisper courants (bornes comparées à celles du sidecar)
+        key: Clé attendue (None = pas de contrôle de l'audio : mode --recluster)
+
+    Returns:
+        {'features', 'segment_indices', 'voice_info', 'params'} ou None (absent / périmé)
+    """
+    if not path or not os.path.exists(path):
+        return None
+
+    try:
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta.get('version') != SIDECAR_VERSION:
+                print(f"⚠️  Sidecar {path} : version {meta.get('version')} ignorée", file=sys.stderr)
+                return None
+            if meta.get('segments') != segments_signature(segments):
+                print(f"⚠️  Sidecar {path} : segments différents de la transcription, ignoré", file=sys.stderr)
+                return None
+            if key is not None and meta.get('key') != key:
+                print(f"⚠️  Sidecar {path} : audio ou réglages différents, ignoré", file=sys.stderr)
+                return None
+
+            return {
+                'features': data['features'],
+                'segment_indices': data['segment_indices'].tolist(),
+                'voice_info': json.loads(str(data['voice_info'])),
+                'params': meta.get('params', {}),
+            }
+    except (OSError, ValueError, KeyError) as e:
+        print(f"⚠️  Sidecar {path} illisible ({e}), ignoré", file=sys.stderr)
+        return None
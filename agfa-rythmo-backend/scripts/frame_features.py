@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Moteur de features "frames" pour la diarization MFCC (AI_MFCC_FEATURE_ENGINE=frames)
+
+Le moteur historique (simple_diarization.extract_voice_features) relance toute la pile
+librosa sur chaque segment Whisper. Ici, les segments voisins sont regroupés en zones
+continues (MAX_SPAN_SECONDS max) : les features frame par frame (MFCC + deltas, pitch,
+spectral, chroma) y sont calculées une seule fois, puis les statistiques de chaque segment
+sont agrégées sur sa plage de frames :
+    - moyennes / écarts-types par sommes cumulées (O(1) par segment, chevauchements compris)
+    - médianes, stats de pitch et formants sur des vues (pas de copie, pas de STFT)
+
+Mêmes 112 dimensions et même voice_info que le moteur 'segment'. Les valeurs ne sont pas
+identiques au bit près : deltas, seuil top_db et accordage chroma voient le contexte de la
+zone au lieu du segment isolé.
+
+Usage:
+    from frame_features import extract_features_framewise
+    results = extract_features_framewise(audio, 16000, segments)   # [(features, voice_info) | None]
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+import librosa
+import numpy as np
+from scipy.signal import find_peaks
+
+# Durée max d'une zone analysée d'un bloc (borne la RAM : ~2 x 1025 x 200 frames/s x 4 octets)
+MAX_SPAN_SECONDS = 30.0
+# Deux segments séparés de moins que ça sont analysés dans la même zone
+MAX_GAP_SECONDS = 0.5
+
+# Lignes de la matrice des features par frame (agrégées par moyenne / écart-type)
+MFCC_ROWS = slice(0, 13)
+DELTA_ROWS = slice(13, 26)
+DELTA2_ROWS = slice(26, 39)
+CENTROID_ROW = 39
+ROLLOFF_ROW = 40
+BANDWIDTH_ROW = 41
+CONTRAST_ROWS = slice(42, 49)
+ZCR_ROW = 49
+CHROMA_ROWS = slice(50, 62)
+N_FRAME_FEATURES = 62
+
+
+def plan_spans(segments: List[Dict], sr: int, n_samples: int,
+               max_span_seconds: float = MAX_SPAN_SECONDS,
+               max_gap_seconds: float = MAX_GAP_SECONDS) -> List[Tuple[int, int, List[int]]]:
+    """
+    Regrouper les segments en zones continues
+
+    Returns:
+        [(début, fin en échantillons, indices des segments de la zone)]
+    """
+    order = sorted(range(len(segments)), key=lambda i: segments[i]['start'])
+    spans: List[Tuple[int, int, List[int]]] = []
+
+    for index in order:
+        start = max(0, int(segments[index]['start'] * sr))
+        end = min(n_samples, int(segments[index]['end'] * sr))
+        if end <= start:
+            continue
+        if spans:
+            span_start, span_end, members = spans[-1]
+            if (start - span_end <= max_gap_seconds * sr
+                    and max(end, span_end) - span_start <= max_span_seconds * sr):
+                spans[-1] = (span_start, max(span_end, end), members + [index])
+                continue
+        spans.append((start, end, [index]))
+
+    return spans
+
+
+def frame_zero_crossing_rate(y: np.ndarray, hop_length: int, frame_length: int = 2048,
+                             threshold: float = 1e-10) -> np.ndarray:
+    """
+    librosa.feature.zero_crossing_rate (center=True) par sommes cumulées
+
+    Mêmes valeurs, sans matérialiser les fenêtres de frame_length échantillons par frame
+    (hop 5ms : chaque échantillon était relu ~25 fois).
+    """
+    padded = np.pad(y, frame_length // 2, mode='edge')
+    # Signe avec seuil : |y| <= threshold compte comme 0 (positif), comme librosa.zero_crossings
+    negative = padded < -threshold
+    crossings = np.zeros(len(padded) + 1, dtype=np.int64)
+    np.cumsum(negative[1:] != negative[:-1], out=crossings[2:])
+
+    n_frames = 1 + (len(padded) - frame_length) // hop_length
+    starts = np.arange(n_frames) * hop_length
+    # Passages entre échantillons consécutifs d'une même frame (le 1er échantillon ne compte pas)
+    return (crossings[starts + frame_length] - crossings[starts + 1]) / frame_length
+
+
+def _span_frame_features(y: np.ndarray, sr: int, hop_length: int) -> Dict[str, np.ndarray]:
+    """Features par frame d'une zone (une seule STFT, mêmes réglages que le moteur 'segment')"""
+    from simple_diarization import (YIN_HOP_FACTOR, dominant_pitch, pitch_method, segment_spectrogram,
+                                    voiced_tuning, yin_pitch)
+
+    magnitude = segment_spectrogram(y, hop_length)
+    power = magnitude ** 2
+
+    mel_db = librosa.power_to_db(librosa.feature.melspectrogram(S=power, sr=sr))
+    mfcc = librosa.feature.mfcc(S=mel_db, n_mfcc=13)
+    n_frames = mfcc.shape[1]
+
+    frames = np.empty((N_FRAME_FEATURES, n_frames), dtype=np.float64)
+    frames[MFCC_ROWS] = mfcc
+    frames[DELTA_ROWS] = librosa.feature.delta(mfcc)
+    frames[DELTA2_ROWS] = librosa.feature.delta(mfcc, order=2)
+    centroid = librosa.feature.spectral_centroid(S=magnitude, sr=sr)
+    frames[CENTROID_ROW] = centroid[0]
+    frames[ROLLOFF_ROW] = librosa.feature.spectral_rolloff(S=magnitude, sr=sr)[0]
+    frames[BANDWIDTH_ROW] = librosa.feature.spectral_bandwidth(S=magnitude, sr=sr, centroid=centroid)[0]
+    frames[CONTRAST_ROWS] = librosa.feature.spectral_contrast(S=magnitude, sr=sr)
+    frames[ZCR_ROW] = frame_zero_crossing_rate(y, hop_length)[:n_frames]
+
+    if pitch_method() == 'yin':
+        # Frames YIN alignées (center=True, hop multiple) : répétées sur la grille des features
+        pitch = np.repeat(yin_pitch(y, sr, hop_length), YIN_HOP_FACTOR)[:n_frames]
+        tuning = voiced_tuning(pitch)
+    else:
+        # Pitch par frame : fréquence du bin de plus forte amplitude (0 = non voisé)
+        pitches, magnitudes = librosa.piptrack(S=magnitude, sr=sr)
+        pitch = dominant_pitch(pitches, magnitudes)
+
+        # Accordage du chroma estimé sur ce même piptrack (chroma_stft referait un piptrack complet)
+        voiced = pitches > 0
+        threshold = np.median(magnitudes[voiced]) if voiced.any() else 0.0
+        tuning = librosa.pitch_tuning(pitches[(magnitudes >= threshold) & voiced])
+    frames[CHROMA_ROWS] = librosa.feature.chroma_stft(S=power, sr=sr, tuning=tuning)
+
+    return {'frames': frames, 'pitch': pitch, 'magnitude': magnitude}
+
+
+def _pool_segment(span: Dict[str, np.ndarray], sums: np.ndarray, sums_sq: np.ndarray,
+                  k0: int, k1: int, freqs: np.ndarray) -> Tuple[np.ndarray, Dict]:
+    """Statistiques d'un segment (frames [k0, k1) de sa zone) -> (vecteur 112D brut, valeurs pour voice_info)"""
+    from simple_diarization import pitch_statistics
+
+    count = k1 - k0
+    mean = (sums[:, k1] - sums[:, k0]) / count
+    variance = np.maximum((sums_sq[:, k1] - sums_sq[:, k0]) / count - mean ** 2, 0.0)
+    std = np.sqrt(variance)
+
+    mfcc_median = np.median(span['frames'][MFCC_ROWS, k0:k1], axis=1)
+
+    pitch_mean, pitch_std, pitch_median, pitch_min, pitch_max, pitch_range = \
+        pitch_statistics(span['pitch'][k0:k1])
+
+    # Formants : pics du spectre moyen du segment
+    spec_mean = span['magnitude'][:, k0:k1].mean(axis=1)
+    peaks, _ = find_peaks(spec_mean, height=np.max(spec_mean) * 0.1)
+    formant_freqs = freqs[peaks[:3]] if len(peaks) >= 3 else np.zeros(3)
+
+    features = np.concatenate([
+        mean[MFCC_ROWS],
+        mfcc_median,
+        std[MFCC_ROWS],
+        mean[DELTA_ROWS],
+        mean[DELTA2_ROWS],
+        np.array([pitch_mean, pitch_std, pitch_median, pitch_min, pitch_max, pitch_range]),
+        np.array([mean[CENTROID_ROW], std[CENTROID_ROW], mean[ROLLOFF_ROW], std[ROLLOFF_ROW],
+                  mean[BANDWIDTH_ROW], std[BANDWIDTH_ROW], mean[ZCR_ROW]]),
+        mean[CONTRAST_ROWS],
+        mean[CHROMA_ROWS],
+        std[CHROMA_ROWS],
+        formant_freqs,
+    ])
+
+    return features, {
+        'pitch_mean': pitch_mean,
+        'pitch_median': pitch_median,
+        'formant_freqs': formant_freqs,
+        'spec_cent_mean': float(mean[CENTROID_ROW]),
+        'spec_contrast_mean': mean[CONTRAST_ROWS],
+        'zcr_mean': float(mean[ZCR_ROW]),
+    }
+
+
+def extract_features_framewise(audio: np.ndarray, sr: int, segments: List[Dict],
+                               on_progress: Optional[Callable[[int, int], None]] = None
+                               ) -> List[Optional[Tuple[np.ndarray, Dict]]]:
+    """
+    Features vocales de tous les segments, calculées par zone puis agrégées par segment
+
+    Args:
+        audio: Audio mono (np.memmap accepté : seules les zones de parole sont lues)
+        sr: Fréquence d'échantillonnage
+        segments: Segments Whisper (start/end)
+        on_progress: Rappel (segments traités, total) après chaque zone
+
+    Returns:
+        Liste alignée sur segments : (features 112D normalisées, voice_info) ou None si trop court
+    """
+    from simple_diarization import STFT_N_FFT, classify_voice_type, detect_gender
+
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+
+    hop_length = int(sr * 0.005)
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=STFT_N_FFT)
+    results: List[Optional[Tuple[np.ndarray, Dict]]] = [None] * len(segments)
+    done = 0
+
+    for span_start, span_end, members in plan_spans(segments, sr, len(audio)):
+        y = np.ascontiguousarray(audio[span_start:span_end], dtype=np.float32)
+        span = _span_frame_features(y, sr, hop_length)
+        n_frames = span['frames'].shape[1]
+
+        # Sommes cumulées (colonne 0 = 0) : somme des frames [k0, k1) = sums[:, k1] - sums[:, k0]
+        sums = np.zeros((N_FRAME_FEATURES, n_frames + 1))
+        np.cumsum(span['frames'], axis=1, out=sums[:, 1:])
+        sums_sq = np.zeros((N_FRAME_FEATURES, n_frames + 1))
+        np.cumsum(span['frames'] ** 2, axis=1, out=sums_sq[:, 1:])
+
+        for index in members:
+            start_sample = int(segments[index]['start'] * sr)
+            end_sample = int(segments[index]['end'] * sr)
+            if end_sample - start_sample < 512:  # Trop court pour analyser (comme le moteur 'segment')
+                continue
+
+            # Frames centrées (center=True) : frame k au temps span_start + k * hop
+            k0 = min(n_frames - 1, int(round((start_sample - span_start) / hop_length)))
+            k1 = min(n_frames, k0 + 1 + (end_sample - start_sample) // hop_length)
+
+            raw, stats = _pool_segment(span, sums, sums_sq, k0, k1, freqs)
+            features = (raw - np.mean(raw)) / (np.std(raw) + 1e-8)
+
+            tessiture, timbre, confidence = classify_voice_type(
+                stats['pitch_mean'], stats['pitch_median'], stats['formant_freqs'],
+                stats['spec_cent_mean'], stats['spec_contrast_mean'], stats['zcr_mean']
+            )
+            gender, gender_conf = detect_gender(
+                stats['pitch_mean'], stats['pitch_median'], stats['formant_freqs'], stats['spec_cent_mean']
+            )
+
+            results[index] = (features, {
+                'tessiture': tessiture,
+                'timbre': timbre,
+                'voice_confidence': confidence,
+                'gender': gender,
+                'gender_confidence': gender_conf,
+                'pitch_mean': stats['pitch_mean'],
+                'pitch_median': stats['pitch_median'],
+                'formants': stats['formant_freqs'].tolist(),
+            })
+
+        done += len(members)
+        if on_progress is not None:
+            on_progress(done, len(segments))
+
+    return results
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Pool de modèles IA résidents en mémoire (Whisper, Demucs, Resemblyzer)
+Utilisé par dialogue_worker.py pour éviter de recharger les modèles à chaque job
+
+Les modèles sont gardés en mémoire tant que le budget RAM le permet.
+Quand le budget est dépassé, les modèles les moins récemment utilisés (LRU)
+sont déchargés en premier.
+"""
+
+import gc
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+# Estimation RAM (MB) avant chargement, pour libérer de la place AVANT le pic
+MODEL_RAM_ESTIMATES_MB = {
+    ('whisper', 'tiny'): 400,
+    ('whisper', 'base'): 600,
+    ('whisper', 'small'): 1500,
+    ('whisper', 'medium'): 4000,
+    ('whisper', 'large'): 8000,
+    ('demucs', 'htdemucs'): 350,
+    ('demucs', 'htdemucs_ft'): 1400,
+    ('demucs', 'htdemucs_6s'): 350,
+    ('demucs', 'mdx_extra'): 600,
+    ('resemblyzer', 'default'): 50,
+    ('resemblyzer', 'onnx'): 20,
+}
+
+DEFAULT_ESTIMATE_MB = 500
+
+
+def _torch_module_size_mb(model: Any) -> Optional[float]:
+    """Taille réelle (paramètres + buffers) d'un module torch, en MB"""
+    modules = [model]
+    # Demucs BagOfModels / modèles encapsulés : parcourir les sous-modèles
+    if hasattr(model, 'models'):
+        modules = list(model.models)
+
+    total = 0
+    found = False
+    for module in modules:
+        if not hasattr(module, 'parameters'):
+            continue
+        for tensor in list(module.parameters()) + list(module.buffers()):
+            total += tensor.numel() * tensor.element_size()
+            found = True
+
+    return total / (1024 * 1024) if found else None
+
+
+def _load_whisper(name: str) -> Any:
+    import torch
+    import whisper
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    return whisper.load_model(name, device=device)
+
+
+def _load_demucs(name: str) -> Any:
+    from demucs.pretrained import get_model
+    model = get_model(name)
+    model.eval()
+    return model
+
+
+def _load_resemblyzer(name: str) -> Any:
+    if name == 'onnx':
+        # ONNX Runtime int8 (voice_encoder_onnx.py)
+        from voice_encoder_onnx import load_onnx_encoder
+        return load_onnx_encoder()
+
+    from resemblyzer import VoiceEncoder
+    return VoiceEncoder(device='cpu')
+
+
+LOADERS: Dict[str, Callable[[str], Any]] = {
+    'whisper': _load_whisper,
+    'demucs': _load_demucs,
+    'resemblyzer': _load_resemblyzer,
+}
+
+
+class ModelPool:
+    """Cache LRU de modèles avec budget RAM"""
+
+    def __init__(self, ram_budget_mb: float = 2048):
+        """
+        Args:
+            ram_budget_mb: Budget RAM total alloué aux modèles résidents
+        """
+        self.ram_budget_mb = ram_budget_mb
+        self._models: 'OrderedDict[Tuple[str, str], Dict]' = OrderedDict()
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, kind: str, name: str = 'default') -> Any:
+        """
+        Récupérer un modèle (le charger si absent)
+
+        Args:
+            kind: Type de modèle (whisper/demucs/resemblyzer)
+            name: Nom du modèle (tiny, htdemucs, ...)
+
+        Returns:
+            Le modèle chargé
+        """
+        if kind not in LOADERS:
+            raise ValueError(f"Type de modèle inconnu: {kind}")
+
+        key = (kind, name)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                entry['last_used'] = time.time()
+                self.hits += 1
+                return entry['model']
+
+            self.misses += 1
+            estimate = MODEL_RAM_ESTIMATES_MB.get(key, DEFAULT_ESTIMATE_MB)
+            self._evict_until(self.ram_budget_mb - estimate)
+
+            print(f"[POOL] Loading {kind} model '{name}' (~{estimate}MB)...", file=sys.stderr)
+            start = time.time()
+            model = LOADERS[kind](name)
+            size_mb = _torch_module_size_mb(model) or estimate
+            print(f"[POOL] Loaded {kind}/{name} in {time.time() - start:.1f}s ({size_mb:.0f}MB)", file=sys.stderr)
+
+            self._models[key] = {
+                'model': model,
+                'size_mb': size_mb,
+                'last_used': time.time(),
+            }
+            # Le modèle qui vient d'être chargé n'est jamais évincé
+            self._evict_until(self.ram_budget_mb, keep=key)
+            return model
+
+    def used_mb(self) -> float:
+        """RAM totale estimée occupée par les modèles résidents"""
+        with self._lock:
+            return sum(entry['size_mb'] for entry in self._models.values())
+
+    def _evict_until(self, target_mb: float, keep: Optional[Tuple[str, str]] = None):
+        """Décharger les modèles LRU jusqu'à passer sous target_mb"""
+        for key in list(self._models.keys()):
+            if self.used_mb() <= target_mb:
+                break
+            if key == keep:
+                continue
+            self.evict(key)
+
+    def evict(self, key: Tuple[str, str]):
+        """Décharger un modèle du pool"""
+        with self._lock:
+            entry = self._models.pop(key, None)
+            if entry is None:
+                return
+            self.evictions += 1
+            print(f"[POOL] Evicting {key[0]}/{key[1]} ({entry['size_mb']:.0f}MB)", file=sys.stderr)
+            del entry
+            gc.collect()
+            try:
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
+            except ImportError:
+                pass
+
+    def clear(self):
+        """Décharger tous les modèles"""
+        with self._lock:
+            for key in list(self._models.keys()):
+                self.evict(key)
+
+    def stats(self) -> Dict:
+        """Etat du pool (pour la commande 'stats' du worker)"""
+        with self._lock:
+            return {
+                'ram_budget_mb': self.ram_budget_mb,
+                'used_mb': round(self.used_mb(), 1),
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'models': [
+                    {
+                        'kind': kind,
+                        'name': name,
+                        'size_mb': round(entry['size_mb'], 1),
+                        'idle_seconds': round(time.time() - entry['last_used'], 1),
+                    }
+                    for (kind, name), entry in self._models.items()
+                ],
+            }
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Assignation des locuteurs en flux (clustering "online" de la diarization MFCC)
+
+Même règle que l'historique simple_diarization.sequential_clustering : chaque segment, dans
+l'ordre temporel, rejoint le locuteur compatible le plus similaire (cosinus au centroïde,
+bonus si même timbre) au-dessus du seuil, sinon crée un nouveau locuteur (jusqu'à max_speakers).
+L'ancienne boucle appelait cosine_similarity pour chaque paire (segment, locuteur) et
+recalculait chaque centroïde par np.mean sur toutes les features du locuteur : coût
+quadratique en nombre de segments. Ici :
+    - centroïdes dans une matrice (max_speakers, d), mis à jour par moyenne glissante
+    - normes des centroïdes tenues à jour : un seul produit matrice-vecteur par segment
+    - compatibilité des tessitures précalculée (masque tessiture x tessiture), indexée
+      par la tessiture de chaque locuteur
+Aucune feature n'est conservée : O(max_speakers · d) par segment, mémoire constante.
+
+Les segments peuvent arriver au fil de la transcription : add() renvoie tout de suite le
+locuteur du segment (les labels déjà donnés ne changent plus).
+
+Usage:
+    from online_clustering import OnlineSpeakerAssigner
+    assigner = OnlineSpeakerAssigner(max_speakers=10)
+    for features, info in stream:            # features 112D + voice_info, ordre temporel
+        speaker = assigner.add(features, info)
+    labels = assigner.labels()
+"""
+
+import sys
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# Seuil de similarité cosinus (+ bonus timbre) pour rejoindre un locuteur existant
+DEFAULT_SIMILARITY_THRESHOLD = 0.75
+# Bonus de similarité si même timbre (hors 'Neutre')
+TIMBRE_BONUS = 0.08
+# Au-dessus de cette confiance (des deux côtés), des tessitures incompatibles excluent le locuteur
+TESSITURE_CONFIDENCE = 0.5
+
+TESSITURES = ['Soprano', 'Mezzo', 'Alto', 'Tenor', 'Baryton', 'Basse', 'Unknown']
+
+# Tessitures pouvant être confondues (STRICT : seules les tessitures très proches)
+TESSITURE_GROUPS = {
+    'Soprano': ['Soprano'],           # Femme aiguë uniquement
+    'Mezzo': ['Mezzo', 'Alto'],       # Femme médium/grave
+    'Alto': ['Mezzo', 'Alto'],        # Femme médium/grave
+    'Tenor': ['Tenor'],               # Homme aigu uniquement
+    'Baryton': ['Baryton', 'Basse'],  # Homme médium/grave
+    'Basse': ['Baryton', 'Basse'],    # Homme médium/grave
+    'Unknown': ['Soprano', 'Mezzo', 'Alto', 'Tenor', 'Baryton', 'Basse', 'Unknown']
+}
+
+TESSITURE_EMOJIS = {
+    'Soprano': '🎵',
+    'Mezzo': '🎶',
+    'Alto': '🎼',
+    'Tenor': '🎸',
+    'Baryton': '🎺',
+    'Basse': '🎻',
+    'Unknown': '❓'
+}
+
+
+class OnlineSpeakerAssigner:
+    """Locuteurs créés et enrichis segment par segment (centroïdes en moyenne glissante)"""
+
+    def __init__(self, max_speakers: int, similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                 verbose: bool = False):
+        self.max_speakers = max(1, int(max_speakers))
+        self.similarity_threshold = similarity_threshold
+        self.verbose = verbose
+
+        # Index des tessitures (une tessiture inconnue de TESSITURES n'est compatible qu'avec elle-même)
+        self._tessiture_names = list(TESSITURES)
+        self._tessiture_index = {name: i for i, name in enumerate(TESSITURES)}
+        # incompatible[tessiture du locuteur, tessiture du segment] (hors 'Unknown' des deux côtés)
+        self._incompatible = np.zeros((len(TESSITURES), len(TESSITURES)), dtype=bool)
+        unknown = self._tessiture_index['Unknown']
+        for speaker_tessiture, compatible in TESSITURE_GROUPS.items():
+            row = self._tessiture_index[speaker_tessiture]
+            for tessiture, column in self._tessiture_index.items():
+                self._incompatible[row, column] = tessiture not in compatible
+            self._incompatible[row, unknown] = False
+        self._incompatible[unknown, :] = False
+
+        self._centroids: Optional[np.ndarray] = None       # (max_speakers, d), alloué au 1er segment
+        self._norms = np.zeros(self.max_speakers)
+        self._counts = np.zeros(self.max_speakers, dtype=np.int64)
+        self._tessitures = np.zeros(self.max_speakers, dtype=np.int64)
+        self._timbres: List[str] = []
+        self._confidences = np.zeros(self.max_speakers)
+        self._labels: List[int] = []
+
+    @property
+    def n_speakers(self) -> int:
+        return len(self._timbres)
+
+    def labels(self) -> np.ndarray:
+        """Labels des segments déjà ajoutés (ordre d'ajout)"""
+        return np.array(self._labels, dtype=int)
+
+    def _tessiture_id(self, tessiture: str) -> int:
+        index = self._tessiture_index.get(tessiture)
+        if index is None:
+            # Tessiture hors liste : compatible uniquement avec elle-même (et 'Unknown')
+            index = len(self._tessiture_index)
+            self._tessiture_index[tessiture] = index
+            self._tessiture_names.append(tessiture)
+            grown = np.ones((index + 1, index + 1), dtype=bool)
+            grown[:index, :index] = self._incompatible
+            unknown = self._tessiture_index['Unknown']
+            grown[index, index] = False
+            grown[index, unknown] = False
+            grown[unknown, index] = False
+            self._incompatible = grown
+        return index
+
+    def _new_speaker(self, x: np.ndarray, norm: float, tessiture: int, timbre: str, confidence: float) -> int:
+        speaker = self.n_speakers
+        self._centroids[speaker] = x
+        self._norms[speaker] = norm
+        self._counts[speaker] = 1
+        self._tessitures[speaker] = tessiture
+        self._timbres.append(timbre)
+        self._confidences[speaker] = confidence
+        return speaker
+
+    def _join(self, speaker: int, x: np.ndarray):
+        self._counts[speaker] += 1
+        centroid = self._centroids[speaker]
+        centroid += (x - centroid) / self._counts[speaker]
+        self._norms[speaker] = np.linalg.norm(centroid)
+
+    def add(self, features: np.ndarray, info: Dict) -> int:
+        """
+        Assigner un segment (le suivant dans l'ordre temporel)
+
+        Args:
+            features: Vecteur de features du segment
+            info: voice_info du segment (tessiture, timbre, voice_confidence)
+
+        Returns:
+            Locuteur du segment (0..max_speakers-1)
+        """
+        x = np.asarray(features, dtype=np.float64).ravel()
+        norm = float(np.linalg.norm(x))
+        tessiture_name = info['tessiture']
+        timbre = info['timbre']
+        confidence = float(info['voice_confidence'])
+        tessiture = self._tessiture_id(tessiture_name)
+        emoji = TESSITURE_EMOJIS.get(tessiture_name, '❓')
+        position = len(self._labels) + 1
+
+        if self._centroids is None:
+            self._centroids = np.zeros((self.max_speakers, len(x)))
+
+        n = self.n_speakers
+        if n == 0:
+            speaker = self._new_speaker(x, norm, tessiture, timbre, confidence)
+            self._labels.append(speaker)
+            if self.verbose:
+                print(f"  {emoji} Timecode {position}: Locuteur 0 ({tessiture_name}/{timbre}, conf: {confidence:.2f})",
+                      file=sys.stderr)
+            return speaker
+
+        # ✅ CONTRAINTE DE TESSITURE : masque précalculé, appliqué si les deux confiances > 0.5
+        if confidence > TESSITURE_CONFIDENCE:
+            allowed = ~self._incompatible[self._tessitures[:n], tessiture] | (self._confidences[:n] <= TESSITURE_CONFIDENCE)
+        else:
+            allowed = np.ones(n, dtype=bool)
+
+        # Cosinus avec tous les centroïdes en un produit (0 si vecteur nul, comme sklearn)
+        denominators = self._norms[:n] * norm
+        dots = self._centroids[:n] @ x
+        similarities = np.divide(dots, denominators, out=np.zeros(n), where=denominators > 0)
+        if timbre != 'Neutre':
+            similarities += TIMBRE_BONUS * np.fromiter((t == timbre for t in self._timbres), dtype=bool, count=n)
+
+        if self.verbose:
+            for candidate in range(n):
+                candidate_tessiture = self._tessiture_names[self._tessitures[candidate]]
+                if not allowed[candidate]:
+                    print(f"    ⊗ Skip Locuteur {candidate}: tessiture incompatible "
+                          f"({candidate_tessiture} vs {tessiture_name})", file=sys.stderr)
+                else:
+                    print(f"    → Locuteur {candidate} ({candidate_tessiture}/{self._timbres[candidate]}): "
+                          f"sim={similarities[candidate]:.3f}", file=sys.stderr)
+
+        # Meilleur locuteur compatible (premier en cas d'égalité, score > -1 comme l'ancienne boucle)
+        scores = np.where(allowed, similarities, -np.inf)
+        best = int(np.argmax(scores))
+        max_similarity = float(scores[best])
+        if max_similarity <= -1:
+            best, max_similarity = -1, -1.0
+
+        if best != -1 and max_similarity >= self.similarity_threshold:
+            self._join(best, x)
+            # Mettre à jour les infos vocales si la confiance augmente
+            if confidence > self._confidences[best]:
+                self._tessitures[best] = tessiture
+                self._timbres[best] = timbre
+                self._confidences[best] = confidence
+            speaker = best
+            if self.verbose:
+                print(f"  {emoji} Timecode {position}: Locuteur {best} (sim: {max_similarity:.3f}, "
+                      f"{tessiture_name}/{timbre})", file=sys.stderr)
+        elif n < self.max_speakers:
+            speaker = self._new_speaker(x, norm, tessiture, timbre, confidence)
+            if self.verbose:
+                reason = f"tessiture incompatible ({tessiture_name})" if best != -1 else "faible similarité"
+                print(f"  {emoji} ➕ Timecode {position}: NOUVEAU Locuteur {speaker} ({reason}, "
+                      f"sim: {max_similarity:.3f})", file=sys.stderr)
+        else:
+            # Max atteint : forcer au plus proche (au premier si aucun n'est compatible)
+            speaker = best if best != -1 else 0
+            self._join(speaker, x)
+            if self.verbose:
+                print(f"  ⚠ Timecode {position}: Forcé Locuteur {speaker} (max {self.max_speakers} atteint)",
+                      file=sys.stderr)
+
+        self._labels.append(speaker)
+        return speaker
+
+    def add_many(self, features: List[np.ndarray], voice_info: List[Dict]) -> np.ndarray:
+        """Assigner une suite de segments, renvoie leurs labels"""
+        return np.array([self.add(x, info) for x, info in zip(features, voice_info)], dtype=int)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Extraction des features vocales MFCC en parallèle (pool de process, audio partagé)
+
+Chaque appel à simple_diarization.extract_voice_features() est indépendant : les segments
+sont répartis par lots entre les process du pool. L'audio n'est jamais sérialisé vers les
+process :
+    - np.memmap sur un fichier existant : chaque process rouvre le même fichier (lecture seule)
+    - sinon : une seule copie en mémoire partagée (multiprocessing.shared_memory), lue en vue numpy
+
+Les résultats sont rangés par indice de segment : la liste renvoyée est alignée sur les
+segments, comme en séquentiel (les features sont identiques au bit près).
+
+Le nombre de process est borné par les cœurs et la RAM disponible ; s'il tombe à 1, ou si
+la mémoire partagée ne peut pas être allouée, plan_feature_workers() / extract_features_parallel()
+renvoient au séquentiel.
+
+Usage:
+    from parallel_features import plan_feature_workers, extract_features_parallel
+    workers = plan_feature_workers(4, audio, len(segments))
+    if workers > 1:
+        results = extract_features_parallel(audio, 16000, segments, workers)   # [(features, voice_info) | None]
+"""
+
+import multiprocessing
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from parallel_transcription import RAM_RESERVE_MB, available_ram_mb
+
+# RAM par process : librosa + numba, STFT / chroma du plus long segment (MB)
+FEATURE_WORKER_MB = 350
+# Segments envoyés par tâche (amortit l'aller-retour vers le pool)
+SEGMENTS_PER_TASK = 16
+
+# Audio partagé du process (attaché une seule fois par _init_worker)
+_worker_audio: Optional[np.ndarray] = None
+_worker_shm = None
+
+
+def plan_feature_workers(requested: int, audio: np.ndarray, n_segments: int) -> int:
+    """
+    Nombre de process réellement lancés (1 = séquentiel)
+
+    Args:
+        requested: Nombre demandé (--workers / AI_MFCC_WORKERS)
+        audio: Audio à analyser (sa taille compte si une copie partagée est nécessaire)
+        n_segments: Nombre de segments à analyser
+
+    Returns:
+        min(demandé, cœurs, lots de segments, RAM disponible / RAM par process), au moins 1
+    """
+    n_tasks = -(-n_segments // SEGMENTS_PER_TASK)
+    workers = min(requested, n_tasks, os.cpu_count() or 1)
+    if workers <= 1:
+        return 1
+
+    free_mb = available_ram_mb()
+    if free_mb is not None:
+        shared_mb = 0.0 if _memmap_source(audio) else audio.nbytes / (1024 * 1024)
+        ram_limit = int((free_mb - RAM_RESERVE_MB - shared_mb) // FEATURE_WORKER_MB)
+        if ram_limit < workers:
+            fallback = "séquentiel" if ram_limit <= 1 else f"{ram_limit} process"
+            print(f"⚠️  RAM disponible {free_mb:.0f}MB : {fallback} au lieu de {workers} process "
+                  f"(~{FEATURE_WORKER_MB}MB chacun + {shared_mb:.0f}MB d'audio partagé)", file=sys.stderr)
+        workers = min(workers, ram_limit)
+
+    return max(1, workers)
+
+
+def _memmap_source(audio: np.ndarray) -> Optional[Tuple[str, int]]:
+    """(fichier, offset) si l'audio est un memmap C-contigu sur un fichier toujours présent"""
+    if not isinstance(audio, np.memmap) or audio.filename is None or not audio.flags['C_CONTIGUOUS']:
+        return None
+    if not os.path.exists(audio.filename):
+        # Fichier temporaire déjà supprimé (audio_io.decode_audio_to_memmap) : pas réouvrable
+        return None
+    return audio.filename, audio.offset
+
+
+def _shm_free_bytes() -> Optional[int]:
+    """Espace libre de /dev/shm (support de shared_memory sous Linux), None si absent"""
+    try:
+        import shutil
+        return shutil.disk_usage('/dev/shm').free
+    except OSError:
+        return None
+
+
+def _init_worker(source: Dict):
+    """Initialisation d'un process du pool : 1 thread BLAS, vue numpy sur l'audio partagé"""
+    global _worker_audio, _worker_shm
+
+    try:
+        from threadpoolctl import threadpool_limits
+        # Les process se partagent les cœurs : pas de sur-souscription BLAS / OpenMP
+        threadpool_limits(limits=1)
+    except ImportError:
+        pass
+
+    dtype = np.dtype(source['dtype'])
+    shape = tuple(source['shape'])
+    if 'filename' in source:
+        _worker_audio = np.memmap(source['filename'], dtype=dtype, mode='r',
+                                  offset=source['offset'], shape=shape)
+    else:
+        from multiprocessing import shared_memory
+
+        _worker_shm = shared_memory.SharedMemory(name=source['shm_name'])
+        _worker_audio = np.ndarray(shape, dtype=dtype, buffer=_worker_shm.buf)
+        _worker_audio.flags.writeable = False
+
+
+def _extract_batch(batch: List[Tuple[int, float, float]], sr: int) -> List[Tuple[int, Optional[Tuple]]]:
+    """Features d'un lot de segments [(indice, start, end)] -> [(indice, résultat | None)]"""
+    from simple_diarization import extract_voice_features
+
+    results = []
+    for index, start, end in batch:
+        try:
+            result = extract_voice_features(_worker_audio, sr, start, end)
+        except Exception as e:
+            print(f"⚠️  Erreur extraction features segment {start:.2f}-{end:.2f}: {e}", file=sys.stderr)
+            import traceback
+            traceback.print_exc()
+            result = None
+        results.append((index, result))
+    return results
+
+
+def extract_features_parallel(audio: np.ndarray, sr: int, segments: List[Dict], workers: int,
+                              on_progress: Optional[Callable[[int, int], None]] = None
+                              ) -> Optional[List[Optional[Tuple[np.ndarray, Dict]]]]:
+    """
+    Features vocales des segments (moteur 'segment') dans un pool de process
+
+    Args:
+        audio: Audio (np.memmap accepté : rouvert par chaque process sans copie)
+        sr: Fréquence d'échantillonnage
+        segments: Segments Whisper (start/end) ; ceux de moins de 300ms sont ignorés
+        workers: Nombre de process (voir plan_feature_workers)
+        on_progress: Rappel (segments traités, total) après chaque lot
+
+    Returns:
+        Liste alignée sur segments : (features 112D normalisées, voice_info) ou None,
+        ou None si la mémoire partagée n'a pas pu être allouée (l'appelant repasse en séquentiel)
+    """
+    results: List[Optional[Tuple[np.ndarray, Dict]]] = [None] * len(segments)
+    # Même filtre que la boucle séquentielle de diarize() (segments trop courts)
+    todo = [(index, segment['start'], segment['end']) for index, segment in enumerate(segments)
+            if segment['end'] - segment['start'] >= 0.3]
+    batches = [todo[i:i + SEGMENTS_PER_TASK] for i in range(0, len(todo), SEGMENTS_PER_TASK)]
+    if not batches:
+        return results
+
+    shm = None
+    mapped = _memmap_source(audio)
+    if mapped is not None:
+        source = {'filename': mapped[0], 'offset': mapped[1], 'dtype': audio.dtype.str, 'shape': audio.shape}
+    else:
+        from multiprocessing import shared_memory
+
+        # /dev/shm trop petit (64MB par défaut sous Docker) : l'écriture planterait (SIGBUS)
+        shm_free = _shm_free_bytes()
+        if shm_free is not None and shm_free < audio.nbytes:
+            print(f"⚠️  /dev/shm trop petit ({shm_free / (1024 * 1024):.0f}MB libres pour "
+                  f"{audio.nbytes / (1024 * 1024):.0f}MB d'audio), extraction séquentielle", file=sys.stderr)
+            return None
+        try:
+            shm = shared_memory.SharedMemory(create=True, size=max(1, audio.nbytes))
+        except OSError as e:
+            print(f"⚠️  Mémoire partagée indisponible ({e}), extraction séquentielle", file=sys.stderr)
+            return None
+        shared = np.ndarray(audio.shape, dtype=audio.dtype, buffer=shm.buf)
+        shared[...] = audio
+        del shared
+        source = {'shm_name': shm.name, 'dtype': audio.dtype.str, 'shape': audio.shape}
+
+    print(f"⚡ Extraction features sur {workers} process ({len(todo)} segments, "
+          f"{'memmap' if shm is None else 'mémoire partagée'})", file=sys.stderr)
+
+    # spawn : pas de fork d'un process qui a déjà des threads BLAS / numba actifs
+    context = multiprocessing.get_context('spawn')
+    max_pending = workers * 2
+    done_segments = 0
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                 initializer=_init_worker, initargs=(source,)) as executor:
+            pending = set()
+            next_submit = 0
+
+            while next_submit < len(batches) or pending:
+                while next_submit < len(batches) and len(pending) < max_pending:
+                    pending.add(executor.submit(_extract_batch, batches[next_submit], sr))
+                    next_submit += 1
+
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch_results = future.result()
+                    for index, result in batch_results:
+                        results[index] = result
+                    done_segments += len(batch_results)
+                    if on_progress is not None:
+                        on_progress(done_segments, len(todo))
+    finally:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    return results
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Transcription Whisper des chunks de parole en parallèle (pool de process)
+
+Les chunks produits par vad_chunking.plan_chunks() sont indépendants : chaque process du pool
+charge son propre modèle Whisper (CPU, AI_TRANSCRIPTION_THREADS_PER_WORKER threads torch)
+et transcrit un chunk à la fois. Les résultats sont remis dans l'ordre des chunks, si bien
+que la structure finale (segments, ids, timestamps absolus) est identique au mode séquentiel.
+
+Le nombre de process est borné par la RAM disponible (un modèle par process) et par les cœurs.
+
+Usage:
+    from parallel_transcription import plan_workers, transcribe_chunks
+    workers = plan_workers(4, 'small', len(chunks), threads_per_worker=2)
+    for index, result in transcribe_chunks(audio, chunks, 'small', options, workers, 2):
+        segments += remap_segments(result['segments'], chunks[index], 16000, first_id=len(segments))
+"""
+
+import multiprocessing
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from model_pool import DEFAULT_ESTIMATE_MB, MODEL_RAM_ESTIMATES_MB
+
+# RAM par process en plus du modèle : runtime torch, mel, chunk en cours (MB)
+WORKER_OVERHEAD_MB = 400
+# RAM laissée au process principal et au système (MB)
+RAM_RESERVE_MB = 1024
+
+# Modèle Whisper du process (chargé une seule fois par _init_worker)
+_worker_model = None
+
+
+def available_ram_mb() -> Optional[float]:
+    """RAM disponible (MemAvailable) en MB, None si indisponible (non-Linux)"""
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def plan_workers(requested: int, model_name: str, n_chunks: int, threads_per_worker: int = 1) -> int:
+    """
+    Nombre de process réellement lancés
+
+    Args:
+        requested: Nombre demandé (AI_TRANSCRIPTION_WORKERS)
+        model_name: Modèle Whisper (pour l'estimation RAM)
+        n_chunks: Nombre de chunks à transcrire
+        threads_per_worker: Threads torch par process
+
+    Returns:
+        min(demandé, chunks, cœurs / threads, RAM disponible / RAM par process), au moins 1
+    """
+    workers = min(requested, n_chunks, max(1, (os.cpu_count() or 1) // max(1, threads_per_worker)))
+
+    per_worker_mb = MODEL_RAM_ESTIMATES_MB.get(('whisper', model_name), DEFAULT_ESTIMATE_MB) + WORKER_OVERHEAD_MB
+    free_mb = available_ram_mb()
+    if free_mb is not None:
+        ram_limit = int((free_mb - RAM_RESERVE_MB) // per_worker_mb)
+        if ram_limit < workers:
+            print(f"⚠️  RAM disponible {free_mb:.0f}MB : {max(1, ram_limit)} process au lieu de {workers} "
+                  f"(~{per_worker_mb}MB chacun)", file=sys.stderr)
+        workers = min(workers, ram_limit)
+
+    return max(1, workers)
+
+
+def _init_worker(model_name: str, threads: int):
+    """Initialisation d'un process du pool : threads torch bornés puis chargement du modèle"""
+    global _worker_model
+
+    # Avant l'import de torch : sinon chaque process prend tous les cœurs (sur-souscription)
+    os.environ['OMP_NUM_THREADS'] = str(threads)
+    os.environ['MKL_NUM_THREADS'] = str(threads)
+
+    import torch
+    import whisper
+
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+    _worker_model = whisper.load_model(model_name, device='cpu')
+
+
+def _transcribe_chunk(index: int, audio: np.ndarray, options: Dict) -> Tuple[int, Dict]:
+    result = _worker_model.transcribe(audio, **options)
+    return index, result
+
+
+def transcribe_chunks(audio: np.ndarray, chunks: List, model_name: str, options: Dict,
+                      workers: int, threads_per_worker: int = 1) -> Iterator[Tuple[int, Dict]]:
+    """
+    Transcrire les chunks dans un pool de process, résultats rendus dans l'ordre des chunks
+
+    Au plus 2 chunks en attente par process : l'audio n'est copié vers le pool qu'au fur et
+    à mesure (la RAM ne dépend pas de la durée de la vidéo).
+
+    Args:
+        audio: Audio float32 mono 16kHz (np.memmap accepté)
+        chunks: SpeechChunk à transcrire (vad_chunking.plan_chunks)
+        model_name: Modèle Whisper chargé par chaque process
+        options: Options model.transcribe() (même langue pour tous les chunks)
+        workers: Nombre de process (voir plan_workers)
+        threads_per_worker: Threads torch par process
+
+    Yields:
+        (index du chunk, résultat Whisper en temps relatif au chunk)
+    """
+    # spawn : pas de fork d'un process qui a déjà des threads torch / OpenMP actifs
+    context = multiprocessing.get_context('spawn')
+    max_pending = workers * 2
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                             initializer=_init_worker, initargs=(model_name, threads_per_worker)) as executor:
+        pending = set()
+        ready: Dict[int, Dict] = {}
+        next_submit = 0
+        next_yield = 0
+
+        while next_yield < len(chunks):
+            while next_submit < len(chunks) and len(pending) + len(ready) < max_pending:
+                pending.add(executor.submit(_transcribe_chunk, next_submit,
+                                            chunks[next_submit].audio(audio), options))
+                next_submit += 1
+
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, result = future.result()
+                ready[index] = result
+
+            while next_yield in ready:
+                yield next_yield, ready.pop(next_yield)
+                next_yield += 1
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+Cache disque content-addressed pour le pipeline d'extraction de dialogues
+Évite de refaire FFmpeg + Demucs + Whisper quand on relance une extraction sur la même vidéo
+(ex: autre --max-speakers ou autre méthode de diarization)
+
+Clé = sha256(hash du média source + étape + paramètres de l'étape)
+Étapes mises en cache :
+    - audio         : WAV extrait par FFmpeg
+    - vocals        : voix séparées par Demucs
+    - transcription : résultat Whisper (JSON)
+    - speaker_features : features MFCC / embeddings par segment (.npz, feature_sidecar.py) :
+      un autre --max-speakers ne refait que le clustering
+
+Taille bornée (AI_CACHE_MAX_MB) avec éviction LRU.
+
+Usage:
+    python pipeline_cache.py stats
+    python pipeline_cache.py list [--stage audio]
+    python pipeline_cache.py purge [--stage vocals] [--older-than-days 30]
+    python pipeline_cache.py evict --max-mb 2048
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# Incrémenter si le format d'une étape change (invalide tout le cache)
+CACHE_VERSION = 1
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / 'storage' / 'app' / 'ai_cache'
+DEFAULT_MAX_MB = 5120
+
+# Les entrées utilisées récemment ne sont évincées qu'en dernier recours (job concurrent en cours)
+RECENT_ACCESS_GRACE_SECONDS = 600
+
+
+def cache_enabled() -> bool:
+    """Cache activé via AI_CACHE_ENABLED=true"""
+    return os.getenv('AI_CACHE_ENABLED', 'false').lower() == 'true'
+
+
+class PipelineCache:
+    """Cache content-addressed avec index JSON et éviction LRU"""
+
+    def __init__(self, cache_dir: Optional[str] = None, max_mb: Optional[float] = None):
+        """
+        Args:
+            cache_dir: Dossier du cache (défaut: $AI_CACHE_DIR ou storage/app/ai_cache)
+            max_mb: Taille max du cache (défaut: $AI_CACHE_MAX_MB ou 5120)
+        """
+        self.cache_dir = Path(cache_dir or os.getenv('AI_CACHE_DIR') or DEFAULT_CACHE_DIR)
+        self.max_bytes = int(float(max_mb or os.getenv('AI_CACHE_MAX_MB', DEFAULT_MAX_MB)) * 1024 * 1024)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index_path = self.cache_dir / 'index.json'
+        self.lock_path = self.cache_dir / 'index.lock'
+        # Entrées lues/écrites par ce process : jamais évincées sous ses pieds
+        self._pinned = set()
+
+    # ------------------------------------------------------------------
+    # Index (protégé par flock : plusieurs workers de queue en parallèle)
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _locked_index(self):
+        with open(self.lock_path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                index = self._read_index()
+                yield index
+                tmp_path = self.index_path.with_suffix('.tmp')
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(index, f, indent=1)
+                os.replace(tmp_path, self.index_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_index(self) -> Dict:
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        index.setdefault('entries', {})
+        index.setdefault('hashes', {})
+        return index
+
+    # ------------------------------------------------------------------
+    # Clés
+    # ------------------------------------------------------------------
+
+    def hash_file(self, path: str) -> str:
+        """
+        sha256 du contenu d'un fichier (mémorisé par chemin + taille + mtime)
+
+        Args:
+            path: Fichier source (vidéo)
+
+        Returns:
+            Hash hexadécimal du contenu
+        """
+        stat = os.stat(path)
+        memo_key = f"{os.path.realpath(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+
+        with self._locked_index() as index:
+            cached = index['hashes'].get(memo_key)
+        if cached:
+            return cached
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(4 * 1024 * 1024), b''):
+                digest.update(block)
+        file_hash = digest.hexdigest()
+
+        with self._locked_index() as index:
+            index['hashes'][memo_key] = file_hash
+        return file_hash
+
+    @staticmethod
+    def make_key(stage: str, source_hash: str, **params) -> str:
+        """Clé d'une étape = hash(source + étape + paramètres)"""
+        payload = json.dumps({
+            'version': CACHE_VERSION,
+            'stage': stage,
+            'source': source_hash,
+            'params': params,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry_path(self, stage: str, key: str, suffix: str) -> Path:
+        return self.cache_dir / stage / key[:2] / f"{key}{suffix}"
+
+    # ------------------------------------------------------------------
+    # Lecture / écriture
+    # ------------------------------------------------------------------
+
+    def get_file(self, stage: str, key: str) -> Optional[str]:
+        """Chemin du fichier en cache (None si absent), marque l'entrée comme utilisée"""
+        with self._locked_index() as index:
+            entry = index['entries'].get(key)
+            if entry is None:
+                return None
+            path = self.cache_dir / entry['file']
+            if not path.exists():
+                del index['entries'][key]
+                return None
+            entry['last_access'] = time.time()
+            entry['hits'] = entry.get('hits', 0) + 1
+            self._pinned.add(key)
+        print(f"[CACHE] HIT {stage} ({key[:12]})", file=sys.stderr)
+        return str(path)
+
+    def put_file(self, stage: str, key: str, src_path: str, move: bool = True, params: Optional[Dict] = None) -> str:
+        """
+        Ajouter un fichier au cache
+
+        Args:
+            stage: Étape (audio/vocals/...)
+            key: Clé (make_key)
+            src_path: Fichier produit par l'étape
+            move: Déplacer (fichier temporaire) ou copier (fichier à conserver)
+            params: Paramètres de l'étape (informatif, affiché par 'list')
+
+        Returns:
+            Chemin du fichier dans le cache
+        """
+        dest = self._entry_path(stage, key, Path(src_path).suffix)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        # Fichier temporaire propre à cet appel : deux workers qui produisent la même entrée
+        # (même source dans deux projets, job relancé) ne se prennent pas leur .part
+        fd, tmp_dest = tempfile.mkstemp(suffix='.part', dir=dest.parent)
+        os.close(fd)
+        try:
+            if move:
+                shutil.move(src_path, tmp_dest)
+            else:
+                shutil.copyfile(src_path, tmp_dest)
+            os.replace(tmp_dest, dest)
+        except BaseException:
+            if os.path.exists(tmp_dest):
+                os.unlink(tmp_dest)
+            raise
+
+        self._register(stage, key, dest, params)
+        return str(dest)
+
+    def get_json(self, stage: str, key: str) -> Optional[Dict]:
+        """Résultat JSON en cache (None si absent)"""
+        path = self.get_file(stage, key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put_json(self, stage: str, key: str, data: Dict, params: Optional[Dict] = None):
+        """Ajouter un résultat JSON au cache"""
+        dest = self._entry_path(stage, key, '.json')
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp_dest = tempfile.mkstemp(suffix='.part', dir=dest.parent)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_dest, dest)
+        except BaseException:
+            if os.path.exists(tmp_dest):
+                os.unlink(tmp_dest)
+            raise
+
+        self._register(stage, key, dest, params)
+
+    def owns(self, path: Optional[str]) -> bool:
+        """Le fichier appartient-il au cache (ne pas le supprimer au nettoyage) ?"""
+        if not path:
+            return False
+        try:
+            Path(path).resolve().relative_to(self.cache_dir.resolve())
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def _register(self, stage: str, key: str, path: Path, params: Optional[Dict]):
+        now = time.time()
+        with self._locked_index() as index:
+            index['entries'][key] = {
+                'stage': stage,
+                'file': str(path.relative_to(self.cache_dir)),
+                'size': path.stat().st_size,
+                'created': now,
+                'last_access': now,
+                'hits': 0,
+                'params': params or {},
+            }
+            self._pinned.add(key)
+            self._evict_locked(index, self.max_bytes)
+
+        size_mb = path.stat().st_size / (1024 * 1024)
+        print(f"[CACHE] STORE {stage} ({key[:12]}, {size_mb:.1f}MB)", file=sys.stderr)
+
+    # ------------------------------------------------------------------
+    # Éviction / inspection
+    # ------------------------------------------------------------------
+
+    def _evict_locked(self, index: Dict, max_bytes: int) -> int:
+        """Évincer les entrées LRU jusqu'à max_bytes (index déjà verrouillé)"""
+        entries = index['entries']
+        total = sum(entry['size'] for entry in entries.values())
+        if total <= max_bytes:
+            return 0
+
+        now = time.time()
+        by_age = sorted(entries.items(), key=lambda item: item[1]['last_access'])
+        # D'abord les entrées non utilisées récemment, puis les autres si toujours trop gros
+        candidates = [item for item in by_age if now - item[1]['last_access'] > RECENT_ACCESS_GRACE_SECONDS]
+        candidates += [item for item in by_age if item not in candidates]
+
+        evicted = 0
+        for key, entry in candidates:
+            if total <= max_bytes:
+                break
+            if key in self._pinned:
+                continue
+            (self.cache_dir / entry['file']).unlink(missing_ok=True)
+            total -= entry['size']
+            del entries[key]
+            evicted += 1
+
+        if evicted:
+            print(f"[CACHE] Evicted {evicted} entries (LRU), size now {total / (1024 * 1024):.1f}MB", file=sys.stderr)
+        return evicted
+
+    def evict(self, max_mb: Optional[float] = None) -> int:
+        """Évincer les entrées LRU jusqu'à max_mb (défaut: taille max configurée)"""
+        max_bytes = int(max_mb * 1024 * 1024) if max_mb is not None else self.max_bytes
+        with self._locked_index() as index:
+            return self._evict_locked(index, max_bytes)
+
+    def list_entries(self, stage: Optional[str] = None) -> List[Dict]:
+        """Entrées du cache (plus récemment utilisées en premier)"""
+        with self._locked_index() as index:
+            entries = [dict(entry, key=key) for key, entry in index['entries'].items()
+                       if stage is None or entry['stage'] == stage]
+        return sorted(entries, key=lambda entry: entry['last_access'], reverse=True)
+
+    def stats(self) -> Dict:
+        """Statistiques par étape"""
+        stages: Dict[str, Dict] = {}
+        for entry in self.list_entries():
+            stage = stages.setdefault(entry['stage'], {'entries': 0, 'size_mb': 0.0, 'hits': 0})
+            stage['entries'] += 1
+            stage['size_mb'] += entry['size'] / (1024 * 1024)
+            stage['hits'] += entry.get('hits', 0)
+
+        total_mb = sum(stage['size_mb'] for stage in stages.values())
+        return {
+            'cache_dir': str(self.cache_dir),
+            'max_mb': round(self.max_bytes / (1024 * 1024), 1),
+            'total_mb': round(total_mb, 1),
+            'stages': {name: dict(stage, size_mb=round(stage['size_mb'], 1)) for name, stage in stages.items()},
+        }
+
+    def purge(self, stage: Optional[str] = None, older_than_days: Optional[float] = None) -> int:
+        """
+        Supprimer des entrées
+
+        Args:
+            stage: Limiter à une étape (None = toutes)
+            older_than_days: Seulement les entrées non utilisées depuis N jours
+
+        Returns:
+            Nombre d'entrées supprimées
+        """
+        cutoff = time.time() - older_than_days * 86400 if older_than_days is not None else None
+        removed = 0
+        with self._locked_index() as index:
+            for key, entry in list(index['entries'].items()):
+                if stage is not None and entry['stage'] != stage:
+                    continue
+                if cutoff is not None and entry['last_access'] > cutoff:
+                    continue
+                (self.cache_dir / entry['file']).unlink(missing_ok=True)
+                del index['entries'][key]
+                removed += 1
+            if stage is None and cutoff is None:
+                index['hashes'] = {}
+        return removed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspection / purge du cache du pipeline IA")
+    parser.add_argument('command', choices=['stats', 'list', 'purge', 'evict'])
+    parser.add_argument('--cache-dir', default=None, help="Dossier du cache (défaut: $AI_CACHE_DIR)")
+    parser.add_argument('--stage', default=None, help="Limiter à une étape (audio/vocals/transcription)")
+    parser.add_argument('--older-than-days', type=float, default=None,
+                        help="purge : seulement les entrées inutilisées depuis N jours")
+    parser.add_argument('--max-mb', type=float, default=None, help="evict : taille cible en MB")
+
+    args = parser.parse_args()
+    cache = PipelineCache(args.cache_dir)
+
+    if args.command == 'stats':
+        print(json.dumps(cache.stats(), indent=2))
+    elif args.command == 'list':
+        for entry in cache.list_entries(args.stage):
+            last_access = time.strftime('%Y-%m-%d %H:%M', time.localtime(entry['last_access']))
+            print(f"{entry['key'][:12]}  {entry['stage']:<14} {entry['size'] / (1024 * 1024):>9.1f}MB  "
+                  f"hits={entry.get('hits', 0):<4} last={last_access}  {json.dumps(entry.get('params', {}))}")
+    elif args.command == 'purge':
+        removed = cache.purge(args.stage, args.older_than_days)
+        print(f"✅ {removed} entrée(s) supprimée(s)")
+    elif args.command == 'evict':
+        evicted = cache.evict(args.max_mb)
+        print(f"✅ {evicted} entrée(s) évincée(s)")
+
+
+if __name__ == '__main__':
+    main()
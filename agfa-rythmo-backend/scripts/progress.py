@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Progression machine-readable du pipeline IA (JSON lines)
+
+Les scripts écrivent leurs logs libres sur stderr ; la progression structurée part sur
+un fd dédié ouvert par le job Laravel (AI_PROGRESS_FD, en général 3), une ligne JSON par événement :
+
+    {"event": "stage_start", "stage": "transcription", "overall": 0.2, ...}
+    {"event": "progress", "stage": "transcription", "fraction": 0.42, "done": 1260, "total": 3000,
+     "unit": "frames", "eta_seconds": 38.5, "elapsed_seconds": 27.9, "rss_mb": 812.4, "overall": 0.41}
+    {"event": "stage_end", "stage": "transcription", "elapsed_seconds": 66.2, "overall": 0.7, ...}
+
+'overall' situe l'événement dans le pipeline complet (STAGE_RANGES), quel que soit le process
+qui l'émet (extract_dialogues.py, separate_stems.py lancé en sous-process, worker persistant).
+
+Sans AI_PROGRESS_FD, toutes les fonctions sont des no-op.
+
+Usage:
+    from progress import get_reporter, track_tqdm
+    reporter = get_reporter()
+    with reporter.stage('diarization'):
+        for i, segment in enumerate(segments):
+            ...
+            reporter.update('diarization', i + 1, len(segments), unit='segments')
+"""
+
+import importlib
+import json
+import os
+import sys
+import time
+import types
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional, Tuple
+
+# Part de chaque étape dans la progression globale (début, fin)
+STAGE_RANGES = {
+    'audio': (0.0, 0.10),
+    'separation': (0.10, 0.20),
+    'transcription': (0.20, 0.70),
+    'diarization': (0.70, 0.90),
+    'output': (0.90, 1.0),
+}
+
+# Intervalle minimal entre deux événements 'progress' d'une même étape
+MIN_INTERVAL_SECONDS = 0.5
+
+
+def current_rss_mb() -> Optional[float]:
+    """RSS actuel du process en MB (None si indisponible)"""
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            resident_pages = int(f.read().split()[1])
+        return round(resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024), 1)
+    except (OSError, ValueError, IndexError):
+        pass
+
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss : KB sous Linux, octets sous macOS (pic, faute de mieux)
+        divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+        return round(peak / divisor, 1)
+    except (ImportError, OSError):
+        return None
+
+
+class ProgressReporter:
+    """Émetteur d'événements de progression (fd ou callback)"""
+
+    def __init__(self, fd: Optional[int] = None, sink: Optional[Callable[[Dict], None]] = None):
+        """
+        Args:
+            fd: Descripteur où écrire les lignes JSON (hérité du job Laravel)
+            sink: Callback recevant chaque événement (worker persistant : renvoi sur le socket)
+        """
+        self.fd = fd
+        self.sink = sink
+        self._stage_started: Dict[str, float] = {}
+        self._last_emit: Dict[str, Tuple[float, float]] = {}
+
+    @classmethod
+    def from_env(cls) -> 'ProgressReporter':
+        value = os.getenv('AI_PROGRESS_FD', '').strip()
+        if not value.isdigit():
+            return cls()
+        fd = int(value)
+        try:
+            os.fstat(fd)
+        except OSError:
+            # fd annoncé mais pas hérité (script lancé à la main avec la variable)
+            return cls()
+        return cls(fd=fd)
+
+    @property
+    def enabled(self) -> bool:
+        return self.fd is not None or self.sink is not None
+
+    def emit(self, event: Dict):
+        """Émettre un événement brut (déjà formaté)"""
+        if self.sink is not None:
+            self.sink(event)
+            return
+        if self.fd is None:
+            return
+
+        line = (json.dumps(event, ensure_ascii=False) + '\n').encode('utf-8')
+        try:
+            # Une seule écriture < PIPE_BUF : pas de lignes entremêlées avec un sous-process
+            os.write(self.fd, line)
+        except OSError:
+            # Lecteur parti : le pipeline continue sans progression
+            self.fd = None
+
+    @staticmethod
+    def _overall(stage: str, fraction: float) -> Optional[float]:
+        if stage not in STAGE_RANGES:
+            return None
+        start, end = STAGE_RANGES[stage]
+        return round(start + (end - start) * fraction, 4)
+
+    def _event(self, event_type: str, stage: str, fraction: float, **extra) -> Dict:
+        started = self._stage_started.get(stage)
+        event = {
+            'event': event_type,
+            'stage': stage,
+            'fraction': round(fraction, 4),
+            'overall': self._overall(stage, fraction),
+            'elapsed_seconds': round(time.time() - started, 2) if started else 0.0,
+            'rss_mb': current_rss_mb(),
+        }
+        event.update(extra)
+        return event
+
+    def start_stage(self, stage: str, **extra):
+        if not self.enabled:
+            return
+        self._stage_started[stage] = time.time()
+        self._last_emit.pop(stage, None)
+        self.emit(self._event('stage_start', stage, 0.0, **extra))
+
+    def end_stage(self, stage: str, **extra):
+        if not self.enabled:
+            return
+        self.emit(self._event('stage_end', stage, 1.0, **extra))
+        self._stage_started.pop(stage, None)
+
+    def update(self, stage: str, done: float, total: Optional[float] = None, unit: str = 'items',
+               force: bool = False):
+        """
+        Progression d'une étape (limitée à un événement toutes les MIN_INTERVAL_SECONDS)
+
+        Args:
+            stage: Étape (clé de STAGE_RANGES)
+            done: Quantité traitée
+            total: Quantité totale (None = inconnue)
+            unit: Unité de done/total (segments, frames, chunks...)
+            force: Émettre même si le dernier événement est trop récent
+        """
+        if not self.enabled:
+            return
+
+        now = time.time()
+        self._stage_started.setdefault(stage, now)
+        fraction = min(1.0, done / total) if total else 0.0
+
+        last_time, last_fraction = self._last_emit.get(stage, (0.0, -1.0))
+        if not force and fraction < 1.0 and now - last_time < MIN_INTERVAL_SECONDS:
+            return
+        if fraction == last_fraction:
+            return
+        self._last_emit[stage] = (now, fraction)
+
+        elapsed = now - self._stage_started[stage]
+        eta = elapsed * (1.0 - fraction) / fraction if fraction > 0 else None
+
+        self.emit(self._event(
+            'progress', stage, fraction,
+            done=done, total=total, unit=unit,
+            eta_seconds=round(eta, 1) if eta is not None else None
+        ))
+
+    @contextmanager
+    def stage(self, stage: str, **extra):
+        """Encadrer une étape par stage_start / stage_end"""
+        self.start_stage(stage, **extra)
+        try:
+            yield self
+        finally:
+            self.end_stage(stage)
+
+
+_reporter: Optional[ProgressReporter] = None
+
+
+def get_reporter() -> ProgressReporter:
+    """Reporter du process (créé depuis AI_PROGRESS_FD au premier appel)"""
+    global _reporter
+    if _reporter is None:
+        _reporter = ProgressReporter.from_env()
+    return _reporter
+
+
+def set_reporter(reporter: Optional[ProgressReporter]):
+    """Remplacer le reporter (worker : un par job), None = recréer depuis l'environnement"""
+    global _reporter
+    _reporter = reporter
+
+
+def inherited_fds() -> Tuple[int, ...]:
+    """fds à transmettre aux sous-process (Popen(pass_fds=...)) pour qu'ils émettent aussi"""
+    reporter = get_reporter()
+    return (reporter.fd,) if reporter.fd is not None else ()
+
+
+class _ProgressBar:
+    """Remplaçant minimal de tqdm.tqdm : relaie la progression au reporter, rien sur stderr"""
+
+    stage = 'unknown'
+
+    def __init__(self, iterable=None, total=None, unit: str = 'it', **kwargs):
+        self.iterable = iterable
+        if total is None and iterable is not None:
+            try:
+                total = len(iterable)
+            except TypeError:
+                total = None
+        self.total = total
+        self.unit = unit
+        self.n = 0
+
+    def __iter__(self):
+        for item in self.iterable:
+            yield item
+            self.update(1)
+
+    def __len__(self):
+        return self.total or 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def update(self, n: float = 1):
+        self.n += n
+        get_reporter().update(self.stage, self.n, self.total, unit=self.unit)
+
+    def close(self):
+        if self.total:
+            get_reporter().update(self.stage, self.n, self.total, unit=self.unit, force=True)
+
+    def set_description(self, *args, **kwargs):
+        pass
+
+    def set_postfix(self, *args, **kwargs):
+        pass
+
+    def refresh(self, *args, **kwargs):
+        pass
+
+
+@contextmanager
+def track_tqdm(module_name: str, stage: str):
+    """
+    Relayer les barres tqdm d'un module tiers (whisper.transcribe, demucs.apply) en événements
+
+    Le module doit faire 'import tqdm' puis 'tqdm.tqdm(...)'. Sans reporter actif,
+    le module n'est pas modifié (barre tqdm habituelle sur stderr).
+    """
+    if not get_reporter().enabled:
+        yield
+        return
+
+    try:
+        module = importlib.import_module(module_name)
+    except ImportError:
+        yield
+        return
+
+    if not hasattr(module, 'tqdm'):
+        yield
+        return
+
+    bar_class = type('ProgressBar', (_ProgressBar,), {'stage': stage})
+    original = module.tqdm
+    module.tqdm = types.SimpleNamespace(tqdm=bar_class)
+    try:
+        yield
+    finally:
+        module.tqdm = original
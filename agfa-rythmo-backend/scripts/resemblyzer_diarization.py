@@ -8,20 +8,40 @@ Précision: ⭐⭐⭐⭐⭐ (vrais embeddings vocaux)
 
 Usage:
     python resemblyzer_diarization.py audio.wav transcription.json output.json --max-speakers 10
+    python resemblyzer_diarization.py audio.wav transcription.json output.json --max-speakers 4 --recluster
+    python resemblyzer_diarization.py audio.wav transcription.json output.json --embedding-mode track
+
+Les embeddings sont écrits dans <output>.features.npz (feature_sidecar.py) : --recluster ne
+refait que le clustering, sans audio ni encodeur.
+
+Mode d'embedding (--embedding-mode / AI_RESEMBLYZER_EMBEDDING_MODE) :
+    - segment : preprocess_wav + embed_utterance par segment (défaut)
+    - track : fenêtres glissantes sur toute la piste, par lots, moyennées par segment
+      (track_embeddings.py) : quelques grosses passes de l'encodeur au lieu d'une par segment
+
+Encodeur (--backend / AI_RESEMBLYZER_BACKEND) : torch (VoiceEncoder float32, défaut) ou onnx
+(voice_encoder_onnx.py : ONNX Runtime int8, threads AI_RESEMBLYZER_ONNX_THREADS).
+
+API (utilisée par extract_dialogues.py, sans sous-process ni JSON temporaire):
+    from resemblyzer_diarization import diarize
+    result = diarize(segments, audio, 16000, max_speakers=10, encoder=encoder)
 """
 
 import argparse
 import json
+import os
 import sys
 import traceback
 from pathlib import Path
-from typing import List, Dict, Tuple
+from typing import List, Dict, Optional, Tuple
 
 import numpy as np
-import soundfile as sf
-from resemblyzer import VoiceEncoder, preprocess_wav
-from sklearn.cluster import AgglomerativeClustering
-from sklearn.metrics import silhouette_score
+
+from audio_io import WHISPER_SAMPLE_RATE, audio_cache_dir, load_audio_mono
+from clustering_engine import build_tree
+from feature_sidecar import default_sidecar_path, file_sha256, sidecar_key
+from progress import get_reporter
+from stage_metrics import get_metrics
 
 
 def separate_vocals_with_spleeter(audio_path: str, output_dir: str) -> str:
@@ -35,65 +55,123 @@ def separate_vocals_with_spleeter(audio_path: str, output_dir: str) -> str:
     return audio_path
 
 
-def extract_embeddings_for_segments(
-    encoder: VoiceEncoder,
-    vocals_path: str,
-    segments: List[Dict]
+def embedding_mode() -> str:
+    """Mode d'embedding : 'segment' (embed_utterance par segment) ou 'track' (track_embeddings.py)"""
+    return os.getenv('AI_RESEMBLYZER_EMBEDDING_MODE', 'segment').lower()
+
+
+def encoder_backend() -> str:
+    """Backend de l'encodeur : 'torch' (VoiceEncoder float32) ou 'onnx' (voice_encoder_onnx.py, int8)"""
+    return os.getenv('AI_RESEMBLYZER_BACKEND', 'torch').lower()
+
+
+def load_encoder(backend: Optional[str] = None):
+    """Charger le VoiceEncoder Resemblyzer (import paresseux : torch / onnxruntime ne sont chargés qu'ici)"""
+    with get_metrics().stage('model_load'):
+        if (backend or encoder_backend()) == 'onnx':
+            from voice_encoder_onnx import load_onnx_encoder
+
+            return load_onnx_encoder()
+
+        from resemblyzer import VoiceEncoder
+
+        return VoiceEncoder(device='cpu')  # Force CPU (pas de GPU)
+
+
+def _embed_segment(encoder, wav_segment: np.ndarray, sr: int) -> np.ndarray:
+    """Embedding 256D d'un segment audio"""
+    from resemblyzer import preprocess_wav
+
+    # Convertir stereo -> mono si nécessaire
+    if len(wav_segment.shape) > 1 and wav_segment.shape[1] == 2:
+        wav_segment = wav_segment.mean(axis=1)
+
+    # Prétraiter le segment
+    wav_preprocessed = preprocess_wav(wav_segment, source_sr=sr)
+
+    # Extraire l'embedding
+    return encoder.embed_utterance(wav_preprocessed)
+
+
+def extract_embeddings_from_array(
+    encoder,
+    audio: np.ndarray,
+    sr: int,
+    segments: List[Dict],
+    mode: Optional[str] = None
 ) -> List[np.ndarray]:
     """
-    Extrait les embeddings pour chaque segment (lecture optimisée).
+    Extrait les embeddings pour chaque segment d'un audio déjà en mémoire
 
     Args:
-        encoder: Modèle Resemblyzer
-        vocals_path: Chemin du fichier audio
+        encoder: VoiceEncoder Resemblyzer
+        audio: Audio (mono de préférence, 16kHz évite le rééchantillonnage)
+        sr: Fréquence d'échantillonnage de audio
         segments: Liste des segments avec start/end
+        mode: 'segment' ou 'track' (défaut: AI_RESEMBLYZER_EMBEDDING_MODE)
 
     Returns:
         Liste des embeddings (256D) par segment
     """
-    embeddings = []
+    reporter = get_reporter()
 
-    # Obtenir les métadonnées du fichier sans le charger entièrement
-    with sf.SoundFile(vocals_path) as f:
-        sample_rate = f.samplerate
-        total_frames = len(f)
-        total_duration = total_frames / sample_rate
+    if (mode or embedding_mode()) == 'track':
+        from track_embeddings import extract_embeddings_track
 
-    for idx, segment in enumerate(segments, 1):
-        start_time = segment['start']
-        end_time = segment['end']
-
-        # Convertir temps en frames
-        start_frame = int(start_time * sample_rate)
-        end_frame = int(end_time * sample_rate)
-        num_frames = end_frame - start_frame
-
-        # Lire SEULEMENT ce segment (évite de charger tout le fichier)
-        wav_segment, sr = sf.read(
-            vocals_path,
-            start=start_frame,
-            frames=num_frames
+        embeddings = extract_embeddings_track(
+            encoder, audio, sr, segments,
+            on_progress=lambda done, total: reporter.update('diarization', done, total, unit='windows')
         )
+        print(f"Embeddings extracted: {len(embeddings)} segments (track mode)", file=sys.stderr)
+        return embeddings
 
-        # Convertir stereo -> mono si nécessaire
-        if len(wav_segment.shape) > 1 and wav_segment.shape[1] == 2:
-            wav_segment = wav_segment.mean(axis=1)
-
-        # Prétraiter le segment
-        wav_preprocessed = preprocess_wav(wav_segment, source_sr=sr)
+    embeddings = []
 
-        # Extraire l'embedding
-        embedding = encoder.embed_utterance(wav_preprocessed)
-        embeddings.append(embedding)
+    for idx, segment in enumerate(segments, 1):
+        start_frame = int(segment['start'] * sr)
+        end_frame = int(segment['end'] * sr)
+        # Vue sur le tableau (pas de copie)
+        embeddings.append(_embed_segment(encoder, audio[start_frame:end_frame], sr))
+        reporter.update('diarization', idx, len(segments), unit='segments')
 
     print(f"Embeddings extracted: {len(embeddings)} segments", file=sys.stderr)
     return embeddings
 
 
+def extract_embeddings_for_segments(
+    encoder,
+    vocals_path: str,
+    segments: List[Dict],
+    cache_dir: Optional[str] = None,
+    mode: Optional[str] = None
+) -> List[np.ndarray]:
+    """
+    Extrait les embeddings pour chaque segment d'un fichier (sans le charger en RAM).
+
+    Le fichier est converti une fois en PCM float32 mono 16kHz mappé en mémoire (downmix et
+    rééchantillonnage en flux au décodage) : chaque segment est une vue du tableau, et
+    preprocess_wav n'a plus de rééchantillonnage à faire segment par segment.
+
+    Args:
+        encoder: Modèle Resemblyzer
+        vocals_path: Chemin du fichier audio
+        segments: Liste des segments avec start/end
+        cache_dir: Cache PCM réutilisable (défaut: AI_AUDIO_CACHE_DIR)
+        mode: 'segment' ou 'track' (défaut: AI_RESEMBLYZER_EMBEDDING_MODE)
+
+    Returns:
+        Liste des embeddings (256D) par segment
+    """
+    audio, sample_rate = load_audio_mono(vocals_path, cache_dir=cache_dir or audio_cache_dir(), mmap=True,
+                                         sample_rate=WHISPER_SAMPLE_RATE)  # = resemblyzer hparams.sampling_rate
+    return extract_embeddings_from_array(encoder, audio, sample_rate, segments, mode)
+
+
 def cluster_embeddings(
     embeddings: np.ndarray,
     max_speakers: int = 10,
-    min_speakers: int = 2
+    min_speakers: int = 2,
+    count_method: Optional[str] = None
 ) -> np.ndarray:
     """
     Clusteriser les embeddings pour identifier les speakers
@@ -102,26 +180,34 @@ def cluster_embeddings(
         embeddings: (n_segments, 256) embeddings Resemblyzer
         max_speakers: Nombre max de speakers à détecter
         min_speakers: Nombre min de speakers
+        count_method: 'silhouette' (recherche sur k) ou 'eigengap' (défaut: AI_SPEAKER_COUNT_METHOD)
 
     Returns:
         labels: (n_segments,) assignations speaker
     """
+    from speaker_count import speaker_count_method, spectral_clustering
+
     n_segments = len(embeddings)
     max_k = min(max_speakers, n_segments // 2, 10)
     min_k = min(min_speakers, max_k)
 
+    # Nombre de speakers par eigengap : une seule décomposition, pas de recherche silhouette
+    if speaker_count_method(count_method) == 'eigengap':
+        labels, k, eigengap = spectral_clustering(embeddings, min_k=min_k, max_k=max_k)
+        print(f"Detected {k} speakers (eigengap={eigengap:.3f})", file=sys.stderr)
+        return labels
+
     best_score = -1
     best_labels = None
     best_k = min_k
 
+    # Clustering hiérarchique avec cosine distance : distances et arbre calculés une fois,
+    # chaque k est une coupe (mêmes labels qu'AgglomerativeClustering ; mode scalable au-delà
+    # de AI_CLUSTERING_SCALABLE_THRESHOLD segments)
+    tree = build_tree(embeddings, metric='cosine', method='average')
+
     for k in range(min_k, max_k + 1):
-        # Clustering hiérarchique avec cosine distance
-        clustering = AgglomerativeClustering(
-            n_clusters=k,
-            metric='cosine',
-            linkage='average'
-        )
-        labels = clustering.fit_predict(embeddings)
+        labels = tree.cut(k)
 
         # Vérifier distribution
         unique, counts = np.unique(labels, return_counts=True)
@@ -133,7 +219,7 @@ def cluster_embeddings(
 
         # Calculer silhouette score
         try:
-            score = silhouette_score(embeddings, labels, metric='cosine')
+            score = tree.silhouette(labels)
         except:
             score = -1
 
@@ -152,16 +238,164 @@ def cluster_embeddings(
 
     # Fallback si aucun bon clustering
     if best_labels is None:
-        clustering = AgglomerativeClustering(n_clusters=2, metric='cosine', linkage='average')
-        best_labels = clustering.fit_predict(embeddings)
-        best_k = 2
-        best_score = silhouette_score(embeddings, best_labels, metric='cosine')
+        best_k = min(2, n_segments)
+        best_labels = tree.cut(best_k)
+        best_score = tree.silhouette(best_labels) if 2 <= best_k < n_segments else -1
 
     print(f"Detected {best_k} speakers (silhouette={best_score:.3f})", file=sys.stderr)
 
     return best_labels
 
 
+def _speech_seconds(segments: List[Dict]) -> float:
+    return sum(segment['end'] - segment['start'] for segment in segments)
+
+
+def _label_segments(segments: List[Dict], embeddings: List[np.ndarray], max_speakers: int,
+                    registry=None) -> Dict:
+    """Clustering des embeddings (locuteurs connus du registre d'abord) + assignation des speakers"""
+    embeddings = np.array(embeddings)
+    with get_metrics().stage('clustering'):
+        if registry is not None and registry.usable:
+            from feature_sidecar import segments_signature
+            from speaker_registry import label_with_registry
+
+            try:
+                episode = segments_signature(segments)
+                labels = label_with_registry(embeddings, registry,
+                                             lambda idx: cluster_embeddings(embeddings[idx], max_speakers),
+                                             episode=episode)
+                registry.save(episode)
+            finally:
+                registry.close()
+        else:
+            if registry is not None:
+                registry.close()
+            labels = cluster_embeddings(embeddings, max_speakers)
+
+    for i, label in enumerate(labels):
+        segments[i]['speaker'] = f"SPEAKER_{label:02d}"
+
+    return {
+        'segments': segments,
+        'num_speakers': len(np.unique(labels)),
+        'method': 'resemblyzer',
+        'embedding_dim': 256,
+    }
+
+
+def embedding_params(mode: Optional[str] = None, backend: Optional[str] = None) -> Dict:
+    """Réglages dont dépendent les embeddings (clé du sidecar)"""
+    return {'method': 'resemblyzer', 'mode': mode or embedding_mode(), 'backend': backend or encoder_backend()}
+
+
+def _cached_embeddings(segments: List[Dict], sidecar_path: Optional[str],
+                       sidecar_key: Optional[str]) -> Optional[Tuple[List[np.ndarray], Dict]]:
+    """
+    Embeddings du sidecar s'il correspond (clé None = pas de contrôle de l'audio : --recluster)
+
+    Returns:
+        (embeddings, réglages qui les ont produits : mode, backend) ou None
+    """
+    if not sidecar_path:
+        return None
+    from feature_sidecar import load_sidecar
+
+    cached = load_sidecar(sidecar_path, segments, key=sidecar_key)
+    if cached is None or cached['params'].get('method') != 'resemblyzer':
+        return None
+    print(f"Embeddings loaded from sidecar: {len(cached['segment_indices'])} segments", file=sys.stderr)
+    return list(cached['features']), cached['params']
+
+
+def _save_embeddings(segments: List[Dict], embeddings: List[np.ndarray], sidecar_path: Optional[str],
+                     sidecar_key: Optional[str], mode: Optional[str] = None):
+    if sidecar_path and sidecar_key and embeddings:
+        from feature_sidecar import save_sidecar
+
+        save_sidecar(sidecar_path, sidecar_key, segments, np.array(embeddings), list(range(len(embeddings))),
+                     params=embedding_params(mode))
+
+
+def _open_registry(registry_dir: Optional[str], mode: Optional[str]):
+    if not registry_dir:
+        return None
+    from speaker_registry import SpeakerRegistry
+
+    return SpeakerRegistry.open(registry_dir, embedding_params(mode))
+
+
+def diarize(
+    segments: List[Dict],
+    audio: np.ndarray,
+    sr: int,
+    max_speakers: int = 10,
+    encoder=None,
+    sidecar_path: Optional[str] = None,
+    sidecar_key: Optional[str] = None,
+    mode: Optional[str] = None,
+    registry_dir: Optional[str] = None
+) -> Dict:
+    """
+    Diarization Resemblyzer en mémoire (API utilisée directement par extract_dialogues.py)
+
+    Args:
+        segments: Segments Whisper (start/end), complétés en place avec 'speaker'
+        audio: Audio mono (vocals si séparation active)
+        sr: Fréquence d'échantillonnage de audio
+        max_speakers: Nombre max de speakers
+        encoder: VoiceEncoder déjà chargé (worker persistant), sinon chargé ici
+        sidecar_path: Sidecar des embeddings (feature_sidecar.py) : relu s'il correspond à
+            sidecar_key (ni encodeur ni extraction), sinon écrit après l'extraction
+        sidecar_key: Clé attendue du sidecar (feature_sidecar.sidecar_key)
+        mode: Mode d'embedding 'segment' ou 'track' (défaut: AI_RESEMBLYZER_EMBEDDING_MODE)
+        registry_dir: Registre des locuteurs du projet / de la série (speaker_registry.py)
+
+    Returns:
+        {'segments': [...], 'num_speakers': n, 'method': 'resemblyzer', 'embedding_dim': 256}
+    """
+    if len(segments) == 0:
+        raise ValueError("No segments in transcription")
+
+    cached = _cached_embeddings(segments, sidecar_path, sidecar_key) if sidecar_key else None
+    embeddings = cached[0] if cached is not None else None
+    if embeddings is None:
+        if encoder is None:
+            encoder = load_encoder()
+
+        with get_metrics().stage('feature_extraction', audio_seconds=_speech_seconds(segments)):
+            embeddings = extract_embeddings_from_array(encoder, audio, sr, segments, mode)
+        _save_embeddings(segments, embeddings, sidecar_path, sidecar_key, mode)
+    return _label_segments(segments, embeddings, max_speakers, _open_registry(registry_dir, mode))
+
+
+def diarize_file(
+    segments: List[Dict],
+    audio_path: str,
+    max_speakers: int = 10,
+    encoder=None,
+    cache_dir: Optional[str] = None,
+    sidecar_path: Optional[str] = None,
+    sidecar_key: Optional[str] = None,
+    mode: Optional[str] = None,
+    registry_dir: Optional[str] = None
+) -> Dict:
+    """Comme diarize(), mais lit chaque segment dans le fichier (sans charger tout l'audio)"""
+    if len(segments) == 0:
+        raise ValueError("No segments in transcription")
+
+    cached = _cached_embeddings(segments, sidecar_path, sidecar_key) if sidecar_key else None
+    embeddings = cached[0] if cached is not None else None
+    if embeddings is None:
+        if encoder is None:
+            encoder = load_encoder()
+
+        with get_metrics().stage('feature_extraction', audio_seconds=_speech_seconds(segments)):
+            embeddings = extract_embeddings_for_segments(encoder, audio_path, segments, cache_dir, mode)
+        _save_embeddings(segments, embeddings, sidecar_path, sidecar_key, mode)
+    return _label_segments(segments, embeddings, max_speakers, _open_registry(registry_dir, mode))
+
+
 def main():
     parser = argparse.ArgumentParser(description='Diarization avec Resemblyzer (embeddings vocaux)')
     parser.add_argument('audio_path', help='Chemin vers le fichier audio (MP4/WAV)')
@@ -169,18 +403,51 @@ def main():
     parser.add_argument('output_json', help='Chemin vers le fichier JSON de sortie')
     parser.add_argument('--max-speakers', type=int, default=10, help='Nombre max de speakers')
     parser.add_argument('--skip-spleeter', action='store_true', help='Skip séparation Spleeter (si déjà fait)')
+    parser.add_argument('--embedding-mode', choices=['segment', 'track'], default=None,
+                        help="Embeddings par segment ou fenêtres sur toute la piste (défaut: $AI_RESEMBLYZER_EMBEDDING_MODE ou 'segment')")
+    parser.add_argument('--backend', choices=['torch', 'onnx'], default=None,
+                        help="Encodeur torch float32 ou ONNX int8 (défaut: $AI_RESEMBLYZER_BACKEND ou 'torch')")
+    parser.add_argument('--audio-cache-dir', default=None,
+                        help='Cache du PCM float32 mono mappé en mémoire (défaut: $AI_AUDIO_CACHE_DIR)')
+    parser.add_argument('--features-sidecar', default=None,
+                        help="Sidecar des embeddings (défaut: <output_json sans .json>.features.npz)")
+    parser.add_argument('--no-sidecar', action='store_true', help="Ne pas écrire le sidecar des embeddings")
+    parser.add_argument('--recluster', action='store_true',
+                        help="Relancer seulement le clustering depuis le sidecar (ni audio ni encodeur)")
+    parser.add_argument('--speaker-registry', default=None,
+                        help="Registre des locuteurs du projet / de la série (dossier, speaker_registry.py)")
 
     args = parser.parse_args()
 
+    if args.backend:
+        os.environ['AI_RESEMBLYZER_BACKEND'] = args.backend
+
     try:
         # 1. Charger transcription Whisper
         with open(args.transcription_json, 'r', encoding='utf-8') as f:
             transcription = json.load(f)
 
         segments = transcription.get('segments', [])
-
-        if len(segments) == 0:
-            raise ValueError("No segments in transcription")
+        sidecar_path = args.features_sidecar or default_sidecar_path(args.output_json)
+
+        if args.recluster:
+            # Clustering seul depuis le sidecar (autre --max-speakers)
+            cached = _cached_embeddings(segments, sidecar_path, None)
+            if cached is None:
+                raise ValueError(f"No valid Resemblyzer sidecar for this transcription: {sidecar_path}")
+            embeddings, params = cached
+            # Registre ouvert avec les réglages du sidecar (mode, backend), pas ceux de la CLI :
+            # des embeddings 'track' ne doivent jamais être comparés à un registre 'segment'
+            registry = None
+            if args.speaker_registry:
+                from speaker_registry import SpeakerRegistry
+
+                registry = SpeakerRegistry.open(args.speaker_registry, params)
+            output = _label_segments(segments, embeddings, args.max_speakers, registry)
+            with open(args.output_json, 'w', encoding='utf-8') as f:
+                json.dump(output, f, ensure_ascii=False, indent=2)
+            print(f"SUCCESS - Reclustering completed: {output['num_speakers']} speakers detected", file=sys.stderr)
+            return
 
         # 2. Séparation vocals (Spleeter) - DÉSACTIVÉ
         vocals_path = args.audio_path
@@ -191,38 +458,17 @@ def main():
 
             vocals_path = separate_vocals_with_spleeter(args.audio_path, str(output_dir))
 
-        # 3. Initialiser encoder Resemblyzer
-        encoder = VoiceEncoder(device='cpu')  # Force CPU (pas de GPU)
-
-        # 4. Extraire embeddings pour chaque segment
-        embeddings = extract_embeddings_for_segments(
-            encoder,
-            vocals_path,
-            segments
-        )
-
-        # Convertir liste en array numpy
-        embeddings_array = np.array(embeddings)
-
-        # 5. Clustering des embeddings
-        labels = cluster_embeddings(embeddings_array, args.max_speakers)
-
-        # 6. Assigner speakers aux segments
-        for i, label in enumerate(labels):
-            segments[i]['speaker'] = f"SPEAKER_{label:02d}"
+        # 3-6. Embeddings Resemblyzer (ou sidecar d'un lancement précédent) + clustering + speakers
+        key = sidecar_key(file_sha256(vocals_path), segments, **embedding_params(args.embedding_mode))
+        output = diarize_file(segments, vocals_path, args.max_speakers, cache_dir=args.audio_cache_dir,
+                              sidecar_path=None if args.no_sidecar else sidecar_path, sidecar_key=key,
+                              mode=args.embedding_mode, registry_dir=args.speaker_registry)
 
         # 7. Sauvegarder résultat
-        output = {
-            'segments': segments,
-            'num_speakers': len(np.unique(labels)),
-            'method': 'resemblyzer',
-            'embedding_dim': 256,
-        }
-
         with open(args.output_json, 'w', encoding='utf-8') as f:
             json.dump(output, f, ensure_ascii=False, indent=2)
 
-        print(f"SUCCESS - Diarization completed: {len(np.unique(labels))} speakers detected", file=sys.stderr)
+        print(f"SUCCESS - Diarization completed: {output['num_speakers']} speakers detected", file=sys.stderr)
 
     except Exception as e:
         print(f"ERROR: {e}", file=sys.stderr)
@@ -6,19 +6,10 @@ Optimisé pour serveurs 4GB+ RAM
 """
 
 import argparse
-import gc
 import os
 import sys
-from pathlib import Path
 
-try:
-    import torch
-    import numpy as np
-    import soundfile as sf
-except ImportError as e:
-    print(f"ERROR: Missing dependencies: {e}", file=sys.stderr)
-    print("Install: pip install torch soundfile numpy", file=sys.stderr)
-    sys.exit(1)
+from separate_stems import separate_stems
 
 
 def separate_instrumental(
@@ -28,6 +19,7 @@ def separate_instrumental(
 ) -> bool:
     """
     Sépare la partie instrumentale (drums + bass + other) d'un fichier audio
+    (Délègue à separate_stems : utiliser --vocals là-bas pour obtenir les deux pistes en une passe)
 
     Args:
         audio_path: Chemin vers le fichier audio source
@@ -37,119 +29,7 @@ def separate_instrumental(
     Returns:
         True si succès, False sinon
     """
-    try:
-        print(f"Demucs instrumental separation starting...", file=sys.stderr)
-        print(f"  Model: {model_name}", file=sys.stderr)
-        print(f"  Input: {audio_path}", file=sys.stderr)
-        print(f"  Output: {output_path}", file=sys.stderr)
-
-        # Import Demucs
-        from demucs.pretrained import get_model
-        from demucs.apply import apply_model
-
-        # Charger le modèle
-        print(f"  Loading Demucs model '{model_name}'...", file=sys.stderr)
-        gc.collect()
-        model = get_model(model_name)
-        model.eval()
-        print(f"  ✓ Model loaded successfully", file=sys.stderr)
-
-        # Charger l'audio
-        print("  Loading audio file...", file=sys.stderr)
-        waveform, sample_rate = sf.read(audio_path, always_2d=True)
-        waveform = torch.from_numpy(waveform.T).float()
-
-        audio_duration = waveform.shape[1] / sample_rate
-        print(f"  ✓ Audio loaded: {sample_rate}Hz, {audio_duration:.1f}s duration", file=sys.stderr)
-
-        # Demucs nécessite stereo
-        if waveform.shape[0] == 1:
-            print("  Converting mono to stereo...", file=sys.stderr)
-            waveform = waveform.repeat(2, 1)
-
-        # Resample si nécessaire (Demucs utilise 44.1kHz)
-        if sample_rate != 44100:
-            print(f"  Resampling {sample_rate}Hz -> 44100Hz...", file=sys.stderr)
-            import librosa
-            waveform_np = waveform.cpu().numpy()
-            waveform_resampled = np.array([
-                librosa.resample(waveform_np[0], orig_sr=sample_rate, target_sr=44100),
-                librosa.resample(waveform_np[1], orig_sr=sample_rate, target_sr=44100)
-            ])
-            waveform = torch.from_numpy(waveform_resampled).float()
-            sample_rate = 44100
-            print(f"  ✓ Resampling done", file=sys.stderr)
-
-        # Normaliser
-        print("  Normalizing audio...", file=sys.stderr)
-        waveform = waveform / waveform.abs().max()
-
-        # Appliquer le modèle (séparation)
-        print("  🎵 Separating INSTRUMENTAL (drums + bass + other, NO vocals)...", file=sys.stderr)
-        print(f"  Processing {audio_duration:.1f}s of audio...", file=sys.stderr)
-        with torch.no_grad():
-            sources = apply_model(
-                model,
-                waveform.unsqueeze(0),
-                device='cpu',
-                shifts=0,
-                split=True,
-                overlap=0.25,
-                num_workers=0
-            )[0]
-
-        print(f"  ✓ Instrumental separation completed!", file=sys.stderr)
-
-        # Libérer mémoire
-        del model
-        del waveform
-        gc.collect()
-        print("  ✓ Memory cleanup done", file=sys.stderr)
-
-        # Demucs htdemucs retourne: [drums, bass, other, vocals]
-        # On veut TOUT SAUF vocals = drums + bass + other
-        print("  Extracting instrumental tracks (drums + bass + other)...", file=sys.stderr)
-
-        try:
-            if sources.shape[0] == 4:
-                # Mixer drums (0) + bass (1) + other (2)
-                instrumental = sources[0] + sources[1] + sources[2]
-            else:
-                # Fallback: prendre tout sauf le dernier (vocals)
-                instrumental = sources[:-1].sum(dim=0)
-
-            del sources
-            gc.collect()
-        except Exception as e:
-            print(f"  ERROR: sources not defined or failed: {e}", file=sys.stderr)
-            return False
-
-        # Convertir stereo en mono (optionnel, économise espace)
-        if instrumental.shape[0] == 2:
-            print("  Converting stereo instrumental to mono...", file=sys.stderr)
-            instrumental = instrumental.mean(dim=0, keepdim=True)
-
-        # Sauvegarder
-        print(f"  Saving extracted instrumental to {output_path}...", file=sys.stderr)
-        instrumental_np = instrumental.cpu().numpy().T
-
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        sf.write(output_path, instrumental_np, sample_rate)
-
-        del instrumental
-        del instrumental_np
-        gc.collect()
-
-        file_size = os.path.getsize(output_path) / (1024 * 1024)
-        print(f"SUCCESS - Instrumental extracted and saved: {output_path} ({file_size:.1f}MB)", file=sys.stderr)
-
-        return True
-
-    except Exception as e:
-        print(f"ERROR - Instrumental separation failed: {e}", file=sys.stderr)
-        import traceback
-        traceback.print_exc(file=sys.stderr)
-        return False
+    return separate_stems(audio_path, instrumental_path=output_path, model_name=model_name)
 
 
 def main():
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Séparation Demucs en UNE seule passe : vocals + instrumental (+ stems individuels)
+Remplace les deux passes séparées de separate_vocals.py et separate_instrumental.py
+
+Usage:
+    python separate_stems.py input.wav --vocals vocals.wav --instrumental instrumental.wav [--model htdemucs]
+    python separate_stems.py input.wav --output-dir storage/app/stems/42 --source video.mp4 [--individual-stems]
+
+Avec --output-dir, les fichiers vocals.wav / instrumental.wav sont écrits dans le dossier
+avec un manifeste stems.json (source + modèle) : ExtractDialogues et ExtractInstrumental
+réutilisent ces stems au lieu de relancer une séparation complète.
+"""
+
+import argparse
+import gc
+import json
+import os
+import sys
+import warnings
+from typing import Dict, Optional
+
+from progress import get_reporter, track_tqdm
+
+# Supprimer les warnings
+warnings.filterwarnings("ignore")
+
+MANIFEST_NAME = 'stems.json'
+
+
+def _load_waveform(audio_path: str):
+    """Charger l'audio en tensor stéréo 44.1kHz normalisé (format attendu par Demucs)"""
+    import numpy as np
+    import soundfile as sf
+    import torch
+
+    waveform, sample_rate = sf.read(audio_path, always_2d=True)
+    # soundfile retourne (samples, channels), torch veut (channels, samples)
+    waveform = torch.from_numpy(waveform.T).float()
+
+    # Demucs nécessite stereo (2 channels)
+    if waveform.shape[0] == 1:
+        waveform = waveform.repeat(2, 1)
+
+    # Resample si nécessaire (Demucs utilise 44.1kHz)
+    if sample_rate != 44100:
+        # Utiliser librosa au lieu de torchaudio.transforms (évite TorchCodec)
+        import librosa
+        print(f"  Resampling {sample_rate}Hz -> 44100Hz...", file=sys.stderr)
+        waveform_np = waveform.cpu().numpy()
+        waveform_resampled = np.array([
+            librosa.resample(waveform_np[0], orig_sr=sample_rate, target_sr=44100),
+            librosa.resample(waveform_np[1], orig_sr=sample_rate, target_sr=44100)
+        ])
+        waveform = torch.from_numpy(waveform_resampled).float()
+        sample_rate = 44100
+
+    # Normaliser
+    waveform = waveform / waveform.abs().max()
+
+    return waveform, sample_rate
+
+
+def _write_mono(path: str, stem, sample_rate: int, normalize: bool):
+    """Sauvegarder un stem en WAV mono (même post-traitement que les scripts historiques)"""
+    import soundfile as sf
+
+    if stem.shape[0] == 2:
+        stem = stem.mean(dim=0, keepdim=True)
+    if normalize:
+        stem = stem / stem.abs().max()
+
+    output_dir = os.path.dirname(path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    # (channels, samples) -> (samples, channels) pour soundfile
+    sf.write(path, stem.cpu().numpy().T, sample_rate)
+
+
+def separate_stems(
+    audio_path: str,
+    vocals_path: Optional[str] = None,
+    instrumental_path: Optional[str] = None,
+    stems_dir: Optional[str] = None,
+    model_name: str = 'htdemucs',
+    model=None
+) -> bool:
+    """
+    Sépare l'audio avec Demucs en un seul apply_model et écrit les stems demandés
+
+    Args:
+        audio_path: Chemin vers le fichier audio source
+        vocals_path: Sortie voix (mono normalisé, pour Whisper/diarization), None = pas écrit
+        instrumental_path: Sortie instrumental (drums + bass + other, mono), None = pas écrit
+        stems_dir: Dossier pour écrire chaque stem individuel (stéréo), None = pas écrit
+        model_name: Modèle Demucs (htdemucs, htdemucs_6s, htdemucs_ft, mdx_extra)
+        model: Modèle Demucs déjà chargé (worker persistant), sinon chargé ici
+
+    Returns:
+        True si succès, False sinon
+    """
+    try:
+        import soundfile as sf
+        import torch
+        from demucs.apply import apply_model
+        from demucs.pretrained import get_model
+
+        print(f"Demucs separation starting (single pass)...", file=sys.stderr)
+        print(f"  Model: {model_name}", file=sys.stderr)
+        print(f"  Input: {audio_path}", file=sys.stderr)
+
+        # Charger le modèle (sauf s'il est fourni par le pool du worker)
+        owns_model = model is None
+        if owns_model:
+            gc.collect()
+            model = get_model(model_name)
+            model.eval()
+
+        waveform, sample_rate = _load_waveform(audio_path)
+        audio_duration = waveform.shape[1] / sample_rate
+
+        print(f"  Separating {audio_duration:.1f}s of audio...", file=sys.stderr)
+        # Progression chunk par chunk (AI_PROGRESS_FD) via la barre tqdm interne d'apply_model
+        with torch.no_grad(), track_tqdm('demucs.apply', 'separation'):
+            # shifts=0 : pas d'ensembling (RAM + temps), split=True : traitement par chunks
+            sources = apply_model(
+                model,
+                waveform.unsqueeze(0),
+                device='cpu',
+                shifts=0,
+                split=True,
+                overlap=0.25,
+                progress=get_reporter().enabled,
+                num_workers=0  # Pas de multiprocessing pour économiser RAM
+            )[0]
+
+        # L'ordre des sources dépend du modèle : htdemucs = [drums, bass, other, vocals],
+        # htdemucs_6s = [drums, bass, other, vocals, guitar, piano]
+        source_names = list(model.sources)
+
+        if owns_model:
+            del model
+        del waveform
+        gc.collect()
+
+        vocals_index = source_names.index('vocals')
+
+        if stems_dir:
+            os.makedirs(stems_dir, exist_ok=True)
+            for index, name in enumerate(source_names):
+                stem_path = os.path.join(stems_dir, f"{name}.wav")
+                sf.write(stem_path, sources[index].cpu().numpy().T, sample_rate)
+                print(f"  ✓ Stem '{name}' saved: {stem_path}", file=sys.stderr)
+
+        if instrumental_path:
+            # TOUT SAUF vocals = drums + bass + other (+ guitar + piano pour 6s)
+            instrumental = sum(sources[i] for i in range(len(source_names)) if i != vocals_index)
+            _write_mono(instrumental_path, instrumental, sample_rate, normalize=False)
+            del instrumental
+            size_mb = os.path.getsize(instrumental_path) / (1024 * 1024)
+            print(f"SUCCESS - Instrumental extracted: {instrumental_path} ({size_mb:.1f}MB)", file=sys.stderr)
+
+        if vocals_path:
+            vocals = sources[vocals_index]
+            del sources
+            gc.collect()
+            _write_mono(vocals_path, vocals, sample_rate, normalize=True)
+            del vocals
+            size_mb = os.path.getsize(vocals_path) / (1024 * 1024)
+            print(f"SUCCESS - Vocals extracted: {vocals_path} ({size_mb:.1f}MB)", file=sys.stderr)
+        else:
+            del sources
+
+        gc.collect()
+        return True
+
+    except Exception as e:
+        print(f"ERROR - Demucs separation failed: {e}", file=sys.stderr)
+        import traceback
+        traceback.print_exc(file=sys.stderr)
+        return False
+
+
+def _source_signature(source_path: str) -> Dict:
+    stat = os.stat(source_path)
+    return {
+        'source': os.path.realpath(source_path),
+        'source_size': stat.st_size,
+        'source_mtime': int(stat.st_mtime),
+    }
+
+
+def find_reusable_stems(output_dir: str, source_path: str, model_name: str) -> Optional[Dict[str, str]]:
+    """
+    Retrouver des stems déjà séparés pour cette source et ce modèle
+
+    Args:
+        output_dir: Dossier des stems du projet
+        source_path: Vidéo (ou audio) d'origine
+        model_name: Modèle Demucs attendu
+
+    Returns:
+        {'vocals': chemin, 'instrumental': chemin, ...} ou None si absent/périmé
+    """
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path) or not os.path.exists(source_path):
+        return None
+
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    signature = _source_signature(source_path)
+    if manifest.get('model') != model_name:
+        return None
+    if any(manifest.get(key) != value for key, value in signature.items()):
+        return None
+
+    stems = {name: os.path.join(output_dir, filename) for name, filename in manifest.get('stems', {}).items()}
+    if not all(os.path.exists(path) for path in stems.values()):
+        return None
+
+    return stems
+
+
+def separate_to_directory(
+    audio_path: str,
+    output_dir: str,
+    source_path: str,
+    model_name: str = 'htdemucs',
+    individual_stems: bool = False,
+    model=None
+) -> Optional[Dict[str, str]]:
+    """
+    Séparer vocals + instrumental dans le dossier partagé du projet (avec manifeste)
+
+    Returns:
+        {'vocals': chemin, 'instrumental': chemin, ...} ou None en cas d'échec
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    # Manifeste invalidé AVANT d'écrire : un échec ne laisse pas de stems incohérents
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if os.path.exists(manifest_path):
+        os.unlink(manifest_path)
+
+    vocals_path = os.path.join(output_dir, 'vocals.wav')
+    instrumental_path = os.path.join(output_dir, 'instrumental.wav')
+    stems_dir = os.path.join(output_dir, 'individual') if individual_stems else None
+
+    if not separate_stems(audio_path, vocals_path, instrumental_path, stems_dir, model_name, model=model):
+        return None
+
+    stems = {'vocals': 'vocals.wav', 'instrumental': 'instrumental.wav'}
+    if stems_dir:
+        for filename in sorted(os.listdir(stems_dir)):
+            stems[os.path.splitext(filename)[0]] = os.path.join('individual', filename)
+
+    manifest = dict(_source_signature(source_path), model=model_name, stems=stems)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    return {name: os.path.join(output_dir, filename) for name, filename in stems.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Séparation Demucs en une passe (vocals + instrumental)")
+    parser.add_argument('audio_path', help="Fichier audio source (WAV)")
+    parser.add_argument('--vocals', help="Sortie voix (WAV mono)")
+    parser.add_argument('--instrumental', help="Sortie instrumental drums+bass+other (WAV mono)")
+    parser.add_argument('--stems-dir', help="Dossier pour chaque stem individuel (WAV stéréo)")
+    parser.add_argument('--output-dir', help="Dossier partagé du projet (vocals.wav + instrumental.wav + stems.json)")
+    parser.add_argument('--source', help="Vidéo d'origine (signature du manifeste, avec --output-dir)")
+    parser.add_argument('--individual-stems', action='store_true',
+                        help="Avec --output-dir : écrire aussi chaque stem individuel")
+    parser.add_argument('--model', default='htdemucs',
+                        choices=["htdemucs", "htdemucs_6s", "htdemucs_ft", "mdx_extra"],
+                        help="Modèle Demucs (défaut: htdemucs)")
+
+    args = parser.parse_args()
+
+    if not os.path.exists(args.audio_path):
+        print(f"❌ Erreur: Fichier source introuvable: {args.audio_path}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.output_dir:
+        stems = separate_to_directory(
+            args.audio_path, args.output_dir, args.source or args.audio_path,
+            args.model, args.individual_stems
+        )
+        sys.exit(0 if stems else 1)
+
+    if not (args.vocals or args.instrumental or args.stems_dir):
+        parser.error("Au moins une sortie requise (--vocals, --instrumental, --stems-dir ou --output-dir)")
+
+    success = separate_stems(args.audio_path, args.vocals, args.instrumental, args.stems_dir, args.model)
+    sys.exit(0 if success else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,18 +4,86 @@ Diarization ultra-light avec clustering MFCC
 Pour serveurs 2GB RAM - pas de deep learning
 
 Usage:
-    python simple_diarization.py <audio_path> <transcription_json> <output_json> [--max-speakers 10]
+    python simple_diarization.py <audio_path> <transcription_json> <output_json> [--max-speakers 10] [--verbose]
+                                 [--feature-engine segment|frames] [--workers N] [--audio-cache-dir DIR]
+                                 [--features-sidecar out.features.npz] [--no-sidecar] [--recluster]
+                                 [--clustering hierarchical|online] [--speaker-registry DIR]
+
+Moteurs de features (--feature-engine / AI_MFCC_FEATURE_ENGINE) :
+    - segment : pile librosa complète sur chaque segment (défaut)
+    - frames : features calculées une fois par zone continue puis agrégées par segment
+      (frame_features.py), pour les longs métrages à milliers de répliques
+
+Clustering des locuteurs (--clustering / AI_MFCC_CLUSTERING) :
+    - hierarchical : dendrogramme, nombre de locuteurs choisi par silhouette (défaut)
+    - online : assignation séquentielle avec contrainte de tessiture (online_clustering.py),
+      chaque segment reçoit son locuteur dès son arrivée, O(locuteurs) par segment
+
+--workers N / AI_MFCC_WORKERS : moteur 'segment' réparti sur N process (parallel_features.py),
+audio partagé sans copie par process ; repli séquentiel si la RAM ne suffit pas.
+
+L'audio est chargé en float32 mono par blocs (audio_io.load_audio_mono) : mappé sur disque
+au-delà de 256MB, et réutilisé sans décodage avec --audio-cache-dir / AI_AUDIO_CACHE_DIR
+(le memmap du cache est aussi rouvert tel quel par les process de --workers).
+
+Les logs détaillés par segment du clustering (similarités, scores par k) ne sont écrits
+qu'avec AI_DIARIZATION_VERBOSE=true ou --verbose : sur un long métrage ils coûtent du temps
+et noient le log Laravel.
+
+Registre des locuteurs (--speaker-registry DIR, speaker_registry.py) : les segments sont d'abord
+attribués aux locuteurs connus du projet / de la série, seul le reste est clusterisé, et les
+identifiants SPEAKER_<id> restent les mêmes d'un épisode à l'autre.
+
+Sidecar des features (feature_sidecar.py) : les features 112D et voice_info sont écrits dans
+<output>.features.npz ; une relance sur le même audio et la même transcription les relit, et
+--recluster ne refait que le clustering (autre --max-speakers) sans même relire l'audio.
+
+API (utilisée par extract_dialogues.py, sans sous-process ni JSON temporaire):
+    from simple_diarization import diarize
+    result = diarize(segments, audio, 16000, max_speakers=10, language='fr')
 """
 
 import argparse
 import json
+import os
 import sys
 import numpy as np
-import soundfile as sf
 import librosa
 from sklearn.cluster import KMeans
 from typing import List, Dict, Tuple
 
+from audio_io import audio_cache_dir, load_audio_mono
+from progress import get_reporter
+from stage_metrics import get_metrics
+
+
+def diarization_verbose() -> bool:
+    """Logs détaillés par segment (AI_DIARIZATION_VERBOSE=true)"""
+    return os.getenv('AI_DIARIZATION_VERBOSE', 'false').lower() == 'true'
+
+
+def pitch_method() -> str:
+    """Estimateur de F0 : 'piptrack' (historique, exact) ou 'yin' (hop 20ms, plus rapide)"""
+    return os.getenv('AI_MFCC_PITCH_METHOD', 'piptrack').lower()
+
+
+def feature_workers() -> int:
+    """Process d'extraction des features (moteur 'segment'), 1 = séquentiel"""
+    try:
+        return max(1, int(os.getenv('AI_MFCC_WORKERS', '1')))
+    except ValueError:
+        return 1
+
+
+def feature_engine() -> str:
+    """Moteur de features : 'segment' (librosa par segment) ou 'frames' (frame_features.py)"""
+    return os.getenv('AI_MFCC_FEATURE_ENGINE', 'segment').lower()
+
+
+def clustering_mode() -> str:
+    """Clustering des locuteurs : 'hierarchical' (choix du k par silhouette) ou 'online' (séquentiel)"""
+    return os.getenv('AI_MFCC_CLUSTERING', 'hierarchical').lower()
+
 
 def classify_voice_type(pitch_mean: float, pitch_median: float, formants: np.ndarray,
                         spec_cent_mean: float, spec_contrast_mean: np.ndarray,
@@ -189,6 +257,68 @@ def detect_gender(pitch_mean: float, pitch_median: float, formants: np.ndarray,
     return gender, confidence
 
 
+# Paramètres STFT par défaut de librosa (mfcc, piptrack, spectral_*, chroma_stft)
+STFT_N_FFT = 2048
+# Hop des formants : défaut de librosa.stft (analyse plus grossière que le reste)
+FORMANT_HOP_LENGTH = 512
+
+
+# Mode YIN : hop = YIN_HOP_FACTOR x hop des features (20ms à 5ms), plage de F0 de la voix parlée
+YIN_HOP_FACTOR = 4
+YIN_FRAME_LENGTH = 1024
+YIN_FMIN = 60.0
+YIN_FMAX = 500.0
+# Frames YIN plus faibles que (max du segment - YIN_SILENCE_DB) considérées non voisées
+YIN_SILENCE_DB = 30.0
+
+
+def dominant_pitch(pitches: np.ndarray, magnitudes: np.ndarray) -> np.ndarray:
+    """Pitch par frame (sortie de piptrack) : fréquence du bin de plus forte amplitude, 0 = non voisé"""
+    return pitches[magnitudes.argmax(axis=0), np.arange(pitches.shape[1])]
+
+
+def yin_pitch(segment: np.ndarray, sr: int, hop_length: int) -> np.ndarray:
+    """
+    F0 par frame avec YIN (hop_length x YIN_HOP_FACTOR), 0 pour les frames silencieuses
+
+    Mode débit (AI_MFCC_PITCH_METHOD=yin) : vraie fondamentale dans [YIN_FMIN, YIN_FMAX],
+    valeurs différentes de piptrack (qui ne descend pas sous 150 Hz).
+    """
+    yin_hop = hop_length * YIN_HOP_FACTOR
+    f0 = librosa.yin(segment, fmin=YIN_FMIN, fmax=YIN_FMAX, sr=sr,
+                     frame_length=YIN_FRAME_LENGTH, hop_length=yin_hop)
+    rms = librosa.feature.rms(y=segment, frame_length=YIN_FRAME_LENGTH, hop_length=yin_hop)[0][:len(f0)]
+    floor = max(float(np.max(rms)) * 10 ** (-YIN_SILENCE_DB / 20), 1e-4) if len(rms) else 1e-4
+    return np.where(rms >= floor, f0, 0.0)
+
+
+def pitch_statistics(pitch_track: np.ndarray) -> Tuple[float, float, float, float, float, float]:
+    """(mean, std, median, min, max, range) des frames voisées (pitch > 0), zéros si aucune"""
+    voiced = pitch_track[pitch_track > 0]
+    if len(voiced) == 0:
+        return 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
+    pitch_min = float(np.min(voiced))
+    pitch_max = float(np.max(voiced))
+    return (float(np.mean(voiced)), float(np.std(voiced)), float(np.median(voiced)),
+            pitch_min, pitch_max, pitch_max - pitch_min)
+
+
+def voiced_tuning(pitch_track: np.ndarray) -> float:
+    """Accordage (fraction de demi-ton) à partir d'un suivi de F0, pour chroma_stft(tuning=...)"""
+    voiced = pitch_track[pitch_track > 0]
+    return float(librosa.pitch_tuning(voiced)) if len(voiced) else 0.0
+
+
+def segment_spectrogram(segment: np.ndarray, hop_length: int, n_fft: int = STFT_N_FFT) -> np.ndarray:
+    """
+    Spectrogramme d'amplitude |STFT| avec les paramètres par défaut des fonctions librosa.feature
+
+    Calculé une fois par segment puis passé en S= : mêmes valeurs qu'en laissant chaque
+    fonction refaire sa propre STFT (fenêtre hann, center=True, pad_mode='constant').
+    """
+    return np.abs(librosa.stft(segment, n_fft=n_fft, hop_length=hop_length))
+
+
 def extract_voice_features(audio_data: np.ndarray, sr: int, start: float, end: float):
     """
     Extraire des caractéristiques vocales PRÉCISES pour distinguer les locuteurs
@@ -215,8 +345,14 @@ def extract_voice_features(audio_data: np.ndarray, sr: int, start: float, end: f
     # 🔧 Hop length court pour analyse fine (5ms au lieu de 10ms)
     hop_length = int(sr * 0.005)
 
+    # Une seule STFT (hop 5ms) partagée par toutes les features spectrales :
+    # amplitude pour piptrack / spectral_*, puissance pour mel (MFCC) et chroma
+    magnitude = segment_spectrogram(segment, hop_length)
+    power = magnitude ** 2
+
     # 1. MFCC (13 coefficients) avec statistiques avancées
-    mfcc = librosa.feature.mfcc(y=segment, sr=sr, n_mfcc=13, hop_length=hop_length)
+    mel_db = librosa.power_to_db(librosa.feature.melspectrogram(S=power, sr=sr))
+    mfcc = librosa.feature.mfcc(S=mel_db, n_mfcc=13)
     mfcc_delta = librosa.feature.delta(mfcc)
     mfcc_delta2 = librosa.feature.delta(mfcc, order=2)
 
@@ -228,29 +364,23 @@ def extract_voice_features(audio_data: np.ndarray, sr: int, start: float, end: f
     delta2_mean = np.mean(mfcc_delta2, axis=1)
 
     # 2. PITCH (F0) - SUPER IMPORTANT pour différencier les voix
-    pitches, magnitudes = librosa.piptrack(y=segment, sr=sr, hop_length=hop_length)
-    pitch_values = []
-    for t in range(pitches.shape[1]):
-        index = magnitudes[:, t].argmax()
-        pitch = pitches[index, t]
-        if pitch > 0:  # Ignorer silences
-            pitch_values.append(pitch)
-
-    if len(pitch_values) > 0:
-        pitch_mean = float(np.mean(pitch_values))
-        pitch_std = float(np.std(pitch_values))
-        pitch_median = float(np.median(pitch_values))
-        pitch_min = float(np.min(pitch_values))
-        pitch_max = float(np.max(pitch_values))
-        pitch_range = pitch_max - pitch_min
+    if pitch_method() == 'yin':
+        # Mode débit : YIN sur un hop 4x plus grossier, accordage chroma dérivé de la F0
+        pitch_track = yin_pitch(segment, sr, hop_length)
+        chroma_tuning = voiced_tuning(pitch_track)
     else:
-        pitch_mean = pitch_std = pitch_median = pitch_min = pitch_max = pitch_range = 0.0
+        # Bin dominant de chaque frame (vectorisé), silences (pitch 0) ignorés par pitch_statistics
+        pitches, magnitudes = librosa.piptrack(S=magnitude, sr=sr)
+        pitch_track = dominant_pitch(pitches, magnitudes)
+        chroma_tuning = None  # chroma_stft l'estime lui-même (parité)
+
+    pitch_mean, pitch_std, pitch_median, pitch_min, pitch_max, pitch_range = pitch_statistics(pitch_track)
 
     # 3. SPECTRAL FEATURES - texture et timbre de la voix
-    spectral_centroid = librosa.feature.spectral_centroid(y=segment, sr=sr, hop_length=hop_length)
-    spectral_rolloff = librosa.feature.spectral_rolloff(y=segment, sr=sr, hop_length=hop_length)
-    spectral_bandwidth = librosa.feature.spectral_bandwidth(y=segment, sr=sr, hop_length=hop_length)
-    spectral_contrast = librosa.feature.spectral_contrast(y=segment, sr=sr, hop_length=hop_length)
+    spectral_centroid = librosa.feature.spectral_centroid(S=magnitude, sr=sr)
+    spectral_rolloff = librosa.feature.spectral_rolloff(S=magnitude, sr=sr)
+    spectral_bandwidth = librosa.feature.spectral_bandwidth(S=magnitude, sr=sr)
+    spectral_contrast = librosa.feature.spectral_contrast(S=magnitude, sr=sr)
     zcr = librosa.feature.zero_crossing_rate(segment, hop_length=hop_length)
 
     # Statistiques (mean + std pour capturer variations)
@@ -264,14 +394,15 @@ def extract_voice_features(audio_data: np.ndarray, sr: int, start: float, end: f
     zcr_mean = float(np.mean(zcr))
 
     # 4. CHROMA (harmoniques) - qualité vocale
-    chroma = librosa.feature.chroma_stft(y=segment, sr=sr, hop_length=hop_length)
+    chroma = librosa.feature.chroma_stft(S=power, sr=sr, tuning=chroma_tuning)
     chroma_mean = np.mean(chroma, axis=1)  # 12 dimensions
     chroma_std = np.std(chroma, axis=1)    # 12 dimensions
 
     # 5. FORMANTS approximés via spectral peaks
     # Les 3 premiers formants (F1, F2, F3) caractérisent les voyelles
-    spec = np.abs(librosa.stft(segment))
-    freqs = librosa.fft_frequencies(sr=sr)
+    # (hop 512 : grille de frames différente, seule STFT supplémentaire, ~6x moins de frames)
+    spec = segment_spectrogram(segment, FORMANT_HOP_LENGTH)
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=STFT_N_FFT)
     spec_mean = np.mean(spec, axis=1)
 
     # Trouver les 3 pics principaux (formants approximés)
@@ -412,6 +543,9 @@ def sequential_clustering(features: List[np.ndarray], voice_info: List[Dict], ma
        - Sinon → créer nouveau locuteur
     3. Max locuteurs = max_speakers
 
+    Moteur : online_clustering.OnlineSpeakerAssigner (centroïdes en matrice, moyenne glissante,
+    un produit matrice-vecteur par timecode). Mode --clustering online / AI_MFCC_CLUSTERING=online.
+
     Args:
         features: Liste de vecteurs features (ordre temporel)
         voice_info: Liste de dicts avec tessiture, timbre, confidence pour chaque timecode
@@ -421,153 +555,23 @@ def sequential_clustering(features: List[np.ndarray], voice_info: List[Dict], ma
     Returns:
         Array de labels (speaker IDs)
     """
-    from sklearn.metrics.pairwise import cosine_similarity
-
-    n_segments = len(features)
-    features_array = np.array(features)
-    labels = np.zeros(n_segments, dtype=int)
-
-    # Stocker les centroïdes ET les caractéristiques vocales de chaque locuteur
-    speaker_centroids = []
-    speaker_features = {}  # {speaker_id: [liste des features]}
-    speaker_voices = {}    # {speaker_id: {'tessiture': 'X', 'timbre': 'Y', 'confidence': Z}}
-
-    # Mapping des tessitures pour compatibilité
-    # STRICT : seules les tessitures très proches peuvent être confondues
-    tessiture_groups = {
-        'Soprano': ['Soprano'],           # Femme aiguë uniquement
-        'Mezzo': ['Mezzo', 'Alto'],       # Femme médium/grave
-        'Alto': ['Mezzo', 'Alto'],        # Femme médium/grave
-        'Tenor': ['Tenor'],               # Homme aigu uniquement
-        'Baryton': ['Baryton', 'Basse'],  # Homme médium/grave
-        'Basse': ['Baryton', 'Basse'],    # Homme médium/grave
-        'Unknown': ['Soprano', 'Mezzo', 'Alto', 'Tenor', 'Baryton', 'Basse', 'Unknown']
-    }
-
-    # Emojis pour les tessitures
-    tessiture_emojis = {
-        'Soprano': '🎵',
-        'Mezzo': '🎶',
-        'Alto': '🎼',
-        'Tenor': '🎸',
-        'Baryton': '🎺',
-        'Basse': '🎻',
-        'Unknown': '❓'
-    }
+    from online_clustering import OnlineSpeakerAssigner
 
     print(f"🔍 Clustering séquentiel avec contrainte TESSITURE + TIMBRE (seuil: {similarity_threshold:.2f})...", file=sys.stderr)
 
-    # Premier timecode = premier locuteur
-    labels[0] = 0
-    speaker_centroids.append(features_array[0])
-    speaker_features[0] = [features_array[0]]
-    speaker_voices[0] = {
-        'tessiture': voice_info[0]['tessiture'],
-        'timbre': voice_info[0]['timbre'],
-        'confidence': voice_info[0]['voice_confidence']
-    }
-    current_speakers = 1
-
-    emoji = tessiture_emojis.get(voice_info[0]['tessiture'], '❓')
-    print(f"  {emoji} Timecode 1: Locuteur 0 ({voice_info[0]['tessiture']}/{voice_info[0]['timbre']}, conf: {voice_info[0]['voice_confidence']:.2f})", file=sys.stderr)
-
-    # Pour chaque timecode suivant
-    for i in range(1, n_segments):
-        current_feature = features_array[i].reshape(1, -1)
-        current_tessiture = voice_info[i]['tessiture']
-        current_timbre = voice_info[i]['timbre']
-        current_confidence = voice_info[i]['voice_confidence']
-
-        emoji = tessiture_emojis.get(current_tessiture, '❓')
-
-        # Calculer similarité avec locuteurs de tessiture compatible
-        max_similarity = -1
-        best_speaker = -1
-
-        for speaker_id in range(current_speakers):
-            speaker_tessiture = speaker_voices[speaker_id]['tessiture']
-            speaker_timbre = speaker_voices[speaker_id]['timbre']
-            speaker_conf = speaker_voices[speaker_id]['confidence']
-
-            # ✅ CONTRAINTE DE TESSITURE : vérifier compatibilité
-            compatible_tessitures = tessiture_groups.get(speaker_tessiture, [speaker_tessiture])
-
-            # Si confiance élevée (>0.5) et tessitures incompatibles → skip (ABAISSÉ à 0.5)
-            if current_confidence > 0.5 and speaker_conf > 0.5:
-                if current_tessiture not in compatible_tessitures and current_tessiture != 'Unknown' and speaker_tessiture != 'Unknown':
-                    print(f"    ⊗ Skip Locuteur {speaker_id}: tessiture incompatible ({speaker_tessiture} vs {current_tessiture})", file=sys.stderr)
-                    continue  # Tessitures incompatibles = personnes différentes !
-
-            # Bonus de similarité si même timbre
-            centroid = speaker_centroids[speaker_id].reshape(1, -1)
-            similarity = cosine_similarity(current_feature, centroid)[0][0]
-
-            print(f"    → Locuteur {speaker_id} ({speaker_tessiture}/{speaker_timbre}): sim={similarity:.3f}", file=sys.stderr)
-
-            # Ajuster similarité selon timbre
-            if current_timbre == speaker_timbre and current_timbre != 'Neutre':
-                similarity += 0.08  # Bonus de 8% si même timbre (augmenté)
-                print(f"       Bonus timbre +0.08 → {similarity:.3f}", file=sys.stderr)
-
-            if similarity > max_similarity:
-                max_similarity = similarity
-                best_speaker = speaker_id
-
-        # Décision : assigner à locuteur existant ou créer nouveau
-        if max_similarity >= similarity_threshold and best_speaker != -1:
-            # Assigner au locuteur le plus similaire
-            labels[i] = best_speaker
-            speaker_features[best_speaker].append(features_array[i])
-
-            # Mettre à jour le centroïde
-            speaker_centroids[best_speaker] = np.mean(speaker_features[best_speaker], axis=0)
-
-            # Mettre à jour les infos vocales si confiance augmente
-            if current_confidence > speaker_voices[best_speaker]['confidence']:
-                speaker_voices[best_speaker] = {
-                    'tessiture': current_tessiture,
-                    'timbre': current_timbre,
-                    'confidence': current_confidence
-                }
-
-            print(f"  {emoji} Timecode {i+1}: Locuteur {best_speaker} (sim: {max_similarity:.3f}, {current_tessiture}/{current_timbre})", file=sys.stderr)
-        else:
-            # Créer nouveau locuteur si pas atteint max
-            if current_speakers < max_speakers:
-                new_speaker_id = current_speakers
-                labels[i] = new_speaker_id
-                speaker_centroids.append(features_array[i])
-                speaker_features[new_speaker_id] = [features_array[i]]
-                speaker_voices[new_speaker_id] = {
-                    'tessiture': current_tessiture,
-                    'timbre': current_timbre,
-                    'confidence': current_confidence
-                }
-                current_speakers += 1
-
-                reason = f"tessiture incompatible ({current_tessiture})" if best_speaker != -1 else "faible similarité"
-                print(f"  {emoji} ➕ Timecode {i+1}: NOUVEAU Locuteur {new_speaker_id} ({reason}, sim: {max_similarity:.3f})", file=sys.stderr)
-            else:
-                # Max atteint, forcer à assigner au plus proche (ignore genre si nécessaire)
-                if best_speaker == -1:
-                    # Aucun locuteur compatible, forcer au premier
-                    best_speaker = 0
-
-                labels[i] = best_speaker
-                speaker_features[best_speaker].append(features_array[i])
-                speaker_centroids[best_speaker] = np.mean(speaker_features[best_speaker], axis=0)
-
-                print(f"  ⚠ Timecode {i+1}: Forcé Locuteur {best_speaker} (max {max_speakers} atteint)", file=sys.stderr)
+    assigner = OnlineSpeakerAssigner(max_speakers, similarity_threshold, verbose=diarization_verbose())
+    labels = assigner.add_many(features, voice_info)
 
     # Debug: vérifier la répartition finale
     unique, counts = np.unique(labels, return_counts=True)
-    print(f"✅ Clustering séquentiel terminé: {current_speakers} locuteurs détectés", file=sys.stderr)
+    print(f"✅ Clustering séquentiel terminé: {assigner.n_speakers} locuteurs détectés", file=sys.stderr)
     print(f"📊 Distribution: {dict(zip(unique, counts))}", file=sys.stderr)
 
     return labels
 
 
-def apply_clustering(features: List[np.ndarray], voice_info: List[Dict], max_speakers: int) -> np.ndarray:
+def apply_clustering(features: List[np.ndarray], voice_info: List[Dict], max_speakers: int,
+                     count_method: str = None) -> np.ndarray:
     """
     Appliquer clustering HIÉRARCHIQUE AGGLOMÉRATIF - BEAUCOUP PLUS ROBUSTE
 
@@ -578,13 +582,15 @@ def apply_clustering(features: List[np.ndarray], voice_info: List[Dict], max_spe
         features: Liste de vecteurs features
         voice_info: Liste de dicts avec tessiture, timbre, confidence pour chaque timecode
         max_speakers: Nombre maximum de locuteurs
+        count_method: 'silhouette' (recherche sur k) ou 'eigengap' (défaut: AI_SPEAKER_COUNT_METHOD)
 
     Returns:
         Array de labels (speaker IDs)
     """
-    from sklearn.cluster import AgglomerativeClustering
-    from sklearn.metrics import silhouette_score
+    from clustering_engine import build_tree
+    from speaker_count import speaker_count_method, spectral_clustering
 
+    verbose = diarization_verbose()
     features_array = np.array(features)
     n_segments = len(features_array)
 
@@ -604,33 +610,40 @@ def apply_clustering(features: List[np.ndarray], voice_info: List[Dict], max_spe
     features_normalized = normalize(features_array, norm='l2')
     print(f"🔧 Features normalisées (L2) : {features_normalized.shape}", file=sys.stderr)
 
+    # Nombre de locuteurs par eigengap : une seule décomposition, pas de recherche silhouette
+    if speaker_count_method(count_method) == 'eigengap':
+        labels, n_clusters, eigengap = spectral_clustering(features_normalized, min_k=2, max_k=min(max_speakers, 8))
+        print(f"\n✅ Eigengap: {n_clusters} clusters (écart={eigengap:.3f}, clustering spectral)", file=sys.stderr)
+        return labels
+
     # CLUSTERING HIÉRARCHIQUE : Tester cosine ET euclidean
     best_score = -1
     best_labels = None
     best_n_clusters = 2
     best_method = None
 
-    print(f"\n🧪 Test clustering (2 à {min(max_speakers, 8)} clusters)...", file=sys.stderr)
+    # k candidats bornés à n_segments - 1 (silhouette indéfinie au-delà)
+    max_k = min(max_speakers, 8, n_segments - 1)
+    print(f"\n🧪 Test clustering (2 à {max_k} clusters)...", file=sys.stderr)
 
     # APPROCHE 1 : Cosine distance sur features normalisées (comme embeddings)
+    # Distances + dendrogramme calculés une fois, chaque k est une coupe de l'arbre
+    # (micro-clusters au-delà de AI_CLUSTERING_SCALABLE_THRESHOLD segments, voir clustering_engine)
     print("  📐 Méthode COSINE (sur features normalisées):", file=sys.stderr)
-    for n_clusters in range(2, min(max_speakers + 1, 9)):
-        clustering = AgglomerativeClustering(
-            n_clusters=n_clusters,
-            metric='cosine',
-            linkage='average'  # Average fonctionne avec cosine
-        )
-        labels = clustering.fit_predict(features_normalized)
+    cosine_tree = build_tree(features_normalized, metric='cosine', method='average')  # Average fonctionne avec cosine
+    for n_clusters in range(2, max_k + 1):
+        labels = cosine_tree.cut(n_clusters)
 
         # Vérifier que chaque cluster a au moins 2 segments
         unique, counts = np.unique(labels, return_counts=True)
         if np.any(counts < 2):
             continue  # Skip si cluster trop petit
 
-        # Calculer silhouette score
-        score = silhouette_score(features_normalized, labels, metric='cosine')
+        # Calculer silhouette score (distances précalculées)
+        score = cosine_tree.silhouette(labels)
 
-        print(f"    k={n_clusters}: silhouette={score:.3f}, distribution={dict(zip(unique, counts))}", file=sys.stderr)
+        if verbose:
+            print(f"    k={n_clusters}: silhouette={score:.3f}, distribution={dict(zip(unique, counts))}", file=sys.stderr)
 
         if score > best_score:
             best_score = score
@@ -639,23 +652,21 @@ def apply_clustering(features: List[np.ndarray], voice_info: List[Dict], max_spe
             best_method = 'cosine'
 
     # APPROCHE 2 : Euclidean sur features brutes (fallback si cosine score faible)
+    ward_tree = None
     if best_score < 0.35:
         print("  📏 Méthode EUCLIDEAN (fallback):", file=sys.stderr)
-        for n_clusters in range(2, min(max_speakers + 1, 9)):
-            clustering = AgglomerativeClustering(
-                n_clusters=n_clusters,
-                metric='euclidean',
-                linkage='ward'
-            )
-            labels = clustering.fit_predict(features_array)
+        ward_tree = build_tree(features_array, metric='euclidean', method='ward')
+        for n_clusters in range(2, max_k + 1):
+            labels = ward_tree.cut(n_clusters)
 
             unique, counts = np.unique(labels, return_counts=True)
             if np.any(counts < 2):
                 continue
 
-            score = silhouette_score(features_array, labels)
+            score = ward_tree.silhouette(labels)
 
-            print(f"    k={n_clusters}: silhouette={score:.3f}, distribution={dict(zip(unique, counts))}", file=sys.stderr)
+            if verbose:
+                print(f"    k={n_clusters}: silhouette={score:.3f}, distribution={dict(zip(unique, counts))}", file=sys.stderr)
 
             if score > best_score:
                 best_score = score
@@ -666,7 +677,7 @@ def apply_clustering(features: List[np.ndarray], voice_info: List[Dict], max_spe
     print(f"\n✅ Meilleur: {best_n_clusters} clusters (silhouette={best_score:.3f}, méthode={best_method})", file=sys.stderr)
 
     # Afficher détails par cluster
-    if best_labels is not None:
+    if verbose and best_labels is not None:
         for cluster_id in range(best_n_clusters):
             cluster_indices = np.where(best_labels == cluster_id)[0]
             cluster_tessitures = [tessitures[i] for i in cluster_indices]
@@ -682,70 +693,171 @@ def apply_clustering(features: List[np.ndarray], voice_info: List[Dict], max_spe
     # Fallback si aucun bon clustering trouvé
     if best_labels is None:
         print("⚠️  Fallback: 2 clusters par défaut", file=sys.stderr)
-        clustering = AgglomerativeClustering(n_clusters=2, metric='euclidean', linkage='ward')
-        best_labels = clustering.fit_predict(features_array)
+        if ward_tree is None:
+            ward_tree = build_tree(features_array, metric='euclidean', method='ward')
+        best_labels = ward_tree.cut(2)
 
     return best_labels
 
 
-def main():
-    parser = argparse.ArgumentParser(description='Diarization ultra-light avec MFCC')
-    parser.add_argument('audio_path', help='Chemin vers le fichier audio WAV')
-    parser.add_argument('transcription_json', help='Chemin vers la transcription Whisper (JSON)')
-    parser.add_argument('output_json', help='Chemin vers le fichier JSON de sortie')
-    parser.add_argument('--max-speakers', type=int, default=10, help='Nombre max de locuteurs')
-
-    args = parser.parse_args()
-
-    print("╔════════════════════════════════════════════════════════════════╗", file=sys.stderr)
-    print("║  👥 DIARIZATION ULTRA-LIGHT - Clustering MFCC                 ║", file=sys.stderr)
-    print("║  (Optimisé pour serveurs 2GB RAM)                             ║", file=sys.stderr)
-    print("╚════════════════════════════════════════════════════════════════╝", file=sys.stderr)
-    print("", file=sys.stderr)
+def feature_params(engine: str = None) -> Dict:
+    """Réglages dont dépendent les features (clé du sidecar)"""
+    return {'method': 'mfcc', 'engine': engine or feature_engine(), 'pitch': pitch_method()}
 
-    # Charger la transcription Whisper
-    print("📥 Chargement transcription Whisper...", file=sys.stderr)
-    with open(args.transcription_json, 'r', encoding='utf-8') as f:
-        transcription = json.load(f)
 
-    segments = transcription.get('segments', [])
-    print(f"✅ {len(segments)} segments chargés", file=sys.stderr)
+def extract_segment_features(segments: List[Dict], audio_data: np.ndarray, sr: int, engine: str = None,
+                             workers: int = None) -> Tuple[List[np.ndarray], List[Dict], List[int]]:
+    """
+    Features vocales 112D de chaque segment assez long
 
-    # Charger l'audio
-    print("📥 Chargement audio...", file=sys.stderr)
-    audio_data, sr = sf.read(args.audio_path)
-    print(f"✅ Audio chargé ({sr}Hz)", file=sys.stderr)
+    Args:
+        segments: Segments Whisper (start/end)
+        audio_data: Audio mono (tableau numpy ou memmap)
+        sr: Fréquence d'échantillonnage de audio_data
+        engine: Moteur de features 'segment' ou 'frames' (défaut: AI_MFCC_FEATURE_ENGINE)
+        workers: Process d'extraction du moteur 'segment' (défaut: AI_MFCC_WORKERS, 1 = séquentiel)
 
+    Returns:
+        (features, voice_info, segment_indices) : segment_indices[i] = indice du segment de features[i]
+    """
+    engine = engine or feature_engine()
+    workers = workers or feature_workers()
     # Extraire features vocales pour chaque segment
-    print(f"🔍 Extraction features vocales ({len(segments)} segments)...", file=sys.stderr)
+    print(f"🔍 Extraction features vocales ({len(segments)} segments, moteur {engine})...", file=sys.stderr)
     features = []
     voice_info = []
-    valid_segments = []
     segment_indices = []  # Pour mapper les segments valides aux originaux
+    reporter = get_reporter()
+
+    with get_metrics().stage('feature_extraction', audio_seconds=sum(seg['end'] - seg['start'] for seg in segments)):
+        if engine == 'frames':
+            from frame_features import extract_features_framewise
+
+            # Zones continues analysées une fois, stats agrégées par segment
+            extracted = extract_features_framewise(
+                audio_data, sr, segments,
+                on_progress=lambda done, total: reporter.update('diarization', done, total, unit='segments')
+            )
+        elif workers > 1:
+            from parallel_features import extract_features_parallel, plan_feature_workers
+
+            # Segments répartis entre process, audio partagé (memmap ou mémoire partagée)
+            workers = plan_feature_workers(workers, audio_data, len(segments))
+            extracted = extract_features_parallel(
+                audio_data, sr, segments, workers,
+                on_progress=lambda done, total: reporter.update('diarization', done, total, unit='segments')
+            ) if workers > 1 else None
+        else:
+            extracted = None
+
+        for idx, segment in enumerate(segments):
+            start = segment['start']
+            end = segment['end']
+            if extracted is None:
+                reporter.update('diarization', idx + 1, len(segments), unit='segments')
 
-    for idx, segment in enumerate(segments):
-        start = segment['start']
-        end = segment['end']
+            # Skip segments trop courts
+            if (end - start) < 0.3:  # Moins de 300ms
+                continue
 
-        # Skip segments trop courts
-        if (end - start) < 0.3:  # Moins de 300ms
-            continue
+            if extracted is not None:
+                result = extracted[idx]
+            else:
+                try:
+                    result = extract_voice_features(audio_data, sr, start, end)
+                except Exception as e:
+                    print(f"⚠️  Erreur extraction features segment {start:.2f}-{end:.2f}: {e}", file=sys.stderr)
+                    import traceback
+                    traceback.print_exc()
+                    continue
 
-        try:
-            result = extract_voice_features(audio_data, sr, start, end)
             if result is not None:
                 voice_features, voice_data = result
                 features.append(voice_features)
                 voice_info.append(voice_data)
-                valid_segments.append(segment)
                 segment_indices.append(idx)
-        except Exception as e:
-            print(f"⚠️  Erreur extraction features segment {start:.2f}-{end:.2f}: {e}", file=sys.stderr)
-            import traceback
-            traceback.print_exc()
-            continue
 
     print(f"✅ {len(features)} features vocales extraites (112 dimensions: MFCC+Pitch+Spectral+Chroma+Formants)", file=sys.stderr)
+    return features, voice_info, segment_indices
+
+
+def diarize(segments: List[Dict], audio_data: np.ndarray, sr: int, max_speakers: int = 10,
+            language: str = 'unknown', duration: float = 0, engine: str = None,
+            workers: int = None, sidecar_path: str = None, sidecar_key: str = None,
+            registry_dir: str = None) -> Dict:
+    """
+    Diarization MFCC en mémoire (API utilisée directement par extract_dialogues.py)
+
+    Args:
+        segments: Segments Whisper (start/end/text)
+        audio_data: Audio mono (tableau numpy)
+        sr: Fréquence d'échantillonnage de audio_data
+        max_speakers: Nombre max de locuteurs
+        language: Langue détectée par Whisper (recopiée dans chaque dialogue)
+        duration: Durée totale (métadonnées)
+        engine: Moteur de features 'segment' ou 'frames' (défaut: AI_MFCC_FEATURE_ENGINE)
+        workers: Process d'extraction du moteur 'segment' (défaut: AI_MFCC_WORKERS, 1 = séquentiel)
+        sidecar_path: Sidecar des features (feature_sidecar.py) : relu s'il correspond à
+            sidecar_key (pas d'extraction), sinon écrit après l'extraction
+        sidecar_key: Clé attendue du sidecar (feature_sidecar.sidecar_key)
+        registry_dir: Registre des locuteurs du projet / de la série (speaker_registry.py)
+
+    Returns:
+        Résultat de diarization (même structure que le JSON écrit par le CLI)
+    """
+    cached = None
+    if sidecar_path and sidecar_key:
+        from feature_sidecar import load_sidecar
+
+        cached = load_sidecar(sidecar_path, segments, key=sidecar_key)
+
+    if cached is not None:
+        print(f"♻️  Features relues depuis le sidecar ({len(cached['segment_indices'])} segments)", file=sys.stderr)
+        features, voice_info, segment_indices = list(cached['features']), cached['voice_info'], cached['segment_indices']
+    else:
+        features, voice_info, segment_indices = extract_segment_features(segments, audio_data, sr, engine, workers)
+        if sidecar_path and sidecar_key and features:
+            from feature_sidecar import save_sidecar
+
+            save_sidecar(sidecar_path, sidecar_key, segments, np.array(features), segment_indices,
+                         voice_info, feature_params(engine))
+
+    registry = None
+    if registry_dir:
+        from speaker_registry import SpeakerRegistry
+
+        registry = SpeakerRegistry.open(registry_dir, feature_params(engine))
+    return label_segments(segments, features, voice_info, segment_indices, max_speakers, language, duration,
+                          registry=registry)
+
+
+def label_segments(segments: List[Dict], features: List[np.ndarray], voice_info: List[Dict],
+                   segment_indices: List[int], max_speakers: int = 10, language: str = 'unknown',
+                   duration: float = 0, clustering: str = None, registry=None) -> Dict:
+    """
+    Clustering des features + assignation d'un locuteur à chaque segment (y compris les segments
+    trop courts, rattachés au segment analysé le plus proche)
+
+    Seule étape qui dépend de max_speakers : c'est elle que relance --recluster.
+    clustering : 'hierarchical' ou 'online' (défaut: AI_MFCC_CLUSTERING)
+    registry : SpeakerRegistry (locuteurs connus d'abord, seul le reste est clusterisé) ;
+        son verrou est toujours rendu en sortie
+
+    Returns:
+        Résultat de diarization (même structure que le JSON écrit par le CLI)
+    """
+    try:
+        return _label_segments(segments, features, voice_info, segment_indices, max_speakers, language,
+                               duration, clustering, registry)
+    finally:
+        if registry is not None:
+            registry.close()
+
+
+def _label_segments(segments: List[Dict], features: List[np.ndarray], voice_info: List[Dict],
+                    segment_indices: List[int], max_speakers: int, language: str, duration: float,
+                    clustering: str, registry) -> Dict:
+    metrics = get_metrics()
 
     # Afficher résumé des tessitures et timbres détectés
     if len(voice_info) > 0:
@@ -770,21 +882,35 @@ def main():
                 'text': segment['text'].strip(),
                 'speaker': 'SPEAKER_00',
                 'confidence': 1.0,
-                'language': transcription.get('language', 'unknown')
+                'language': language
             })
 
         result = {
             'dialogues': dialogues,
             'speakers': ['SPEAKER_00'],
             'metadata': {
-                'duration': transcription.get('duration', 0),
+                'duration': duration,
                 'total_dialogues': len(dialogues),
                 'detected_speakers': 1
             }
         }
     else:
         # Clustering avec contrainte tessiture + timbre
-        speaker_labels = apply_clustering(features, voice_info, args.max_speakers)
+        cluster = sequential_clustering if (clustering or clustering_mode()) == 'online' else apply_clustering
+        with metrics.stage('clustering'):
+            if registry is not None and registry.usable:
+                from feature_sidecar import segments_signature
+                from speaker_registry import label_with_registry
+
+                episode = segments_signature(segments)
+                speaker_labels = label_with_registry(
+                    np.array(features), registry,
+                    lambda idx: cluster([features[i] for i in idx], [voice_info[i] for i in idx], max_speakers),
+                    episode=episode
+                )
+                registry.save(episode)
+            else:
+                speaker_labels = cluster(features, voice_info, max_speakers)
 
         # Debug: vérifier la distribution des labels du clustering
         unique_labels, label_counts = np.unique(speaker_labels, return_counts=True)
@@ -813,7 +939,7 @@ def main():
                 'text': segment['text'].strip(),
                 'speaker': speaker_id,
                 'confidence': 1.0,
-                'language': transcription.get('language', 'unknown')
+                'language': language
             })
 
         speakers = sorted(list(set(f"SPEAKER_{label:02d}" for label in speaker_labels)))
@@ -842,12 +968,104 @@ def main():
             'method': 'mfcc',
             'speakers': speakers,
             'metadata': {
-                'duration': transcription.get('duration', 0),
+                'duration': duration,
                 'total_dialogues': len(dialogues),
                 'detected_speakers': num_speakers
             }
         }
 
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Diarization ultra-light avec MFCC')
+    parser.add_argument('audio_path', help='Chemin vers le fichier audio WAV')
+    parser.add_argument('transcription_json', help='Chemin vers la transcription Whisper (JSON)')
+    parser.add_argument('output_json', help='Chemin vers le fichier JSON de sortie')
+    parser.add_argument('--max-speakers', type=int, default=10, help='Nombre max de locuteurs')
+    parser.add_argument('--feature-engine', choices=['segment', 'frames'], default=None,
+                        help="Moteur de features (défaut: $AI_MFCC_FEATURE_ENGINE ou 'segment')")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Process d'extraction des features, moteur 'segment' (défaut: $AI_MFCC_WORKERS ou 1)")
+    parser.add_argument('--clustering', choices=['hierarchical', 'online'], default=None,
+                        help="Clustering des locuteurs (défaut: $AI_MFCC_CLUSTERING ou 'hierarchical')")
+    parser.add_argument('--audio-cache-dir', default=None,
+                        help='Cache du PCM float32 mono mappé en mémoire (défaut: $AI_AUDIO_CACHE_DIR)')
+    parser.add_argument('--features-sidecar', default=None,
+                        help="Sidecar des features (défaut: <output_json sans .json>.features.npz)")
+    parser.add_argument('--no-sidecar', action='store_true', help="Ne pas écrire le sidecar des features")
+    parser.add_argument('--recluster', action='store_true',
+                        help="Relancer seulement le clustering depuis le sidecar (audio non relu)")
+    parser.add_argument('--speaker-registry', default=None,
+                        help="Registre des locuteurs du projet / de la série (dossier, speaker_registry.py)")
+    parser.add_argument('--verbose', action='store_true',
+                        help='Logs détaillés par segment (équivaut à AI_DIARIZATION_VERBOSE=true)')
+
+    args = parser.parse_args()
+
+    if args.verbose:
+        os.environ['AI_DIARIZATION_VERBOSE'] = 'true'
+
+    print("╔════════════════════════════════════════════════════════════════╗", file=sys.stderr)
+    print("║  👥 DIARIZATION ULTRA-LIGHT - Clustering MFCC                 ║", file=sys.stderr)
+    print("║  (Optimisé pour serveurs 2GB RAM)                             ║", file=sys.stderr)
+    print("╚════════════════════════════════════════════════════════════════╝", file=sys.stderr)
+    print("", file=sys.stderr)
+
+    # Charger la transcription Whisper
+    print("📥 Chargement transcription Whisper...", file=sys.stderr)
+    with open(args.transcription_json, 'r', encoding='utf-8') as f:
+        transcription = json.load(f)
+
+    segments = transcription.get('segments', [])
+    print(f"✅ {len(segments)} segments chargés", file=sys.stderr)
+
+    from feature_sidecar import default_sidecar_path, file_sha256, load_sidecar, save_sidecar, sidecar_key
+
+    sidecar_path = args.features_sidecar or default_sidecar_path(args.output_json)
+    language = transcription.get('language', 'unknown')
+    duration = transcription.get('duration', 0)
+
+    if args.recluster:
+        # Clustering seul : ni audio, ni hash, ni extraction
+        cached = load_sidecar(sidecar_path, segments)
+        if cached is None or cached['params'].get('method') != 'mfcc':
+            print(f"❌ Pas de sidecar MFCC valide pour cette transcription: {sidecar_path}", file=sys.stderr)
+            sys.exit(1)
+    else:
+        key = sidecar_key(file_sha256(args.audio_path), segments, **feature_params(args.feature_engine))
+        cached = load_sidecar(sidecar_path, segments, key=key)
+
+    if cached is not None:
+        print(f"♻️  Features relues depuis {sidecar_path} ({len(cached['segment_indices'])} segments)", file=sys.stderr)
+        features, voice_info, segment_indices = list(cached['features']), cached['voice_info'], cached['segment_indices']
+    else:
+        # Charger l'audio : float32 mono par blocs, mappé sur disque pour les longues sources
+        print("📥 Chargement audio...", file=sys.stderr)
+        audio_data, sr = load_audio_mono(args.audio_path, cache_dir=args.audio_cache_dir or audio_cache_dir())
+        storage = 'mappé sur disque' if isinstance(audio_data, np.memmap) else 'en RAM'
+        print(f"✅ Audio chargé ({len(audio_data) / sr:.1f}s, {sr}Hz, mono float32, {storage})", file=sys.stderr)
+
+        features, voice_info, segment_indices = extract_segment_features(
+            segments, audio_data, sr, engine=args.feature_engine, workers=args.workers
+        )
+        del audio_data
+        if not args.no_sidecar and features:
+            save_sidecar(sidecar_path, key, segments, np.array(features), segment_indices,
+                         voice_info, feature_params(args.feature_engine))
+
+    registry = None
+    if args.speaker_registry:
+        from speaker_registry import SpeakerRegistry
+
+        registry = SpeakerRegistry.open(args.speaker_registry,
+                                        cached['params'] if cached is not None else feature_params(args.feature_engine))
+
+    # Clustering + assignation des locuteurs
+    result = label_segments(segments, features, voice_info, segment_indices, args.max_speakers,
+                            language=language, duration=duration, clustering=args.clustering,
+                            registry=registry)
+
     # Sauvegarder résultat
     with open(args.output_json, 'w', encoding='utf-8') as f:
         json.dump(result, f, ensure_ascii=False, indent=2)
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Détection des changements de locuteur dans les segments Whisper (AI_SPEAKER_CHANGE_ENABLED)
+
+La diarization prend les bornes des segments Whisper telles quelles : un segment où deux
+personnages se répondent reçoit un seul locuteur. Cette étape, lancée avant l'extraction des
+features, coupe les segments aux changements de locuteur détectés, en une passe linéaire :
+    - MFCC (sans c0 : insensible au volume) calculés une fois par zone continue de parole
+      (mêmes zones que frame_features.plan_spans)
+    - ΔBIC sur fenêtre glissante (gauche / droite de WINDOW_SECONDS, gaussiennes à covariance
+      pleine) à chaque pas de STEP_SECONDS à l'intérieur des segments ; moyennes et covariances
+      de toutes les fenêtres tirées de sommes cumulées (x et x·xᵀ) : O(d²) par position,
+      quelle que soit la taille des fenêtres
+    - changements = maxima de ΔBIC > 0, espacés d'au moins MIN_SUBSEGMENT_SECONDS
+    - coupe recalée sur la frontière de mots Whisper la plus proche (word_timestamps) :
+      chaque sous-segment garde ses mots, son texte et leurs temps exacts
+
+Un segment sans mots horodatés, ou un changement sans frontière de mots à moins de
+MAX_SNAP_SECONDS, n'est pas coupé.
+
+Usage:
+    from speaker_change import split_at_speaker_changes
+    segments = split_at_speaker_changes(audio, 16000, transcription['segments'])
+
+    python speaker_change.py <audio> <segments_json> <output_json> [--penalty 1.5]
+"""
+
+import argparse
+import json
+import os
+import sys
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Fenêtres gauche / droite comparées par le ΔBIC
+WINDOW_SECONDS = 1.0
+# Pas entre deux positions testées
+STEP_SECONDS = 0.1
+# Durée minimale d'un sous-segment (et écart minimal entre deux changements)
+MIN_SUBSEGMENT_SECONDS = 1.0
+# Distance max entre un changement et la frontière de mots où l'on coupe
+MAX_SNAP_SECONDS = 0.5
+# Pénalité λ du critère BIC (plus grand = moins de coupes)
+DEFAULT_PENALTY = 1.5
+# MFCC (c0 exclu) : 10ms par frame
+N_MFCC = 13
+HOP_SECONDS = 0.01
+# Frames ignorées par le ΔBIC (silences entre les mots) : énergie sous le max de la zone - X dB
+SILENCE_TOP_DB = 35.0
+
+
+def speaker_change_enabled() -> bool:
+    return os.getenv('AI_SPEAKER_CHANGE_ENABLED', 'false').lower() == 'true'
+
+
+def speaker_change_penalty() -> float:
+    """Pénalité λ du ΔBIC (AI_SPEAKER_CHANGE_PENALTY)"""
+    try:
+        return float(os.getenv('AI_SPEAKER_CHANGE_PENALTY', DEFAULT_PENALTY))
+    except ValueError:
+        return DEFAULT_PENALTY
+
+
+def _span_mfcc(y: np.ndarray, sr: int, hop: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    MFCC sans c0 de la zone + frames voisées
+
+    Returns:
+        ((frames, N_MFCC - 1), (frames,) bool : énergie à moins de SILENCE_TOP_DB du max)
+    """
+    import librosa
+
+    y = np.asarray(y, dtype=np.float32)
+    mfcc = librosa.feature.mfcc(y=y, sr=sr, n_mfcc=N_MFCC, n_fft=4 * hop, hop_length=hop)
+    rms = librosa.feature.rms(y=y, frame_length=4 * hop, hop_length=hop)[0]
+    voiced = librosa.amplitude_to_db(rms, ref=np.max) > -SILENCE_TOP_DB
+    n = min(mfcc.shape[1], len(voiced))
+    return mfcc[1:, :n].T.astype(np.float64), voiced[:n]
+
+
+def delta_bic(x: np.ndarray, voiced: np.ndarray, left: np.ndarray, change: np.ndarray, right: np.ndarray,
+              penalty: float = DEFAULT_PENALTY) -> np.ndarray:
+    """
+    ΔBIC "deux locuteurs vs un seul" de chaque position, par sommes cumulées
+
+    Args:
+        x: (frames, d) features de la zone
+        voiced: (frames,) frames prises en compte (les silences ne comptent dans aucune fenêtre)
+        left, change, right: (m,) frames [left, change) et [change, right) de chaque position
+        penalty: λ
+
+    Returns:
+        (m,) ΔBIC (> 0 : deux gaussiennes expliquent mieux les fenêtres qu'une seule ;
+        -inf si une fenêtre a moins de 2·d frames voisées)
+    """
+    n, d = x.shape
+    x = x * voiced[:, None]
+    s0 = np.zeros(n + 1)
+    s1 = np.zeros((n + 1, d))
+    s2 = np.zeros((n + 1, d, d))
+    np.cumsum(voiced, out=s0[1:])
+    np.cumsum(x, axis=0, out=s1[1:])
+    np.cumsum(x[:, :, None] * x[:, None, :], axis=0, out=s2[1:])
+    ridge = 1e-6 * np.eye(d)
+
+    def log_det(a: np.ndarray, b: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        count = np.maximum(s0[b] - s0[a], 1.0)
+        mean = (s1[b] - s1[a]) / count[:, None]
+        cov = (s2[b] - s2[a]) / count[:, None, None] - mean[:, :, None] * mean[:, None, :]
+        return np.linalg.slogdet(cov + ridge)[1], count
+
+    log_all, n_all = log_det(left, right)
+    log_left, n_left = log_det(left, change)
+    log_right, n_right = log_det(change, right)
+    n_params = d + d * (d + 1) / 2
+    scores = (0.5 * (n_all * log_all - n_left * log_left - n_right * log_right)
+              - penalty * 0.5 * n_params * np.log(n_all))
+    return np.where(np.minimum(n_left, n_right) >= 2 * d, scores, -np.inf)
+
+
+def _pick_changes(times: np.ndarray, scores: np.ndarray, min_gap: float) -> List[float]:
+    """Maxima de ΔBIC > 0 par ordre décroissant, à au moins min_gap les uns des autres"""
+    changes: List[float] = []
+    for i in np.argsort(-scores):
+        if scores[i] <= 0:
+            break
+        if all(abs(times[i] - t) >= min_gap for t in changes):
+            changes.append(float(times[i]))
+    return sorted(changes)
+
+
+def _split_segment(segment: Dict, changes: List[float], min_seconds: float) -> List[Dict]:
+    """Couper un segment aux frontières de mots les plus proches des changements"""
+    words = segment.get('words') or []
+    if len(words) < 2 or not changes:
+        return [segment]
+
+    # Frontière i : entre words[i] et words[i + 1]
+    boundaries = np.array([(words[i]['end'] + words[i + 1]['start']) / 2 for i in range(len(words) - 1)])
+    cuts = []
+    for change in changes:
+        i = int(np.argmin(np.abs(boundaries - change)))
+        if abs(boundaries[i] - change) <= MAX_SNAP_SECONDS and i not in cuts:
+            cuts.append(i)
+    cuts.sort()
+
+    pieces = []
+    first = 0
+    for i in cuts + [len(words) - 1]:
+        pieces.append(words[first:i + 1])
+        first = i + 1
+
+    # Sous-segments trop courts après recalage : fusionnés avec le précédent
+    merged: List[List[Dict]] = []
+    for piece in pieces:
+        if merged and (piece[-1]['end'] - piece[0]['start'] < min_seconds
+                       or merged[-1][-1]['end'] - merged[-1][0]['start'] < min_seconds):
+            merged[-1] = merged[-1] + piece
+        else:
+            merged.append(piece)
+    if len(merged) < 2:
+        return [segment]
+
+    parts = []
+    for n, piece in enumerate(merged):
+        part = dict(segment)
+        part['start'] = segment['start'] if n == 0 else piece[0]['start']
+        part['end'] = segment['end'] if n == len(merged) - 1 else piece[-1]['end']
+        part['text'] = ''.join(word['word'] for word in piece)
+        part['words'] = piece
+        parts.append(part)
+    return parts
+
+
+def split_at_speaker_changes(audio: np.ndarray, sr: int, segments: List[Dict],
+                             penalty: Optional[float] = None,
+                             min_seconds: float = MIN_SUBSEGMENT_SECONDS) -> List[Dict]:
+    """
+    Segments Whisper coupés aux changements de locuteur détectés
+
+    Args:
+        audio: Audio mono (vocals si séparés), np.memmap accepté
+        sr: Fréquence d'échantillonnage
+        segments: Segments Whisper (start/end/text, words avec word_timestamps)
+        penalty: λ du ΔBIC (défaut: AI_SPEAKER_CHANGE_PENALTY)
+        min_seconds: Durée minimale d'un sous-segment
+
+    Returns:
+        Nouvelle liste de segments (mêmes champs ; start/end/text/words propres à chaque
+        sous-segment), dans l'ordre d'origine, 'id' renumérotés à la suite du premier segment
+    """
+    from frame_features import plan_spans
+
+    if penalty is None:
+        penalty = speaker_change_penalty()
+    hop = int(round(HOP_SECONDS * sr))
+    frames_per_second = sr / hop
+    window = int(round(WINDOW_SECONDS * frames_per_second))
+    step = max(1, int(round(STEP_SECONDS * frames_per_second)))
+    min_frames = int(round(min_seconds * frames_per_second))
+
+    changes: Dict[int, List[float]] = {}
+    for span_start, span_end, members in plan_spans(segments, sr, len(audio)):
+        # Segments assez longs pour deux sous-segments
+        members = [i for i in members if segments[i]['end'] - segments[i]['start'] >= 2 * min_seconds
+                   and len(segments[i].get('words') or []) >= 2]
+        if not members:
+            continue
+
+        x, voiced = _span_mfcc(audio[span_start:span_end], sr, hop)
+        offset = span_start / sr
+        lefts, positions, rights, owners = [], [], [], []
+        for i in members:
+            first = max(0, int(round((segments[i]['start'] - offset) * frames_per_second)))
+            last = min(len(x), int(round((segments[i]['end'] - offset) * frames_per_second)))
+            candidates = np.arange(first + min_frames, last - min_frames + 1, step)
+            if len(candidates) == 0:
+                continue
+            # Fenêtres bornées au segment : ne compare pas la voix avec le silence ou le segment voisin
+            lefts.append(np.maximum(first, candidates - window))
+            rights.append(np.minimum(last, candidates + window))
+            positions.append(candidates)
+            owners.append(np.full(len(candidates), i))
+        if not positions:
+            continue
+
+        positions = np.concatenate(positions)
+        owners = np.concatenate(owners)
+        scores = delta_bic(x, voiced, np.concatenate(lefts), positions, np.concatenate(rights), penalty)
+        times = offset + positions / frames_per_second
+        for i in np.unique(owners):
+            mine = owners == i
+            found = _pick_changes(times[mine], scores[mine], min_seconds)
+            if found:
+                changes[int(i)] = found
+
+    result = []
+    for i, segment in enumerate(segments):
+        result.extend(_split_segment(segment, changes.get(i, []), min_seconds))
+
+    # Identifiants uniques et continus (comme vad_chunking.remap_segments), segments d'origine intacts
+    first_id = segments[0].get('id', 0) if segments else 0
+    result = [dict(segment, id=first_id + n) for n, segment in enumerate(result)]
+
+    print(f"✂️  Changements de locuteur: {len(segments)} segments -> {len(result)} "
+          f"({len(result) - len(segments)} coupe(s), λ={penalty:g})", file=sys.stderr)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Couper les segments Whisper aux changements de locuteur (ΔBIC)")
+    parser.add_argument('audio_path', help="Audio (vocals de préférence)")
+    parser.add_argument('segments_json', help="JSON Whisper (clé 'segments', avec words)")
+    parser.add_argument('output_json', help="JSON de sortie (mêmes clés, segments coupés)")
+    parser.add_argument('--penalty', type=float, default=None,
+                        help=f"Pénalité λ du ΔBIC (défaut: AI_SPEAKER_CHANGE_PENALTY ou {DEFAULT_PENALTY})")
+    args = parser.parse_args()
+
+    from audio_io import WHISPER_SAMPLE_RATE, load_audio_mono
+
+    with open(args.segments_json, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    audio, sr = load_audio_mono(args.audio_path, sample_rate=WHISPER_SAMPLE_RATE)
+    data['segments'] = split_at_speaker_changes(audio, sr, data.get('segments', []),
+                                                penalty=args.penalty)
+    with open(args.output_json, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"✅ {len(data['segments'])} segments -> {args.output_json}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
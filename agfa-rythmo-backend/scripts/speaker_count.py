@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Estimation du nombre de locuteurs par eigengap + clustering spectral (AI_SPEAKER_COUNT_METHOD=eigengap)
+
+apply_clustering (MFCC) et cluster_embeddings (Resemblyzer) choisissent k par recherche
+silhouette : une coupe de l'arbre et une silhouette O(n²) par k candidat. Ici, une seule
+décomposition :
+    1. affinité cosinus entre segments (vecteurs centrés puis normalisés L2 : la composante
+       commune à toutes les voix ne rapproche plus les locuteurs), élaguée aux PRUNE_RATIO
+       voisins les plus proches de chaque segment puis symétrisée (graphe k-NN : les paires
+       éloignées, bruitées, ne relient plus les locuteurs entre eux)
+    2. laplacien normalisé L = I - D^-1/2 A D^-1/2, ses max_k + 1 plus petites valeurs propres
+       (eigh dense, ou eigsh sur la matrice creuse au-delà de DENSE_MAX_SEGMENTS segments)
+    3. k = plus grand écart entre valeurs propres consécutives (eigengap) dans [min_k, max_k]
+    4. labels : KMeans sur les k premiers vecteurs propres normalisés par ligne (Ng-Jordan-Weiss),
+       vecteurs déjà obtenus au 2. (aucune autre décomposition)
+
+Usage:
+    from speaker_count import speaker_count_method, spectral_clustering
+    if speaker_count_method() == 'eigengap':
+        labels, k, eigengap = spectral_clustering(features, min_k=2, max_k=8)
+"""
+
+import os
+import sys
+from typing import Optional, Tuple
+
+import numpy as np
+
+COUNT_METHODS = ('silhouette', 'eigengap')
+DEFAULT_COUNT_METHOD = 'silhouette'
+# Voisins gardés par segment dans le graphe d'affinité (fraction de n, bornée)
+PRUNE_RATIO = 0.3
+MIN_NEIGHBORS = 3
+MAX_NEIGHBORS = 256
+# Au-delà, valeurs propres par eigsh (Lanczos) sur le graphe creux plutôt que eigh dense O(n³)
+DENSE_MAX_SEGMENTS = 500
+# Lignes de la matrice de similarité calculées à la fois (bloc x n float32)
+SIMILARITY_BLOCK_ROWS = 1024
+
+
+def speaker_count_method(method: Optional[str] = None) -> str:
+    """Méthode de choix du nombre de locuteurs (AI_SPEAKER_COUNT_METHOD : silhouette | eigengap)"""
+    method = (method or os.getenv('AI_SPEAKER_COUNT_METHOD', DEFAULT_COUNT_METHOD)).strip().lower()
+    if method not in COUNT_METHODS:
+        print(f"⚠️  AI_SPEAKER_COUNT_METHOD invalide ({method}), silhouette utilisé", file=sys.stderr)
+        return DEFAULT_COUNT_METHOD
+    return method
+
+
+def _n_neighbors(n: int) -> int:
+    return int(min(n - 1, max(MIN_NEIGHBORS, min(MAX_NEIGHBORS, round(PRUNE_RATIO * n)))))
+
+
+def affinity_graph(X: np.ndarray):
+    """
+    Graphe k-NN symétrique des similarités cosinus des vecteurs centrés (CSR, diagonale nulle)
+
+    Les similarités sont calculées par blocs de lignes : jamais de matrice n x n dense.
+    """
+    from scipy import sparse
+
+    X = np.asarray(X, dtype=np.float32)
+    X = X - X.mean(axis=0)
+    X = X / np.maximum(np.linalg.norm(X, axis=1, keepdims=True), 1e-12)
+    n = len(X)
+    p = _n_neighbors(n)
+
+    rows, cols, values = [], [], []
+    for start in range(0, n, SIMILARITY_BLOCK_ROWS):
+        block = X[start:start + SIMILARITY_BLOCK_ROWS] @ X.T
+        np.clip(block, 0.0, 1.0, out=block)
+        block[np.arange(len(block)), np.arange(start, start + len(block))] = -1.0
+        neighbors = np.argpartition(-block, p - 1, axis=1)[:, :p]
+        rows.append(np.repeat(np.arange(start, start + len(block)), p))
+        cols.append(neighbors.ravel())
+        values.append(np.take_along_axis(block, neighbors, axis=1).ravel())
+
+    A = sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))), shape=(n, n))
+    # Symétrisation : arête gardée si l'un des deux segments la retient
+    return A.maximum(A.T).tocsr()
+
+
+def spectral_embedding(A, n_eigen: int, dense: bool) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    n_eigen plus petites valeurs propres du laplacien normalisé et vecteurs propres associés
+
+    Calculées comme les plus grandes de M = D^-1/2 A D^-1/2 (L = I - M), même base propre.
+    """
+    from scipy import sparse
+
+    degrees = np.asarray(A.sum(axis=1)).ravel()
+    inv_sqrt = 1.0 / np.sqrt(np.maximum(degrees, 1e-12))
+    D = sparse.diags(inv_sqrt)
+    M = (D @ A @ D).astype(np.float64)
+    n = M.shape[0]
+
+    if dense or n_eigen >= n - 1:
+        from scipy.linalg import eigh
+
+        values, vectors = eigh(M.toarray(), subset_by_index=[n - n_eigen, n - 1])
+    else:
+        from scipy.sparse.linalg import eigsh
+
+        values, vectors = eigsh(M, k=n_eigen, which='LA', v0=np.full(n, 1.0 / np.sqrt(n)))
+
+    order = np.argsort(-values)
+    return 1.0 - values[order], vectors[:, order]
+
+
+def spectral_clustering(X: np.ndarray, min_k: int = 2, max_k: int = 8,
+                        dense: Optional[bool] = None) -> Tuple[np.ndarray, int, float]:
+    """
+    Nombre de locuteurs par eigengap puis labels par clustering spectral
+
+    Args:
+        X: (n, d) features ou embeddings (cosinus)
+        min_k, max_k: Bornes du nombre de locuteurs
+        dense: eigh dense ou eigsh creux (défaut : dense jusqu'à DENSE_MAX_SEGMENTS segments)
+
+    Returns:
+        (labels (n,), k, eigengap retenu)
+    """
+    from sklearn.cluster import KMeans
+
+    n = len(X)
+    max_k = max(1, min(max_k, n - 1))
+    min_k = max(1, min(min_k, max_k))
+    if n < 3:
+        return np.zeros(n, dtype=int), 1, 0.0
+
+    if dense is None:
+        dense = n <= DENSE_MAX_SEGMENTS
+
+    eigenvalues, eigenvectors = spectral_embedding(affinity_graph(X), max_k + 1, dense)
+    # gaps[i] = λ_(i+1) - λ_i, i = nombre de clusters
+    gaps = np.diff(eigenvalues)
+    candidates = np.arange(min_k, max_k + 1)
+    k = int(candidates[np.argmax(gaps[candidates - 1])])
+
+    U = eigenvectors[:, :k]
+    U = U / np.maximum(np.linalg.norm(U, axis=1, keepdims=True), 1e-12)
+    labels = KMeans(n_clusters=k, n_init=10, random_state=0).fit_predict(U)
+    return labels.astype(int), k, float(gaps[k - 1])
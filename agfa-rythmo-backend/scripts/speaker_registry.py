@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Registre persistant des locuteurs d'une série / d'un projet (personnages récurrents)
+
+Sans registre, chaque diarization repart de zéro : SPEAKER_00..N dans un ordre arbitraire,
+et les mêmes personnages sont re-clusterisés et re-mappés à la main à chaque épisode.
+Le registre garde, par projet ou série, le centroïde de chaque locuteur connu dans l'espace
+des features du diarizer (embeddings Resemblyzer 256D ou features MFCC 112D) :
+    1. chaque segment est comparé aux locuteurs connus (plus proche voisin cosinus sur la
+       matrice des centroïdes normalisés : un seul produit matriciel pour tout l'épisode)
+    2. seuls les segments sans correspondance sont clusterisés (clustering habituel du diarizer) ;
+       moins de MIN_CLUSTERED_SEGMENTS segments restants = un seul nouveau locuteur
+    3. un cluster nouveau dont le centroïde ressemble à un locuteur connu (ou à un autre cluster
+       nouveau de l'épisode : k=1 possible) le rejoint, sinon il devient un nouveau locuteur
+    4. centroïdes mis à jour (moyenne pondérée par le nombre de segments), registre réécrit
+Un locuteur garde son identifiant d'un épisode à l'autre : SPEAKER_<id> stable.
+
+Un registre par méthode (<dossier>/<méthode>.npz, sans pickle, écriture atomique), verrouillé
+(flock sur <méthode>.lock) de open() à save() / close() : deux épisodes d'une même série traités
+en parallèle par les workers de queue se suivent au lieu de s'écraser. Des
+réglages de features différents (autre moteur MFCC, autre encodeur...) le rendent inutilisable
+(ignoré, jamais écrasé). Un épisode déjà appris (mêmes bornes de segments) ne met plus à jour
+les centroïdes : relancer la diarization d'un épisode ne le compte pas deux fois.
+
+Usage:
+    from speaker_registry import SpeakerRegistry, label_with_registry
+    registry = SpeakerRegistry.open('storage/app/speaker_registry/ma_serie', params)   # verrou pris
+    try:
+        labels = label_with_registry(features, registry, cluster_unmatched, episode=signature)
+        registry.save(signature)
+    finally:
+        registry.close()                                                                 # verrou rendu
+"""
+
+import fcntl
+import json
+import os
+import sys
+import tempfile
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+REGISTRY_VERSION = 1
+# Cosinus minimal segment / cluster -> locuteur connu, par méthode (AI_SPEAKER_REGISTRY_THRESHOLD)
+DEFAULT_MATCH_THRESHOLDS = {'resemblyzer': 0.75, 'mfcc': 0.85}
+# Épisodes mémorisés (signatures) pour ne pas réapprendre un épisode relancé
+MAX_EPISODES = 500
+# En dessous, les segments sans correspondance forment un seul nouveau locuteur (pas de recherche de k)
+MIN_CLUSTERED_SEGMENTS = 8
+
+
+def match_threshold(method: str) -> float:
+    """Seuil de correspondance (AI_SPEAKER_REGISTRY_THRESHOLD, sinon défaut de la méthode)"""
+    try:
+        return float(os.environ['AI_SPEAKER_REGISTRY_THRESHOLD'])
+    except (KeyError, ValueError):
+        return DEFAULT_MATCH_THRESHOLDS.get(method, 0.8)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+class SpeakerRegistry:
+    """Centroïdes des locuteurs connus + index plus proche voisin (cosinus)"""
+
+    def __init__(self, path: str, params: Dict):
+        self.path = path
+        self.params = dict(params)
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.centroids: Optional[np.ndarray] = None
+        self.counts = np.zeros(0, dtype=np.int64)
+        self.episodes: List[str] = []
+        self.usable = True
+        self._index: Optional[np.ndarray] = None
+        self._lock_file = None
+
+    @classmethod
+    def open(cls, directory: str, params: Dict) -> 'SpeakerRegistry':
+        """
+        Registre de la méthode params['method'] dans directory (vide s'il n'existe pas encore)
+
+        Le verrou exclusif du registre est gardé jusqu'à save() ou close() (attend un autre
+        process en cours sur le même registre).
+
+        Args:
+            directory: Dossier du projet / de la série
+            params: Réglages des features (feature_params / embedding_params du diarizer)
+        """
+        method = params.get('method', 'features')
+        registry = cls(os.path.join(directory, f"{method}.npz"), params)
+        os.makedirs(directory, exist_ok=True)
+        registry._lock_file = open(os.path.join(directory, f"{method}.lock"), 'w')
+        fcntl.flock(registry._lock_file, fcntl.LOCK_EX)
+        if not os.path.exists(registry.path):
+            return registry
+
+        try:
+            with np.load(registry.path, allow_pickle=False) as data:
+                meta = json.loads(str(data['meta']))
+                if meta.get('version') != REGISTRY_VERSION or meta.get('params') != registry.params:
+                    print(f"⚠️  Registre {registry.path} : réglages différents ({meta.get('params')}), ignoré",
+                          file=sys.stderr)
+                    registry.usable = False
+                    registry.close()
+                    return registry
+                registry.ids = data['ids'].astype(np.int64)
+                registry.centroids = data['centroids'].astype(np.float64)
+                registry.counts = data['counts'].astype(np.int64)
+                registry.episodes = list(meta.get('episodes', []))
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️  Registre {registry.path} illisible ({e}), ignoré", file=sys.stderr)
+            registry.usable = False
+            registry.close()
+            return registry
+
+        print(f"📇 Registre locuteurs: {len(registry.ids)} locuteur(s) connu(s), "
+              f"{len(registry.episodes)} épisode(s) ({registry.path})", file=sys.stderr)
+        return registry
+
+    def close(self):
+        """Rendre le verrou du registre (sans écrire)"""
+        if self._lock_file is not None:
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def knows_episode(self, episode: Optional[str]) -> bool:
+        return episode is not None and episode in self.episodes
+
+    def nearest(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Locuteur connu le plus proche de chaque vecteur
+
+        Returns:
+            (lignes du registre, similarités cosinus) ; lignes -1 si le registre est vide
+        """
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float64))
+        if len(self) == 0:
+            return np.full(len(vectors), -1, dtype=np.int64), np.full(len(vectors), -1.0)
+        if self._index is None:
+            self._index = _normalize(self.centroids)
+        similarities = _normalize(vectors) @ self._index.T
+        rows = np.argmax(similarities, axis=1)
+        return rows, similarities[np.arange(len(vectors)), rows]
+
+    def add_speaker(self, centroid: np.ndarray, count: int) -> int:
+        """Nouveau locuteur ; renvoie sa ligne dans le registre"""
+        new_id = int(self.ids.max()) + 1 if len(self) else 0
+        centroid = np.asarray(centroid, dtype=np.float64)[None, :]
+        self.centroids = centroid if self.centroids is None else np.vstack([self.centroids, centroid])
+        self.ids = np.append(self.ids, new_id)
+        self.counts = np.append(self.counts, int(count))
+        self._index = None
+        return len(self) - 1
+
+    def update(self, row: int, vector_sum: np.ndarray, count: int):
+        """Centroïde = moyenne de tous les segments vus (ancienne moyenne pondérée par son effectif)"""
+        total = self.counts[row] + count
+        self.centroids[row] = (self.centroids[row] * self.counts[row] + vector_sum) / total
+        self.counts[row] = total
+        self._index = None
+
+    def save(self, episode: Optional[str] = None):
+        """Écrire le registre (fichier temporaire puis renommage) puis rendre le verrou"""
+        try:
+            self._write(episode)
+        finally:
+            self.close()
+
+    def _write(self, episode: Optional[str]):
+        if not self.usable or self.centroids is None:
+            return
+        if episode is not None and episode not in self.episodes:
+            self.episodes = (self.episodes + [episode])[-MAX_EPISODES:]
+
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        meta = {'version': REGISTRY_VERSION, 'params': self.params, 'episodes': self.episodes}
+        fd, temp_path = tempfile.mkstemp(suffix='.npz.part', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, ids=self.ids, centroids=self.centroids, counts=self.counts,
+                         meta=np.array(json.dumps(meta)))
+            os.replace(temp_path, self.path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+        print(f"💾 Registre locuteurs: {len(self)} locuteur(s) -> {self.path}", file=sys.stderr)
+
+
+def label_with_registry(features: np.ndarray, registry: SpeakerRegistry,
+                        cluster_unmatched: Callable[[np.ndarray], np.ndarray],
+                        threshold: Optional[float] = None, episode: Optional[str] = None) -> np.ndarray:
+    """
+    Locuteurs connus d'abord, clustering du reste, puis mise à jour du registre
+
+    Args:
+        features: (n, d) features / embeddings de l'épisode
+        registry: Registre ouvert (SpeakerRegistry.open)
+        cluster_unmatched: indices des segments sans correspondance (au moins
+            MIN_CLUSTERED_SEGMENTS) -> labels locaux
+        threshold: Cosinus minimal (défaut: match_threshold(méthode))
+        episode: Signature de l'épisode (déjà appris = centroïdes non modifiés)
+
+    Returns:
+        Identifiants stables des locuteurs (n,) : SPEAKER_<id>
+    """
+    features = np.asarray(features, dtype=np.float64)
+    if threshold is None:
+        threshold = match_threshold(registry.params.get('method', ''))
+    learn = not registry.knows_episode(episode)
+
+    rows, similarities = registry.nearest(features)
+    matched = (rows >= 0) & (similarities >= threshold)
+    segment_rows = np.where(matched, rows, -1)
+    print(f"📇 {int(matched.sum())}/{len(features)} segments attribués à des locuteurs connus "
+          f"(seuil {threshold:.2f})", file=sys.stderr)
+
+    # Clustering des seuls segments inconnus
+    unmatched = np.flatnonzero(~matched)
+    if len(unmatched) >= MIN_CLUSTERED_SEGMENTS:
+        local_labels = np.asarray(cluster_unmatched(unmatched))
+    else:
+        # Quelques répliques restantes (invité, figurant) : un seul nouveau locuteur
+        local_labels = np.zeros(len(unmatched), dtype=int)
+
+    known_before = len(registry)
+    for label in np.unique(local_labels):
+        members = unmatched[local_labels == label]
+        centroid = features[members].mean(axis=0)
+        # Un cluster entier peut ressembler à un locuteur connu même si ses segments, un par un, non ;
+        # ou à un cluster nouveau déjà ajouté (le clustering du reste impose k >= 2)
+        row, similarity = registry.nearest(centroid)
+        if row[0] >= 0 and similarity[0] >= threshold:
+            segment_rows[members] = row[0]
+        elif learn:
+            segment_rows[members] = registry.add_speaker(centroid, 0)
+        else:
+            # Épisode déjà appris (registre figé) : locuteur connu le plus proche
+            segment_rows[members] = row[0] if row[0] >= 0 else registry.add_speaker(centroid, 0)
+
+    if learn:
+        for row in np.unique(segment_rows):
+            members = segment_rows == row
+            registry.update(int(row), features[members].sum(axis=0), int(members.sum()))
+
+    new_speakers = len(registry) - known_before
+    print(f"📇 Locuteurs: {len(np.unique(segment_rows))} dans l'épisode, {new_speakers} nouveau(x) "
+          f"dans le registre", file=sys.stderr)
+    return registry.ids[segment_rows]
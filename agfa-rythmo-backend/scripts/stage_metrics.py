@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Mesures par étape du pipeline IA (temps, CPU, pic mémoire, I/O) pour le capacity planning
+
+Chaque étape enregistre :
+    - wall_seconds / cpu_seconds (CPU du process + des sous-process attendus : Demucs, pool Whisper)
+    - peak_rss_mb : pic de RSS du process pendant l'étape (échantillonné toutes les SAMPLE_INTERVAL_SECONDS)
+    - read_mb / write_mb : octets lus / écrits sur le stockage (/proc/self/io, Linux)
+    - audio_seconds : durée d'audio traitée par l'étape (débit = audio_seconds / wall_seconds)
+
+Le rapport part dans metadata['performance'] du JSON de sortie et, en option, dans un fichier
+séparé (--metrics-json). Avec AI_PROFILE_DIR, chaque étape est profilée (cProfile) dans
+<AI_PROFILE_DIR>/<date>_<pid>_<étape>.prof (lisible avec snakeviz ou pstats).
+
+Usage:
+    from stage_metrics import get_metrics
+    with get_metrics().stage('clustering', audio_seconds=duration):
+        ...
+"""
+
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from progress import current_rss_mb
+
+# Période d'échantillonnage du RSS (pic par étape)
+SAMPLE_INTERVAL_SECONDS = 0.05
+
+# Ordre d'affichage des étapes connues (les autres suivent dans l'ordre d'exécution)
+STAGE_ORDER = [
+    'audio_extraction', 'vocal_separation', 'model_load', 'transcription',
+    'diarization', 'speaker_change', 'feature_extraction', 'clustering', 'serialization',
+]
+
+
+def _read_proc_io() -> Dict[str, int]:
+    """Compteurs /proc/self/io (vide hors Linux ou sans permission)"""
+    counters = {}
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                key, _, value = line.partition(':')
+                counters[key.strip()] = int(value)
+    except (OSError, ValueError):
+        pass
+    return counters
+
+
+def _cpu_seconds() -> float:
+    """CPU user + system du process et de ses sous-process terminés"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+class StageMetrics:
+    """Collecteur de mesures par étape (étapes imbriquées autorisées)"""
+
+    def __init__(self, profile_dir: Optional[str] = None):
+        """
+        Args:
+            profile_dir: Dossier des profils cProfile (défaut: $AI_PROFILE_DIR, vide = désactivé)
+        """
+        self.profile_dir = profile_dir if profile_dir is not None else os.getenv('AI_PROFILE_DIR', '')
+        self.stages: Dict[str, Dict] = {}
+        self._active: List[Dict] = []
+        self._lock = threading.Lock()
+        self._sampler: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._profiling = False
+        self._started = time.perf_counter()
+
+    # ------------------------------------------------------------------
+    # Échantillonnage du RSS
+    # ------------------------------------------------------------------
+
+    def _sample_loop(self):
+        while not self._stop.wait(SAMPLE_INTERVAL_SECONDS):
+            self._sample()
+
+    def _sample(self):
+        rss = current_rss_mb()
+        if rss is None:
+            return
+        with self._lock:
+            for record in self._active:
+                if rss > record['peak_rss_mb']:
+                    record['peak_rss_mb'] = rss
+
+    def _ensure_sampler(self):
+        if self._sampler is None or not self._sampler.is_alive():
+            self._stop.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, name='stage-metrics', daemon=True)
+            self._sampler.start()
+
+    def close(self):
+        """Arrêter le thread d'échantillonnage"""
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=1.0)
+            self._sampler = None
+
+    # ------------------------------------------------------------------
+    # Étapes
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def stage(self, name: str, audio_seconds: Optional[float] = None):
+        """
+        Mesurer une étape
+
+        Une étape exécutée plusieurs fois (ex: un appel par segment) est cumulée.
+        Le dict renvoyé permet de compléter la mesure en cours (record['audio_seconds'] = ...).
+        """
+        record = {'peak_rss_mb': current_rss_mb() or 0.0, 'audio_seconds': audio_seconds}
+        io_before = _read_proc_io()
+        cpu_before = _cpu_seconds()
+        wall_before = time.perf_counter()
+
+        with self._lock:
+            self._active.append(record)
+        self._ensure_sampler()
+
+        profiler = self._start_profiler()
+        try:
+            yield record
+        finally:
+            profile_path = self._stop_profiler(profiler, name)
+            self._sample()
+            with self._lock:
+                self._active.remove(record)
+
+            io_after = _read_proc_io()
+            measured = {
+                'wall_seconds': time.perf_counter() - wall_before,
+                'cpu_seconds': _cpu_seconds() - cpu_before,
+                'peak_rss_mb': record['peak_rss_mb'],
+                'read_mb': (io_after.get('read_bytes', 0) - io_before.get('read_bytes', 0)) / (1024 * 1024),
+                'write_mb': (io_after.get('write_bytes', 0) - io_before.get('write_bytes', 0)) / (1024 * 1024),
+                'audio_seconds': record.get('audio_seconds'),
+            }
+            if profile_path:
+                measured['profile'] = profile_path
+            self._merge(name, measured)
+
+    def _merge(self, name: str, measured: Dict):
+        with self._lock:
+            existing = self.stages.get(name)
+            if existing is None:
+                measured['calls'] = 1
+                self.stages[name] = measured
+                return
+
+            existing['calls'] += 1
+            for key in ('wall_seconds', 'cpu_seconds', 'read_mb', 'write_mb'):
+                existing[key] += measured[key]
+            existing['peak_rss_mb'] = max(existing['peak_rss_mb'], measured['peak_rss_mb'])
+            if measured['audio_seconds'] is not None:
+                existing['audio_seconds'] = (existing['audio_seconds'] or 0.0) + measured['audio_seconds']
+            if 'profile' in measured:
+                existing['profile'] = measured['profile']
+
+    # ------------------------------------------------------------------
+    # Profilage (AI_PROFILE_DIR)
+    # ------------------------------------------------------------------
+
+    def _start_profiler(self):
+        # Un seul profileur actif à la fois : les étapes imbriquées sont couvertes par l'étape parente
+        if not self.profile_dir or self._profiling:
+            return None
+        import cProfile
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Autre profileur déjà actif dans le process
+            return None
+        self._profiling = True
+        return profiler
+
+    def _stop_profiler(self, profiler, name: str) -> Optional[str]:
+        if profiler is None:
+            return None
+        profiler.disable()
+        self._profiling = False
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}_{os.getpid()}_{name}.prof")
+        profiler.dump_stats(path)
+        print(f"[PROFILE] {name}: {path}", file=sys.stderr)
+        return path
+
+    # ------------------------------------------------------------------
+    # Rapport
+    # ------------------------------------------------------------------
+
+    def report(self) -> Dict:
+        """Rapport sérialisable (metadata['performance'])"""
+        with self._lock:
+            names = sorted(self.stages, key=lambda n: STAGE_ORDER.index(n) if n in STAGE_ORDER else len(STAGE_ORDER))
+            stages = {}
+            for name in names:
+                stage = dict(self.stages[name])
+                for key in ('wall_seconds', 'cpu_seconds', 'read_mb', 'write_mb', 'peak_rss_mb'):
+                    stage[key] = round(stage[key], 3)
+                if stage['audio_seconds']:
+                    stage['audio_seconds'] = round(stage['audio_seconds'], 2)
+                    # Facteur temps réel : secondes d'audio traitées par seconde de calcul
+                    stage['realtime_factor'] = round(stage['audio_seconds'] / max(stage['wall_seconds'], 1e-6), 2)
+                stages[name] = stage
+
+        return {
+            'stages': stages,
+            'total_wall_seconds': round(time.perf_counter() - self._started, 3),
+            'peak_rss_mb': max((stage['peak_rss_mb'] for stage in stages.values()), default=None),
+            'cpu_count': os.cpu_count(),
+            'pid': os.getpid(),
+        }
+
+    def write(self, path: str) -> Dict:
+        """Écrire le rapport dans un fichier JSON séparé"""
+        report = self.report()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        return report
+
+    def print_summary(self):
+        """Tableau récapitulatif sur stderr"""
+        report = self.report()
+        print("[METRICS] stage               wall(s)   cpu(s)  peak(MB)  read(MB) write(MB)", file=sys.stderr)
+        for name, stage in report['stages'].items():
+            print(f"[METRICS] {name:<18} {stage['wall_seconds']:>8.2f} {stage['cpu_seconds']:>8.2f} "
+                  f"{stage['peak_rss_mb']:>9.1f} {stage['read_mb']:>9.1f} {stage['write_mb']:>9.1f}",
+                  file=sys.stderr)
+
+
+_metrics: Optional[StageMetrics] = None
+
+
+def get_metrics() -> StageMetrics:
+    """Collecteur du job en cours (créé au premier appel)"""
+    global _metrics
+    if _metrics is None:
+        _metrics = StageMetrics()
+    return _metrics
+
+
+def set_metrics(metrics: Optional[StageMetrics]):
+    """Remplacer le collecteur (un par job : process_video), None = recréer au prochain appel"""
+    global _metrics
+    if _metrics is not None and _metrics is not metrics:
+        _metrics.close()
+    _metrics = metrics
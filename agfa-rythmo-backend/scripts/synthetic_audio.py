@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Audio synthétique multi-locuteurs déterministe (fixtures de benchmark)
+
+Chaque "locuteur" est une voix harmonique (fondamentale, vibrato, pente spectrale et formants
+propres), articulée en syllabes. Les répliques alternent entre locuteurs, séparées par des
+silences, sur un fond musical (accords) optionnel. La vérité terrain (segments + locuteur)
+est renvoyée avec l'audio : pas besoin de vrais fichiers ni de téléchargements.
+
+Même graine => même audio, à l'échantillon près.
+
+Usage:
+    from synthetic_audio import generate_episode
+    audio, segments = generate_episode(600, seed=0)   # 10 minutes, 16kHz mono float32
+
+    python synthetic_audio.py episode.wav --minutes 10 --speakers 4
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+SAMPLE_RATE = 16000
+
+# Profils de voix : fondamentale (Hz), pente spectrale (dB/harmonique), formants (Hz)
+VOICE_PROFILES = [
+    {'name': 'grave', 'f0': 105.0, 'tilt_db': -4.0, 'formants': (600, 1100, 2500)},
+    {'name': 'aigue', 'f0': 235.0, 'tilt_db': -6.0, 'formants': (850, 1900, 3000)},
+    {'name': 'medium', 'f0': 160.0, 'tilt_db': -3.0, 'formants': (500, 1500, 2600)},
+    {'name': 'enfant', 'f0': 310.0, 'tilt_db': -7.0, 'formants': (1000, 2300, 3400)},
+    {'name': 'baryton', 'f0': 125.0, 'tilt_db': -5.0, 'formants': (450, 900, 2300)},
+    {'name': 'soprano', 'f0': 270.0, 'tilt_db': -4.5, 'formants': (750, 2100, 3200)},
+]
+
+# Nombre d'harmoniques synthétisées (au-delà de Nyquist, ignorées)
+MAX_HARMONICS = 24
+
+
+def _formant_gain(frequencies: np.ndarray, formants: Tuple[int, ...], bandwidth: float = 180.0) -> np.ndarray:
+    """Enveloppe spectrale : somme de résonances gaussiennes autour des formants"""
+    gain = np.full_like(frequencies, 0.15)
+    for formant in formants:
+        gain += np.exp(-0.5 * ((frequencies - formant) / bandwidth) ** 2)
+    return gain
+
+
+def synthesize_voice(duration: float, profile: Dict, rng: np.random.Generator,
+                     sr: int = SAMPLE_RATE) -> np.ndarray:
+    """
+    Une réplique : voix harmonique avec intonation, vibrato et syllabes (~4 Hz)
+
+    Args:
+        duration: Durée (secondes)
+        profile: Entrée de VOICE_PROFILES
+        rng: Générateur aléatoire (déterminisme)
+        sr: Fréquence d'échantillonnage
+
+    Returns:
+        float32 (n,), crête ~0.5
+    """
+    n = int(duration * sr)
+    t = np.arange(n, dtype=np.float64) / sr
+
+    # Intonation lente + vibrato, fondamentale légèrement différente à chaque réplique
+    f0 = profile['f0'] * rng.uniform(0.94, 1.06)
+    contour = 1.0 + 0.06 * np.sin(2 * np.pi * rng.uniform(0.2, 0.5) * t + rng.uniform(0, 2 * np.pi))
+    vibrato = 1.0 + 0.01 * np.sin(2 * np.pi * 5.5 * t)
+    phase = 2 * np.pi * np.cumsum(f0 * contour * vibrato) / sr
+
+    n_harmonics = min(MAX_HARMONICS, int((sr / 2) // (f0 * 1.1)))
+    harmonics = np.arange(1, n_harmonics + 1)
+    amplitudes = (10 ** (profile['tilt_db'] * (harmonics - 1) / 20)
+                  * _formant_gain(harmonics * f0, profile['formants']))
+
+    voice = np.zeros(n, dtype=np.float64)
+    for harmonic, amplitude in zip(harmonics, amplitudes):
+        voice += amplitude * np.sin(harmonic * phase)
+
+    # Syllabes : enveloppe d'amplitude à ~4 Hz, avec consonnes (bruit) aux attaques
+    syllable_rate = rng.uniform(3.5, 5.0)
+    envelope = np.clip(np.sin(np.pi * syllable_rate * t) ** 2, 0, 1) ** 0.6
+    consonants = rng.normal(0, 0.05, n) * (envelope < 0.2)
+    voice = voice / (np.max(np.abs(voice)) + 1e-9) * envelope + consonants
+
+    # Fondu d'entrée / sortie (pas de clics)
+    fade = min(n // 2, int(0.02 * sr))
+    if fade > 0:
+        ramp = np.linspace(0.0, 1.0, fade)
+        voice[:fade] *= ramp
+        voice[-fade:] *= ramp[::-1]
+
+    return (0.5 * voice).astype(np.float32)
+
+
+def music_bed(n: int, rng: np.random.Generator, sr: int = SAMPLE_RATE, level: float = 0.06) -> np.ndarray:
+    """Fond musical : accords tenus changeant toutes les 2-4 s (sinus + harmoniques douces)"""
+    bed = np.zeros(n, dtype=np.float32)
+    roots = [130.81, 146.83, 164.81, 174.61, 196.0, 220.0]  # Do3..La3
+    position = 0
+    while position < n:
+        length = min(n - position, int(rng.uniform(2.0, 4.0) * sr))
+        t = np.arange(length, dtype=np.float64) / sr
+        root = roots[rng.integers(len(roots))]
+        chord = np.zeros(length, dtype=np.float64)
+        for ratio in (1.0, 1.25, 1.5):  # Accord majeur
+            for harmonic, amplitude in ((1, 1.0), (2, 0.3), (3, 0.1)):
+                chord += amplitude * np.sin(2 * np.pi * root * ratio * harmonic * t)
+        fade = min(length // 2, int(0.1 * sr))
+        if fade > 0:
+            ramp = np.linspace(0.0, 1.0, fade)
+            chord[:fade] *= ramp
+            chord[-fade:] *= ramp[::-1]
+        bed[position:position + length] = (level * chord / 3.0).astype(np.float32)
+        position += length
+    return bed
+
+
+def generate_episode(duration_seconds: float, n_speakers: int = 3, seed: int = 0, sr: int = SAMPLE_RATE,
+                     music: bool = True, noise_level: float = 0.003) -> Tuple[np.ndarray, List[Dict]]:
+    """
+    Épisode synthétique : répliques de n_speakers voix séparées par des silences
+
+    Args:
+        duration_seconds: Durée totale
+        n_speakers: Nombre de locuteurs (<= len(VOICE_PROFILES))
+        seed: Graine (même graine => même audio)
+        sr: Fréquence d'échantillonnage
+        music: Ajouter un fond musical sur ~1/3 des scènes
+        noise_level: Bruit de fond (écart-type)
+
+    Returns:
+        (audio float32 mono, segments de vérité terrain [{start, end, speaker, text}])
+    """
+    if not 1 <= n_speakers <= len(VOICE_PROFILES):
+        raise ValueError(f"n_speakers doit être entre 1 et {len(VOICE_PROFILES)}")
+
+    rng = np.random.default_rng(seed)
+    n = int(duration_seconds * sr)
+    audio = rng.normal(0, noise_level, n).astype(np.float32)
+    segments: List[Dict] = []
+
+    # Scènes de ~60 s : fond musical sur une scène sur trois
+    if music:
+        scene = 60 * sr
+        for scene_start in range(0, n, scene):
+            if rng.random() < 1 / 3:
+                scene_end = min(n, scene_start + scene)
+                audio[scene_start:scene_end] += music_bed(scene_end - scene_start, rng, sr)
+
+    position = int(rng.uniform(0.3, 1.0) * sr)
+    speaker = int(rng.integers(n_speakers))
+    while True:
+        duration = rng.uniform(1.0, 6.0)
+        length = int(duration * sr)
+        if position + length > n:
+            break
+
+        audio[position:position + length] += synthesize_voice(duration, VOICE_PROFILES[speaker], rng, sr)
+        segments.append({
+            'id': len(segments),
+            'start': round(position / sr, 3),
+            'end': round((position + length) / sr, 3),
+            'speaker': f"SPEAKER_{speaker:02d}",
+            'text': f" réplique {len(segments)} ({VOICE_PROFILES[speaker]['name']})",
+        })
+
+        # Silence entre répliques, changement de locuteur 3 fois sur 4
+        position += length + int(rng.uniform(0.3, 2.0) * sr)
+        if n_speakers > 1 and rng.random() < 0.75:
+            speaker = int((speaker + rng.integers(1, n_speakers)) % n_speakers)
+
+    np.clip(audio, -1.0, 1.0, out=audio)
+    return audio, segments
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Générer un épisode synthétique multi-locuteurs (WAV + vérité terrain)")
+    parser.add_argument('output_wav', help="Fichier WAV de sortie")
+    parser.add_argument('--minutes', type=float, default=1.0, help="Durée (défaut: 1)")
+    parser.add_argument('--speakers', type=int, default=3, help="Nombre de locuteurs (défaut: 3)")
+    parser.add_argument('--seed', type=int, default=0, help="Graine (défaut: 0)")
+    parser.add_argument('--no-music', action='store_true', help="Sans fond musical")
+    args = parser.parse_args()
+
+    import soundfile as sf
+
+    audio, segments = generate_episode(args.minutes * 60, args.speakers, args.seed, music=not args.no_music)
+    sf.write(args.output_wav, audio, SAMPLE_RATE, subtype='PCM_16')
+
+    truth_path = args.output_wav.rsplit('.', 1)[0] + '.segments.json'
+    with open(truth_path, 'w', encoding='utf-8') as f:
+        json.dump({'segments': segments, 'speakers': args.speakers}, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ {args.output_wav}: {len(audio) / SAMPLE_RATE:.0f}s, {len(segments)} répliques, "
+          f"vérité terrain: {truth_path}", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Registre des locuteurs (speaker_registry.py) : épisode suivant = casting connu + quelques répliques
+d'invités, clusterisées seules (MFCC et Resemblyzer)
+
+    cd scripts && python -m pytest tests
+"""
+
+import json
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import resemblyzer_diarization  # noqa: E402
+from feature_sidecar import default_sidecar_path, save_sidecar  # noqa: E402
+from resemblyzer_diarization import _label_segments, embedding_params  # noqa: E402
+from simple_diarization import feature_params, label_segments  # noqa: E402
+from speaker_registry import MIN_CLUSTERED_SEGMENTS, SpeakerRegistry  # noqa: E402
+
+N_KNOWN = 3
+
+
+def _speakers(dim: int, n: int, seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).normal(size=(n, dim))
+
+
+def _episode(centers: np.ndarray, speakers: list, seed: int, offset: float = 0.0):
+    rng = np.random.default_rng(seed)
+    features = centers[speakers] + 0.05 * rng.normal(size=(len(speakers), centers.shape[1]))
+    segments = [{'start': offset + 2.0 * i, 'end': offset + 2.0 * i + 1.5, 'text': f" réplique {i}"}
+                for i in range(len(speakers))]
+    return segments, list(features)
+
+
+def _voice_info(n: int) -> list:
+    return [{'tessiture': 'Unknown', 'timbre': 'Neutre', 'voice_confidence': 0.0, 'pitch_mean': 150.0}] * n
+
+
+def _mfcc_labels(directory: str, speakers: list, centers: np.ndarray, seed: int, offset: float) -> list:
+    segments, features = _episode(centers, speakers, seed, offset)
+    registry = SpeakerRegistry.open(directory, feature_params())
+    result = label_segments(segments, features, _voice_info(len(features)), list(range(len(features))),
+                            max_speakers=10, registry=registry)
+    return [dialogue['speaker'] for dialogue in result['segments']]
+
+
+def _embedding_labels(directory: str, speakers: list, centers: np.ndarray, seed: int, offset: float) -> list:
+    segments, embeddings = _episode(centers, speakers, seed, offset)
+    embeddings = [e / np.linalg.norm(e) for e in embeddings]
+    registry = SpeakerRegistry.open(directory, embedding_params())
+    result = _label_segments(segments, embeddings, 10, registry)
+    return [segment['speaker'] for segment in result['segments']]
+
+
+@pytest.mark.parametrize('labeler,dim', [(_mfcc_labels, 112), (_embedding_labels, 256)])
+@pytest.mark.parametrize('n_guest', range(2, MIN_CLUSTERED_SEGMENTS + 1))
+def test_known_cast_plus_few_guest_lines(tmp_path, labeler, dim, n_guest):
+    centers = _speakers(dim, N_KNOWN + 1, seed=0)
+    cast = [i % N_KNOWN for i in range(30)]
+
+    first = labeler(str(tmp_path), cast, centers, seed=1, offset=0.0)
+    assert len(set(first)) == N_KNOWN
+    known = dict(zip(cast, first))
+
+    guest = N_KNOWN
+    second_speakers = cast[:20] + [guest] * n_guest
+    second = labeler(str(tmp_path), second_speakers, centers, seed=2, offset=1000.0)
+
+    # Casting connu : mêmes identifiants ; invité : un seul nouveau locuteur
+    assert second[:20] == [known[s] for s in cast[:20]]
+    guest_labels = set(second[20:])
+    assert len(guest_labels) == 1
+    assert guest_labels.isdisjoint(known.values())
+
+
+def test_registry_lock_serializes_writers(tmp_path):
+    first = SpeakerRegistry.open(str(tmp_path), embedding_params())
+    opened = threading.Event()
+
+    def second():
+        SpeakerRegistry.open(str(tmp_path), embedding_params()).close()
+        opened.set()
+
+    thread = threading.Thread(target=second)
+    thread.start()
+    assert not opened.wait(0.3)
+    first.add_speaker(np.ones(256), 1)
+    first.save('episode')
+    thread.join(5)
+    assert opened.is_set()
+
+
+def test_recluster_uses_sidecar_embedding_mode(tmp_path, monkeypatch):
+    centers = _speakers(256, N_KNOWN, seed=0)
+    cast = [i % N_KNOWN for i in range(30)]
+    registry_dir = str(tmp_path / 'registry')
+    _embedding_labels(registry_dir, cast, centers, seed=1, offset=0.0)
+    registry_path = os.path.join(registry_dir, 'resemblyzer.npz')
+    with open(registry_path, 'rb') as f:
+        before = f.read()
+
+    # Sidecar d'embeddings 'track', reclustering sans --embedding-mode (défaut : 'segment')
+    segments, embeddings = _episode(centers, cast, seed=2, offset=1000.0)
+    transcription_json = str(tmp_path / 'transcription.json')
+    output_json = str(tmp_path / 'output.json')
+    with open(transcription_json, 'w', encoding='utf-8') as f:
+        json.dump({'segments': segments}, f)
+    save_sidecar(default_sidecar_path(output_json), 'key', segments, np.array(embeddings),
+                 list(range(len(embeddings))), params=embedding_params('track'))
+
+    monkeypatch.delenv('AI_RESEMBLYZER_EMBEDDING_MODE', raising=False)
+    monkeypatch.setattr(sys, 'argv', ['resemblyzer_diarization.py', 'audio.wav', transcription_json, output_json,
+                                      '--recluster', '--speaker-registry', registry_dir])
+    resemblyzer_diarization.main()
+
+    with open(registry_path, 'rb') as f:
+        assert f.read() == before
+    with open(output_json, encoding='utf-8') as f:
+        assert len({segment['speaker'] for segment in json.load(f)['segments']}) == N_KNOWN
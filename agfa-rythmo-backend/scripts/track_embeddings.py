@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Embeddings Resemblyzer "piste" : fenêtres glissantes sur toute la piste, moyennées par segment
+(AI_RESEMBLYZER_EMBEDDING_MODE=track)
+
+Le mode historique (resemblyzer_diarization.extract_embeddings_from_array) prétraite chaque
+segment (rééchantillonnage, volume, coupe des silences) puis lance embed_utterance : une
+petite passe de l'encodeur par segment, des centaines sur un long métrage. Ici :
+    - une grille unique de fenêtres partielles (160 frames mel = 1.6s, ~1.3 fenêtre/s comme
+      embed_utterance) sur l'axe temps de la piste ; seules les fenêtres qui touchent un
+      segment sont calculées
+    - mel calculé par zone continue de fenêtres (audio rééchantillonné à 16kHz une seule fois
+      par zone), encodeur appelé par lots de TRACK_BATCH_WINDOWS fenêtres
+    - embedding d'un segment = moyenne des embeddings partiels qui le chevauchent, pondérée
+      par la durée de chevauchement, puis normalisée L2 (comme embed_utterance)
+
+Les valeurs diffèrent du mode 'segment' : pas de coupe des silences, gain de volume unique
+(calculé sur la parole de toute la piste), et les fenêtres débordent sur le contexte des
+segments plus courts que 1.6s.
+
+Usage:
+    from track_embeddings import extract_embeddings_track
+    embeddings = extract_embeddings_track(encoder, audio, 16000, segments)   # [256D] alignés sur segments
+"""
+
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Fenêtres partielles par passe de l'encodeur (64 x 160 x 40 float32 = 1.6MB de mel)
+TRACK_BATCH_WINDOWS = 64
+# Fenêtres partielles par seconde (rate par défaut de VoiceEncoder.embed_utterance)
+PARTIALS_PER_SECOND = 1.3
+# Marge de rééchantillonnage autour d'une zone (échantillons source, évite les effets de bord)
+RESAMPLE_MARGIN = 1024
+
+
+def _window_grid(segments: List[Dict], frames_per_second: float, window: int,
+                 step: int) -> Tuple[np.ndarray, List[Tuple[int, int]]]:
+    """
+    Fenêtres de la grille à calculer
+
+    Returns:
+        (indices triés des fenêtres, [(frame début, frame fin) de chaque segment])
+    """
+    bounds = []
+    needed = []
+    for segment in segments:
+        first_frame = max(0, int(np.floor(segment['start'] * frames_per_second)))
+        last_frame = max(first_frame + 1, int(np.ceil(segment['end'] * frames_per_second)))
+        bounds.append((first_frame, last_frame))
+        # Fenêtres [w*step, w*step + window) qui chevauchent [first_frame, last_frame)
+        w0 = max(0, -(-(first_frame - window + 1) // step))
+        w1 = (last_frame - 1) // step
+        needed.append(np.arange(w0, w1 + 1))
+
+    if not needed:
+        return np.zeros(0, dtype=np.int64), bounds
+    return np.unique(np.concatenate(needed)), bounds
+
+
+def _consecutive_runs(indices: np.ndarray) -> List[np.ndarray]:
+    """[3, 4, 5, 9, 10] -> [[3, 4, 5], [9, 10]]"""
+    breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+    return np.split(indices, breaks)
+
+
+def _read_16k(audio: np.ndarray, sr: int, target_sr: int, start: int, end: int) -> np.ndarray:
+    """Échantillons [start, end) à target_sr, complétés par des zéros hors de la piste"""
+    if sr == target_sr:
+        chunk = np.zeros(end - start, dtype=np.float32)
+        lo, hi = max(0, start), min(len(audio), end)
+        if hi > lo:
+            chunk[lo - start:hi - start] = audio[lo:hi]
+        return chunk
+
+    import librosa
+
+    # Zone source correspondante + marge, rééchantillonnée puis recoupée
+    ratio = sr / target_sr
+    src_start = max(0, int(np.floor(start * ratio)) - RESAMPLE_MARGIN)
+    src_end = min(len(audio), int(np.ceil(end * ratio)) + RESAMPLE_MARGIN)
+    chunk = np.zeros(end - start, dtype=np.float32)
+    if src_end <= src_start:
+        return chunk
+    resampled = librosa.resample(np.asarray(audio[src_start:src_end], dtype=np.float32),
+                                 orig_sr=sr, target_sr=target_sr)
+    offset = int(round(src_start / ratio))
+    lo, hi = max(start, offset), min(end, offset + len(resampled))
+    if hi > lo:
+        chunk[lo - start:hi - start] = resampled[lo - offset:hi - offset]
+    return chunk
+
+
+def _speech_gain(audio: np.ndarray, sr: int, segments: List[Dict], target_dbfs: float) -> float:
+    """Gain de normalize_volume (increase_only) calculé sur la parole de toute la piste"""
+    total, count = 0.0, 0
+    for segment in segments:
+        samples = audio[max(0, int(segment['start'] * sr)):int(segment['end'] * sr)]
+        if len(samples):
+            samples = np.asarray(samples, dtype=np.float64)
+            total += float(np.dot(samples, samples))
+            count += len(samples)
+    if count == 0 or total <= 0:
+        return 1.0
+    change = target_dbfs - 10 * np.log10(total / count)
+    return float(10 ** (change / 20)) if change > 0 else 1.0
+
+
+def extract_embeddings_track(encoder, audio: np.ndarray, sr: int, segments: List[Dict],
+                             batch_windows: int = TRACK_BATCH_WINDOWS,
+                             on_progress: Optional[Callable[[int, int], None]] = None) -> List[np.ndarray]:
+    """
+    Embeddings 256D des segments par fenêtres glissantes sur la piste
+
+    Args:
+        encoder: VoiceEncoder Resemblyzer (torch) ou OnnxVoiceEncoder
+        audio: Audio mono (np.memmap accepté : seules les zones de parole sont lues)
+        sr: Fréquence d'échantillonnage de audio (16kHz évite tout rééchantillonnage)
+        segments: Segments Whisper (start/end)
+        batch_windows: Fenêtres par passe de l'encodeur
+        on_progress: Rappel (fenêtres calculées, total) après chaque lot
+
+    Returns:
+        Liste des embeddings (256D, norme 1) alignée sur segments
+    """
+    import librosa
+    from resemblyzer import hparams
+
+    if audio.ndim > 1:
+        audio = audio.mean(axis=1)
+
+    target_sr = hparams.sampling_rate
+    hop = int(target_sr * hparams.mel_window_step / 1000)
+    n_fft = int(target_sr * hparams.mel_window_length / 1000)
+    window = hparams.partials_n_frames
+    frames_per_second = target_sr / hop
+    step = max(1, int(np.round(frames_per_second / PARTIALS_PER_SECOND)))
+
+    windows, bounds = _window_grid(segments, frames_per_second, window, step)
+    gain = _speech_gain(audio, sr, segments, hparams.audio_norm_target_dBFS)
+    partials = np.zeros((len(windows), hparams.model_embedding_size), dtype=np.float32)
+
+    for batch_start in range(0, len(windows), batch_windows):
+        batch = windows[batch_start:batch_start + batch_windows]
+        mels = []
+        for run in _consecutive_runs(batch):
+            # Frames mel [first, last) de la zone ; center=False sur la zone élargie de n_fft/2
+            # = mêmes frames que le mel centré de toute la piste
+            first = int(run[0]) * step
+            last = int(run[-1]) * step + window
+            start_sample = first * hop - n_fft // 2
+            end_sample = (last - 1) * hop + n_fft - n_fft // 2
+            wav = _read_16k(audio, sr, target_sr, start_sample, end_sample)
+            if gain != 1.0:
+                wav *= gain
+            mel = librosa.feature.melspectrogram(y=wav, sr=target_sr, n_fft=n_fft, hop_length=hop,
+                                                 n_mels=hparams.mel_n_channels, center=False)
+            mel = mel.astype(np.float32).T
+            for w in run:
+                offset = (int(w) - int(run[0])) * step
+                mels.append(mel[offset:offset + window])
+
+        if hasattr(encoder, 'embed_mels'):
+            # Backend ONNX (voice_encoder_onnx.OnnxVoiceEncoder) : numpy en entrée / sortie
+            partials[batch_start:batch_start + len(batch)] = encoder.embed_mels(np.stack(mels))
+        else:
+            import torch
+
+            with torch.no_grad():
+                batch_mels = torch.from_numpy(np.stack(mels)).to(encoder.device)
+                partials[batch_start:batch_start + len(batch)] = encoder(batch_mels).cpu().numpy()
+
+        if on_progress is not None:
+            on_progress(batch_start + len(batch), len(windows))
+
+    # Moyenne des fenêtres chevauchantes, pondérée par le chevauchement (en frames)
+    embeddings = []
+    for first_frame, last_frame in bounds:
+        w0 = max(0, -(-(first_frame - window + 1) // step))
+        w1 = (last_frame - 1) // step
+        rows = np.searchsorted(windows, np.arange(w0, w1 + 1))
+        starts = np.arange(w0, w1 + 1) * step
+        overlap = np.minimum(last_frame, starts + window) - np.maximum(first_frame, starts)
+        raw = overlap.astype(np.float32) @ partials[rows]
+        embeddings.append(raw / (np.linalg.norm(raw) + 1e-12))
+
+    return embeddings
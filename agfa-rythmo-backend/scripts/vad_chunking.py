@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+Découpage de l'audio en chunks de parole (VAD) pour la transcription en streaming
+
+Au lieu de passer la vidéo entière à Whisper (mémoire et latence proportionnelles à la durée),
+on détecte les zones de parole avec un VAD léger (webrtcvad, repli sur un détecteur d'énergie),
+on les regroupe en chunks bornés (AI_TRANSCRIPTION_CHUNK_SECONDS) et on remet les timestamps
+des segments Whisper en temps absolu.
+
+Les silences entre zones de parole ne sont jamais envoyés au décodeur : un chunk est la
+concaténation de plusieurs zones de parole, avec la table de correspondance vers le temps source.
+
+Usage:
+    from vad_chunking import detect_speech_regions, plan_chunks, remap_segments
+    regions = detect_speech_regions(audio, 16000)
+    for chunk in plan_chunks(audio, regions, 16000, max_chunk_seconds=30):
+        result = model.transcribe(chunk.audio(audio))
+        segments += remap_segments(result['segments'], chunk, 16000, first_id=len(segments))
+
+    python vad_chunking.py audio.wav   # Diagnostic : zones de parole et chunks
+"""
+
+import bisect
+import sys
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# Taille des frames VAD (webrtcvad accepte 10, 20 ou 30 ms)
+FRAME_MS = 30
+# Nombre de frames converties en PCM 16-bit à la fois (borne la mémoire sur les longs fichiers)
+FRAMES_PER_BLOCK = 2000
+
+
+def _frame_flags_webrtc(audio: np.ndarray, sr: int, aggressiveness: int) -> np.ndarray:
+    """Parole / non-parole par frame avec webrtcvad (ImportError si non installé)"""
+    import webrtcvad
+
+    vad = webrtcvad.Vad(aggressiveness)
+    frame_len = sr * FRAME_MS // 1000
+    n_frames = len(audio) // frame_len
+    flags = np.zeros(n_frames, dtype=bool)
+
+    for block_start in range(0, n_frames, FRAMES_PER_BLOCK):
+        block_end = min(n_frames, block_start + FRAMES_PER_BLOCK)
+        block = audio[block_start * frame_len:block_end * frame_len]
+        pcm = (np.clip(block, -1.0, 1.0) * 32767).astype('<i2').tobytes()
+        frame_bytes = frame_len * 2
+        for i in range(block_end - block_start):
+            flags[block_start + i] = vad.is_speech(pcm[i * frame_bytes:(i + 1) * frame_bytes], sr)
+
+    return flags
+
+
+def frame_energy_db(audio: np.ndarray, sr: int) -> np.ndarray:
+    """Énergie RMS (dBFS) par frame de FRAME_MS"""
+    frame_len = sr * FRAME_MS // 1000
+    n_frames = len(audio) // frame_len
+    energies = np.empty(n_frames, dtype=np.float32)
+
+    for block_start in range(0, n_frames, FRAMES_PER_BLOCK):
+        block_end = min(n_frames, block_start + FRAMES_PER_BLOCK)
+        block = np.asarray(audio[block_start * frame_len:block_end * frame_len], dtype=np.float32)
+        frames = block.reshape(block_end - block_start, frame_len)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        energies[block_start:block_end] = 20 * np.log10(rms + 1e-10)
+
+    return energies
+
+
+def _frame_flags_energy(audio: np.ndarray, sr: int) -> np.ndarray:
+    """Repli sans webrtcvad : seuil d'énergie adaptatif (bruit de fond + 12 dB)"""
+    energies = frame_energy_db(audio, sr)
+    if len(energies) == 0:
+        return np.zeros(0, dtype=bool)
+
+    noise_floor = np.percentile(energies, 10)
+    threshold = max(noise_floor + 12.0, -55.0)
+    return energies > threshold
+
+
+def speech_frame_flags(audio: np.ndarray, sr: int, method: str = 'auto',
+                       aggressiveness: int = 2) -> Tuple[np.ndarray, str]:
+    """
+    Détection parole / non-parole par frame
+
+    Args:
+        audio: Audio mono float32
+        sr: Fréquence (8000, 16000, 32000 ou 48000 pour webrtcvad)
+        method: 'webrtc', 'energy' ou 'auto' (webrtc si installé)
+        aggressiveness: Agressivité webrtcvad (0-3)
+
+    Returns:
+        (flags par frame, méthode effectivement utilisée)
+    """
+    if method in ('auto', 'webrtc') and sr in (8000, 16000, 32000, 48000):
+        try:
+            return _frame_flags_webrtc(audio, sr, aggressiveness), 'webrtc'
+        except ImportError:
+            if method == 'webrtc':
+                print("⚠️  webrtcvad non installé, repli sur le détecteur d'énergie", file=sys.stderr)
+
+    return _frame_flags_energy(audio, sr), 'energy'
+
+
+def detect_speech_regions(audio: np.ndarray, sr: int, method: str = 'auto', aggressiveness: int = 2,
+                          min_speech: float = 0.25, min_silence: float = 0.5,
+                          pad: float = 0.2) -> List[Tuple[int, int]]:
+    """
+    Zones de parole (en échantillons), lissées pour ne pas hacher les phrases
+
+    Args:
+        audio: Audio mono float32
+        sr: Fréquence d'échantillonnage
+        method: Méthode VAD (voir speech_frame_flags)
+        aggressiveness: Agressivité webrtcvad (0-3)
+        min_speech: Durée min d'une zone (secondes), les plus courtes sont ignorées
+        min_silence: Silence min entre deux zones (secondes), les plus courts sont comblés
+        pad: Marge ajoutée de chaque côté d'une zone (secondes)
+
+    Returns:
+        Liste triée de (start_sample, end_sample)
+    """
+    flags, used_method = speech_frame_flags(audio, sr, method, aggressiveness)
+    frame_len = sr * FRAME_MS // 1000
+
+    # Transitions 0->1 / 1->0 (vectorisé)
+    padded = np.concatenate([[False], flags, [False]]).astype(np.int8)
+    edges = np.diff(padded)
+    starts = np.flatnonzero(edges == 1)
+    ends = np.flatnonzero(edges == -1)
+
+    regions: List[List[int]] = []
+    min_gap_frames = int(min_silence * 1000 / FRAME_MS)
+    for start, end in zip(starts, ends):
+        if regions and start - regions[-1][1] < min_gap_frames:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+
+    min_speech_frames = int(min_speech * 1000 / FRAME_MS)
+    pad_samples = int(pad * sr)
+    total = len(audio)
+
+    result: List[Tuple[int, int]] = []
+    for start, end in regions:
+        if end - start < min_speech_frames:
+            continue
+        start_sample = max(0, start * frame_len - pad_samples)
+        end_sample = min(total, end * frame_len + pad_samples)
+        # Les marges peuvent faire se chevaucher deux zones voisines
+        if result and start_sample <= result[-1][1]:
+            result[-1] = (result[-1][0], end_sample)
+        else:
+            result.append((start_sample, end_sample))
+
+    speech_seconds = sum(end - start for start, end in result) / sr
+    print(f"🎙️  VAD ({used_method}): {len(result)} zones de parole, {speech_seconds:.1f}s / {total / sr:.1f}s",
+          file=sys.stderr)
+    return result
+
+
+class SpeechChunk:
+    """Chunk envoyé au décodeur : zones de parole mises bout à bout"""
+
+    def __init__(self):
+        # (début dans le chunk, début dans la source, longueur) en échantillons
+        self.pieces: List[Tuple[int, int, int]] = []
+        self._chunk_starts: List[int] = []
+
+    @property
+    def length(self) -> int:
+        if not self.pieces:
+            return 0
+        chunk_start, _, length = self.pieces[-1]
+        return chunk_start + length
+
+    @property
+    def source_start(self) -> int:
+        return self.pieces[0][1]
+
+    @property
+    def source_end(self) -> int:
+        _, source_start, length = self.pieces[-1]
+        return source_start + length
+
+    def add(self, source_start: int, source_end: int):
+        self._chunk_starts.append(self.length)
+        self.pieces.append((self.length, source_start, source_end - source_start))
+
+    def audio(self, source: np.ndarray) -> np.ndarray:
+        """Copie contiguë float32 du chunk (seule allocation proportionnelle au chunk)"""
+        parts = [source[start:start + length] for _, start, length in self.pieces]
+        return np.ascontiguousarray(np.concatenate(parts), dtype=np.float32)
+
+    def to_source_time(self, seconds: float, sr: int, is_end: bool = False) -> float:
+        """
+        Convertir un temps relatif au chunk en temps absolu dans la source
+
+        is_end : un temps de fin tombant pile entre deux zones reste dans la zone précédente
+        """
+        sample = max(0, int(round(seconds * sr)))
+        if is_end:
+            index = max(0, bisect.bisect_left(self._chunk_starts, sample) - 1)
+        else:
+            index = max(0, bisect.bisect_right(self._chunk_starts, sample) - 1)
+        chunk_start, source_start, length = self.pieces[index]
+        offset = min(max(0, sample - chunk_start), length)
+        return (source_start + offset) / sr
+
+
+def _split_point(audio: np.ndarray, start: int, end: int, sr: int) -> int:
+    """Couper une zone trop longue à la frame la moins énergétique de son dernier tiers"""
+    window_start = start + (end - start) * 2 // 3
+    energies = frame_energy_db(audio[window_start:end], sr)
+    if len(energies) == 0:
+        return end
+    frame_len = sr * FRAME_MS // 1000
+    return window_start + int(np.argmin(energies)) * frame_len + frame_len // 2
+
+
+def plan_chunks(audio: np.ndarray, regions: List[Tuple[int, int]], sr: int,
+                max_chunk_seconds: float = 30.0) -> List[SpeechChunk]:
+    """
+    Regrouper les zones de parole en chunks d'au plus max_chunk_seconds de parole
+
+    Une zone plus longue que max_chunk_seconds est coupée sur un creux d'énergie.
+    """
+    max_samples = int(max_chunk_seconds * sr)
+
+    pieces: List[Tuple[int, int]] = []
+    for start, end in regions:
+        while end - start > max_samples:
+            cut = _split_point(audio, start, start + max_samples, sr)
+            pieces.append((start, cut))
+            start = cut
+        pieces.append((start, end))
+
+    chunks: List[SpeechChunk] = []
+    current = SpeechChunk()
+    for start, end in pieces:
+        if current.pieces and current.length + (end - start) > max_samples:
+            chunks.append(current)
+            current = SpeechChunk()
+        current.add(start, end)
+    if current.pieces:
+        chunks.append(current)
+
+    return chunks
+
+
+def remap_segments(segments: List[Dict], chunk: SpeechChunk, sr: int, first_id: int = 0) -> List[Dict]:
+    """
+    Remettre les segments Whisper d'un chunk en temps absolu (segments + mots)
+
+    Args:
+        segments: result['segments'] de Whisper pour ce chunk
+        chunk: Chunk transcrit
+        sr: Fréquence d'échantillonnage
+        first_id: Identifiant du premier segment (numérotation continue entre chunks)
+
+    Returns:
+        Segments modifiés en place
+    """
+    for i, segment in enumerate(segments):
+        segment['id'] = first_id + i
+        segment['start'] = round(chunk.to_source_time(segment['start'], sr), 3)
+        segment['end'] = round(chunk.to_source_time(segment['end'], sr, is_end=True), 3)
+        # 'seek' est en frames mel (100/s) : le rendre cohérent avec le temps absolu
+        if 'seek' in segment:
+            segment['seek'] = int(chunk.source_start * 100 // sr) + segment['seek']
+        for word in segment.get('words', []):
+            word['start'] = round(chunk.to_source_time(word['start'], sr), 3)
+            word['end'] = round(chunk.to_source_time(word['end'], sr, is_end=True), 3)
+
+    return segments
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print("Usage: python vad_chunking.py <audio> [max_chunk_seconds]", file=sys.stderr)
+        sys.exit(1)
+
+    from audio_io import WHISPER_SAMPLE_RATE, decode_audio
+
+    max_seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 30.0
+    source = decode_audio(sys.argv[1], WHISPER_SAMPLE_RATE)
+    speech_regions = detect_speech_regions(source, WHISPER_SAMPLE_RATE)
+    for n, planned in enumerate(plan_chunks(source, speech_regions, WHISPER_SAMPLE_RATE, max_seconds)):
+        print(f"chunk {n}: {planned.source_start / WHISPER_SAMPLE_RATE:.2f}s -> "
+              f"{planned.source_end / WHISPER_SAMPLE_RATE:.2f}s, {len(planned.pieces)} zones, "
+              f"{planned.length / WHISPER_SAMPLE_RATE:.1f}s de parole")
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Backend ONNX Runtime (int8) du VoiceEncoder Resemblyzer (AI_RESEMBLYZER_BACKEND=onnx)
+
+Le VoiceEncoder torch fait de l'inférence float32 : sur les serveurs CPU 4GB, c'est le coût
+de l'encodeur (LSTM 3 couches + projection 256D) et la taille résidente de torch qui
+comptent. Ici :
+    - export une fois du VoiceEncoder pré-entraîné en ONNX (batch et nombre de frames dynamiques)
+    - quantification dynamique int8 des poids (onnxruntime.quantization.quantize_dynamic)
+    - inférence ONNX Runtime CPU, threads intra-op réglables (AI_RESEMBLYZER_ONNX_THREADS)
+
+OnnxVoiceEncoder expose l'API utilisée par le dépôt (embed_utterance, même découpage en
+fenêtres partielles que Resemblyzer ; embed_mels pour track_embeddings) : embeddings 256D
+de norme 1, directement utilisables par cluster_embeddings. Le prétraitement audio
+(preprocess_wav) reste celui de Resemblyzer.
+
+Le modèle exporté est gardé dans AI_RESEMBLYZER_ONNX_DIR (défaut: storage/app/models) ;
+il est exporté automatiquement au premier chargement (torch nécessaire une seule fois).
+
+Usage:
+    python voice_encoder_onnx.py export [--no-quantize] [--output-dir DIR]
+    python voice_encoder_onnx.py parity audio.wav transcription.json [--max-segments 100] [--threads 2]
+
+    from voice_encoder_onnx import load_onnx_encoder
+    encoder = load_onnx_encoder()
+    embedding = encoder.embed_utterance(preprocess_wav(wav, 16000))
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+DEFAULT_MODEL_DIR = Path(__file__).resolve().parent.parent / 'storage' / 'app' / 'models'
+FP32_MODEL_NAME = 'voice_encoder.onnx'
+INT8_MODEL_NAME = 'voice_encoder_int8.onnx'
+ONNX_OPSET = 13
+# Threads intra-op par défaut (comme AI_TRANSCRIPTION_THREADS_PER_WORKER)
+DEFAULT_THREADS = 2
+# Cosinus minimal torch / ONNX accepté par la commande parity
+PARITY_MIN_COSINE = 0.98
+
+
+def model_dir() -> Path:
+    """Dossier des modèles ONNX exportés (AI_RESEMBLYZER_ONNX_DIR)"""
+    return Path(os.getenv('AI_RESEMBLYZER_ONNX_DIR') or DEFAULT_MODEL_DIR)
+
+
+def onnx_threads() -> int:
+    """Threads intra-op d'ONNX Runtime (AI_RESEMBLYZER_ONNX_THREADS)"""
+    try:
+        return max(1, int(os.getenv('AI_RESEMBLYZER_ONNX_THREADS', DEFAULT_THREADS)))
+    except ValueError:
+        return DEFAULT_THREADS
+
+
+def export_onnx(output_dir: Optional[str] = None, quantize: bool = True) -> Path:
+    """
+    Exporter le VoiceEncoder torch pré-entraîné en ONNX (+ version int8)
+
+    Écriture dans des fichiers temporaires puis renommage : jamais de modèle partiel
+    visible par un autre process.
+
+    Args:
+        output_dir: Dossier de sortie (défaut: model_dir())
+        quantize: Produire aussi la version quantifiée int8
+
+    Returns:
+        Chemin du modèle à utiliser (int8 si quantize, sinon float32)
+    """
+    import torch
+    from resemblyzer import VoiceEncoder, hparams
+
+    directory = Path(output_dir) if output_dir else model_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    fp32_path = directory / FP32_MODEL_NAME
+    int8_path = directory / INT8_MODEL_NAME
+
+    print(f"📦 Export ONNX du VoiceEncoder -> {fp32_path}", file=sys.stderr)
+    encoder = VoiceEncoder(device='cpu')
+    encoder.eval()
+    dummy = torch.zeros(1, hparams.partials_n_frames, hparams.mel_n_channels)
+
+    fd, temp_path = tempfile.mkstemp(suffix='.onnx.part', dir=str(directory))
+    os.close(fd)
+    try:
+        with torch.no_grad():
+            torch.onnx.export(
+                encoder, dummy, temp_path,
+                input_names=['mels'], output_names=['embeds'],
+                dynamic_axes={'mels': {0: 'batch', 1: 'frames'}, 'embeds': {0: 'batch'}},
+                opset_version=ONNX_OPSET, do_constant_folding=True,
+            )
+        os.replace(temp_path, fp32_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+    if not quantize:
+        return fp32_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    print(f"📦 Quantification dynamique int8 -> {int8_path}", file=sys.stderr)
+    fd, temp_path = tempfile.mkstemp(suffix='.onnx.part', dir=str(directory))
+    os.close(fd)
+    try:
+        # LSTM + MatMul de la projection : poids int8, activations quantifiées à la volée
+        quantize_dynamic(str(fp32_path), temp_path, weight_type=QuantType.QInt8)
+        os.replace(temp_path, int8_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+
+    size_kb = (fp32_path.stat().st_size / 1024, int8_path.stat().st_size / 1024)
+    print(f"✅ Modèles ONNX: float32 {size_kb[0]:.0f}KB, int8 {size_kb[1]:.0f}KB", file=sys.stderr)
+    return int8_path
+
+
+class OnnxVoiceEncoder:
+    """VoiceEncoder Resemblyzer servi par ONNX Runtime (mêmes embeddings 256D normalisés)"""
+
+    device = 'cpu'
+
+    def __init__(self, model_path: str, threads: Optional[int] = None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = threads or onnx_threads()
+        options.inter_op_num_threads = 1
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        self.model_path = str(model_path)
+        self.session = ort.InferenceSession(self.model_path, options, providers=['CPUExecutionProvider'])
+        self._input = self.session.get_inputs()[0].name
+
+    def embed_mels(self, mels: np.ndarray) -> np.ndarray:
+        """(batch, frames, 40) mels -> (batch, 256) embeddings partiels (norme 1)"""
+        return self.session.run(None, {self._input: np.ascontiguousarray(mels, dtype=np.float32)})[0]
+
+    def embed_utterance(self, wav: np.ndarray, return_partials: bool = False, rate: float = 1.3,
+                        min_coverage: float = 0.75):
+        """Comme VoiceEncoder.embed_utterance (mêmes fenêtres partielles, moyenne normalisée)"""
+        from resemblyzer import VoiceEncoder
+        from resemblyzer.audio import wav_to_mel_spectrogram
+
+        wav_slices, mel_slices = VoiceEncoder.compute_partial_slices(len(wav), rate, min_coverage)
+        max_wave_length = wav_slices[-1].stop
+        if max_wave_length >= len(wav):
+            wav = np.pad(wav, (0, max_wave_length - len(wav)), 'constant')
+
+        mel = wav_to_mel_spectrogram(wav)
+        partial_embeds = self.embed_mels(np.array([mel[s] for s in mel_slices]))
+
+        raw_embed = np.mean(partial_embeds, axis=0)
+        embed = raw_embed / np.linalg.norm(raw_embed, 2)
+        if return_partials:
+            return embed, partial_embeds, wav_slices
+        return embed
+
+
+def load_onnx_encoder(quantized: bool = True, threads: Optional[int] = None) -> OnnxVoiceEncoder:
+    """Encodeur ONNX (exporté au premier appel si le modèle n'existe pas encore)"""
+    path = model_dir() / (INT8_MODEL_NAME if quantized else FP32_MODEL_NAME)
+    if not path.exists():
+        print(f"⚠️  Modèle ONNX absent ({path}), export depuis Resemblyzer...", file=sys.stderr)
+        export_onnx(quantize=quantized)
+    encoder = OnnxVoiceEncoder(str(path), threads)
+    print(f"✅ VoiceEncoder ONNX chargé: {path.name} ({encoder.session.get_session_options().intra_op_num_threads} threads)",
+          file=sys.stderr)
+    return encoder
+
+
+def parity_check(audio_path: str, segments: List[Dict], max_segments: int = 100, quantized: bool = True,
+                 threads: Optional[int] = None, max_speakers: int = 10) -> Dict:
+    """
+    Comparer les embeddings torch et ONNX sur les mêmes segments prétraités
+
+    Returns:
+        {'segments', 'min_cosine', 'mean_cosine', 'torch_seconds', 'onnx_seconds', 'labels_ari'}
+    """
+    from resemblyzer import VoiceEncoder, preprocess_wav
+    from sklearn.metrics import adjusted_rand_score
+
+    from audio_io import WHISPER_SAMPLE_RATE, load_audio_mono
+    from resemblyzer_diarization import cluster_embeddings
+
+    audio, sr = load_audio_mono(audio_path, mmap=True, sample_rate=WHISPER_SAMPLE_RATE)
+    wavs = []
+    for segment in segments:
+        view = audio[int(segment['start'] * sr):int(segment['end'] * sr)]
+        if len(view) == 0:
+            continue
+        wav = preprocess_wav(np.asarray(view), source_sr=sr)
+        if len(wav):
+            wavs.append(wav)
+        if len(wavs) >= max_segments:
+            break
+    if not wavs:
+        raise ValueError("Aucun segment exploitable pour la comparaison")
+
+    torch_encoder = VoiceEncoder(device='cpu')
+    onnx_encoder = load_onnx_encoder(quantized, threads)
+
+    start = time.time()
+    reference = np.array([torch_encoder.embed_utterance(wav) for wav in wavs])
+    torch_seconds = time.time() - start
+
+    start = time.time()
+    candidate = np.array([onnx_encoder.embed_utterance(wav) for wav in wavs])
+    onnx_seconds = time.time() - start
+
+    cosines = np.sum(reference * candidate, axis=1)
+    report = {
+        'segments': len(wavs),
+        'min_cosine': float(cosines.min()),
+        'mean_cosine': float(cosines.mean()),
+        'torch_seconds': round(torch_seconds, 3),
+        'onnx_seconds': round(onnx_seconds, 3),
+    }
+    if len(wavs) >= 4:
+        # Même clustering des locuteurs avec les deux encodeurs ?
+        report['labels_ari'] = float(adjusted_rand_score(cluster_embeddings(reference, max_speakers),
+                                                         cluster_embeddings(candidate, max_speakers)))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='VoiceEncoder Resemblyzer en ONNX (export int8, parité torch)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='Exporter le VoiceEncoder en ONNX (+ int8)')
+    export_parser.add_argument('--output-dir', default=None,
+                               help='Dossier des modèles (défaut: $AI_RESEMBLYZER_ONNX_DIR ou storage/app/models)')
+    export_parser.add_argument('--no-quantize', action='store_true', help='Export float32 seulement')
+
+    parity_parser = subparsers.add_parser('parity', help='Comparer les embeddings torch et ONNX (cosinus)')
+    parity_parser.add_argument('audio_path', help='Fichier audio (vocals de préférence)')
+    parity_parser.add_argument('transcription_json', help='Transcription Whisper (JSON)')
+    parity_parser.add_argument('--max-segments', type=int, default=100, help='Segments comparés')
+    parity_parser.add_argument('--fp32', action='store_true', help='Comparer le modèle float32 (pas int8)')
+    parity_parser.add_argument('--threads', type=int, default=None,
+                               help=f'Threads intra-op (défaut: $AI_RESEMBLYZER_ONNX_THREADS ou {DEFAULT_THREADS})')
+    parity_parser.add_argument('--min-cosine', type=float, default=PARITY_MIN_COSINE,
+                               help=f'Cosinus minimal accepté (défaut: {PARITY_MIN_COSINE})')
+
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        export_onnx(args.output_dir, quantize=not args.no_quantize)
+        return
+
+    with open(args.transcription_json, 'r', encoding='utf-8') as f:
+        segments = json.load(f).get('segments', [])
+
+    report = parity_check(args.audio_path, segments, args.max_segments, quantized=not args.fp32,
+                          threads=args.threads)
+    print(json.dumps(report, indent=2))
+
+    if report['min_cosine'] < args.min_cosine:
+        print(f"❌ Parité insuffisante: cosinus min {report['min_cosine']:.4f} < {args.min_cosine}", file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ Parité OK: cosinus min {report['min_cosine']:.4f}, moyen {report['mean_cosine']:.4f} "
+          f"(torch {report['torch_seconds']}s, ONNX {report['onnx_seconds']}s)", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()